@@ -0,0 +1,77 @@
+# benchmarks/ann_benchmark.py
+"""
+Misst Recall@k und Latenz des IVF-Index und der int8-quantisierten Suche
+gegenüber der exakten float32-Suche.
+
+    python -m benchmarks.ann_benchmark --embeddings .index_cache/embeddings.npy
+    python -m benchmarks.ann_benchmark --synthetic 500000 --dim 384
+
+Ohne --embeddings werden geclusterte Zufallsvektoren erzeugt (Annäherung an
+echte Satz-Embeddings). Anfragen sind leicht verrauschte Korpusvektoren.
+"""
+import argparse
+import time
+import numpy as np
+from utils.vector_index import ExactIndex, IVFIndex, normalize_rows
+
+
+def synthetic_embeddings(n, dim, n_clusters=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, size=n)
+    return centers[labels] + 1.5 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def recall_at_k(found, truth):
+    return np.mean([len(np.intersect1d(a, b)) / len(b) for a, b in zip(found, truth)])
+
+
+def run_queries(index, queries, k):
+    start = time.perf_counter()
+    results = [index.search(q, k)[0] for q in queries]
+    return results, (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embeddings", help="Pfad zu einer .npy-Embedding-Matrix")
+    parser.add_argument("--synthetic", type=int, default=100000, help="Anzahl synthetischer Vektoren")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    if args.embeddings:
+        vectors = np.load(args.embeddings, mmap_mode="r")
+    else:
+        vectors = synthetic_embeddings(args.synthetic, args.dim)
+    rng = np.random.default_rng(1)
+    sample = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = np.asarray(vectors[sample]) + 0.5 * rng.standard_normal((len(sample), vectors.shape[1])).astype(np.float32)
+    print(f"{len(vectors)} Vektoren × {vectors.shape[1]} Dimensionen, {len(queries)} Anfragen, k={args.k}")
+
+    vectors = normalize_rows(vectors)
+    exact = ExactIndex(vectors, normalized=True)
+    truth, exact_time = run_queries(exact, queries, args.k)
+    print(f"exakt:            {exact_time * 1000:8.2f} ms/Anfrage   Recall@{args.k} 1.000   "
+          f"{vectors.nbytes / 2**20:8.1f} MiB")
+
+    quantized = ExactIndex(vectors, normalized=True, quantize=True)
+    found, int8_time = run_queries(quantized, queries, args.k)
+    print(f"int8 + Rescoring: {int8_time * 1000:8.2f} ms/Anfrage   Recall@{args.k} {recall_at_k(found, truth):.3f}   "
+          f"{quantized.codes.nbytes / 2**20:8.1f} MiB")
+
+    start = time.perf_counter()
+    ivf = IVFIndex(vectors, nlist=args.nlist, min_train_size=0, normalized=True)
+    print(f"IVF-Training:     {time.perf_counter() - start:8.2f} s  (nlist={len(ivf.centroids)})")
+
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        found, ivf_time = run_queries(ivf, queries, args.k)
+        print(f"IVF nprobe={nprobe:<4d} {ivf_time * 1000:8.2f} ms/Anfrage   Recall@{args.k} {recall_at_k(found, truth):.3f}")
+
+
+if __name__ == "__main__":
+    main()
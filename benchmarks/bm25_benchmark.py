@@ -0,0 +1,85 @@
+# benchmarks/bm25_benchmark.py
+"""
+Vergleicht IncrementalBM25 mit rank_bm25.BM25Okapi auf dem Vorlagen-Korpus:
+gleiche Rankings (Regressionsprüfung) und Zeit pro Suchanfrage.
+
+    python -m benchmarks.bm25_benchmark [--docs docs/] [--queries 200]
+
+Beendet sich mit Exit-Code 1, falls sich ein Ranking unterscheidet.
+"""
+import argparse
+import random
+import sys
+import time
+import numpy as np
+from rank_bm25 import BM25Okapi
+from utils.bm25 import IncrementalBM25
+from utils.document_loader import load_documents_from_folder
+from utils.search import tokenize
+
+SAMPLE_QUERIES = [
+    "Kündigungsfrist Mietvertrag",
+    "Gesellschaftervertrag GmbH",
+    "Haftung bei grober Fahrlässigkeit",
+    "Abtretung einer Forderung",
+    "Gerichtsstand und anwendbares Recht",
+    "Arbeitsvertrag Probezeit Ferien",
+]
+
+
+def build_queries(tokenized_corpus, n, seed=0):
+    """Beispielanfragen plus zufällige Begriffe aus dem Korpus (1–4 Tokens)."""
+    rng = random.Random(seed)
+    vocab = sorted({t for doc in tokenized_corpus for t in doc})
+    queries = [tokenize(q) for q in SAMPLE_QUERIES]
+    while len(queries) < n:
+        queries.append(rng.sample(vocab, rng.randint(1, 4)))
+    return queries
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    results = [fn(q) for q in queries]
+    return results, (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default="docs/")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=20)
+    args = parser.parse_args()
+
+    docs = load_documents_from_folder(args.docs)
+    corpus = [tokenize(doc.page_content) for doc in docs]
+    queries = build_queries(corpus, args.queries)
+    print(f"{len(docs)} Chunks, {len(queries)} Anfragen")
+
+    start = time.perf_counter()
+    reference = BM25Okapi(corpus)
+    print(f"Aufbau BM25Okapi:       {time.perf_counter() - start:8.3f} s")
+    start = time.perf_counter()
+    candidate = IncrementalBM25(corpus)
+    candidate.get_scores([])  # Postings aufbauen
+    print(f"Aufbau IncrementalBM25: {time.perf_counter() - start:8.3f} s")
+
+    expected, ref_time = timed(reference.get_scores, queries)
+    actual, new_time = timed(candidate.get_scores, queries)
+    print(f"Suche BM25Okapi:        {ref_time * 1000:8.3f} ms/Anfrage")
+    print(f"Suche IncrementalBM25:  {new_time * 1000:8.3f} ms/Anfrage  (Faktor {ref_time / new_time:.1f})")
+
+    mismatches = 0
+    for query, ref_scores, new_scores in zip(queries, expected, actual):
+        # Rangfolge wie in der Suche: absteigend, bei Gleichstand stabil nach Index
+        ref_top = np.argsort(-ref_scores, kind="stable")[:args.top_k]
+        new_top = np.argsort(-new_scores, kind="stable")[:args.top_k]
+        if not np.allclose(ref_scores, new_scores) or not np.array_equal(ref_top, new_top):
+            mismatches += 1
+            print(f"Abweichung bei Anfrage {query}")
+
+    print("Rankings identisch" if not mismatches else f"{mismatches} abweichende Rankings")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
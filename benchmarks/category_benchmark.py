@@ -0,0 +1,89 @@
+# benchmarks/category_benchmark.py
+"""
+Vergleicht den kompilierten CategoryMatcher mit der bisherigen Zuordnung
+(`keyword in text` für jedes Keyword, erste Kategorie mit Treffer gewinnt).
+
+    python -m benchmarks.category_benchmark [--docs docs/] [--repeat 5]
+
+Die bisherige Zuordnung bricht beim ersten Treffer ab und ist deshalb nur mit
+Vorbehalt vergleichbar; als Referenz für das Zählen aller Treffer dient
+`text.count(keyword)` pro Keyword. Gemessen werden beide Wege des Matchers:
+Aho-Corasick (pyahocorasick, falls installiert) und der Wort-Cache (neuer Matcher
+pro Durchlauf, also inklusive Aufbau des Caches).
+
+Abweichende Kategorien sind erwartet: der Matcher entscheidet nach Anzahl
+Treffern statt nach Reihenfolge der Kategorien. Ausgegeben wird, wie oft und
+zwischen welchen Kategorien sich die Zuordnung ändert.
+"""
+import argparse
+import time
+from collections import Counter
+from utils.category_manager import CATEGORIES, CategoryMatcher
+from utils.document_loader import load_documents_from_folder
+
+
+def legacy_assign_category(text):
+    text_lower = text.lower()
+    for category, keywords in CATEGORIES.items():
+        if any(keyword in text_lower for keyword in keywords):
+            return category
+    return "Andere"
+
+
+def legacy_count_hits(text):
+    text_lower = text.lower()
+    return {
+        category: hits for category, keywords in CATEGORIES.items()
+        if (hits := sum(text_lower.count(keyword) for keyword in keywords))
+    }
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default="docs/")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    texts = [doc.page_content for doc in load_documents_from_folder(args.docs)]
+    matcher = CategoryMatcher()
+    print(f"{len(texts)} Chunks, {sum(map(len, texts)) / 2**20:.1f} MiB Text, "
+          f"{len(matcher.keyword_category)} Keywords")
+
+    legacy, legacy_time = timed(lambda: [legacy_assign_category(t) for t in texts], args.repeat)
+    _, count_time = timed(lambda: [legacy_count_hits(t) for t in texts], args.repeat)
+    single, single_time = timed(lambda: [matcher.assign(t) for t in texts], args.repeat)
+    batch, batch_time = timed(lambda: matcher.assign_many(texts), args.repeat)
+
+    def words_only():
+        fallback = CategoryMatcher()
+        fallback.automaton = None
+        return fallback.assign_many(texts)
+
+    words, words_time = timed(words_only, args.repeat)
+    engine = "Aho-Corasick" if matcher.automaton is not None else "Wort-Cache"
+    print(f"bisher (erster Treffer):  {legacy_time * 1000:8.2f} ms")
+    print(f"count() pro Keyword:      {count_time * 1000:8.2f} ms")
+    print(f"Matcher pro Chunk:        {single_time * 1000:8.2f} ms  ({engine}, Faktor {legacy_time / single_time:.2f} ggü. bisher)")
+    print(f"Matcher Batch:            {batch_time * 1000:8.2f} ms  ({engine}, Faktor {legacy_time / batch_time:.2f} ggü. bisher)")
+    print(f"Wort-Cache (kalt):        {words_time * 1000:8.2f} ms  (Faktor {legacy_time / words_time:.2f} ggü. bisher)")
+
+    if not single == batch == words:
+        print("Fehler: die Zuordnungen der Matcher-Varianten unterscheiden sich")
+        return 1
+
+    changes = Counter((old, new) for old, new in zip(legacy, batch) if old != new)
+    print(f"Geänderte Zuordnungen: {sum(changes.values())} von {len(texts)}")
+    for (old, new), n in changes.most_common():
+        print(f"  {old:>10} -> {new:<10} {n}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
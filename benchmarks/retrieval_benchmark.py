@@ -0,0 +1,378 @@
+# benchmarks/retrieval_benchmark.py
+"""
+Offline-Benchmark der Suche auf dem Vorlagen-Korpus: Aufbauzeit und Speicherbedarf
+des Index, Latenz pro Stufe (encode, vector, bm25, fusion, rerank, highlight) als
+p50/p95/p99 sowie Recall@k, MRR und nDCG@k gegen bewertete Relevanzlabels.
+
+    python -m benchmarks.retrieval_benchmark [--docs docs/] [--queries benchmarks/relevance.jsonl]
+    python -m benchmarks.retrieval_benchmark --output runs/neu.json --compare runs/alt.json
+
+Anfragen (--queries):
+  *.jsonl / *.json  {"query": "...", "relevant": {"Datei.docx": 2, ...}} oder "relevant": ["Datei.docx", ...]
+                    (Relevanz pro Quelldatei, damit Labels eine Änderung des Chunkers überstehen;
+                    Stufen 1 = passend, 2 = genau gesucht). Einträge ohne "relevant" zählen nur zur Latenz.
+  *.csv             Export "search_queries.csv" aus dem Admin-Tab (Spalte "query"), ohne Labels.
+                    Das Anfrage-Log (.query_log/queries.jsonl) geht ebenfalls; Klick-Ereignisse werden übersprungen.
+
+Mit --write-template wird für jede Anfrage eine JSONL-Zeile mit den aktuell gefundenen
+Dateien ("candidates") geschrieben; nach dem Bewerten in "relevant" übertragen.
+
+Ergebnis-Cache und Re-Ranking-Score-Cache sind aus, der Highlight-Cache wird vor jeder
+Messung geleert; der Wort-Embedding-Cache bleibt nach dem Aufwärmen warm wie im Betrieb.
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from utils.document_loader import CHUNKER_VERSION, load_documents_from_folder
+from utils.embeddings import SentenceTransformerProvider
+from utils.query_cache import QueryCache
+from utils.reranker import CrossEncoderReranker
+from utils.result_card import compute_highlight_terms, highlight_cache, make_snippet
+from utils.search import InMemoryVectorStore, HybridRetriever
+
+SAMPLE_QUERIES = "benchmarks/relevance.jsonl"
+STAGES = ("encode", "vector", "bm25", "fusion", "rerank", "search", "highlight", "total")
+
+
+# ------------------------------
+# Anfragen und Relevanzlabels
+# ------------------------------
+def load_queries(path):
+    """Liste von {"query", "relevant": {Datei: Stufe}}; doppelte Anfragen werden zusammengefasst."""
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            entries = [{"query": row["query"]} for row in csv.DictReader(f)]
+    else:
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                entries = [json.loads(line) for line in f if line.strip()]
+            else:
+                entries = json.load(f)
+
+    queries = {}
+    for entry in entries:
+        if entry.get("type", "search") != "search":
+            continue
+        query = entry["query"].strip()
+        if not query:
+            continue
+        relevant = entry.get("relevant")
+        if isinstance(relevant, list):
+            relevant = {name: 1 for name in relevant}
+        item = queries.setdefault(query, {"query": query, "relevant": {}})
+        item["relevant"].update({name: int(grade) for name, grade in (relevant or {}).items() if int(grade) > 0})
+    return list(queries.values())
+
+
+# ------------------------------
+# Qualitätsmasse (pro Quelldatei)
+# ------------------------------
+def ranked_sources(results):
+    """Quelldateien in Reihenfolge ihres ersten Auftretens."""
+    sources = []
+    for doc, _ in results:
+        source = doc.metadata.get("source")
+        if source not in sources:
+            sources.append(source)
+    return sources
+
+
+def recall_at_k(ranking, relevant, k):
+    return len(set(ranking[:k]) & set(relevant)) / len(relevant)
+
+
+def reciprocal_rank(ranking, relevant):
+    for rank, source in enumerate(ranking, start=1):
+        if source in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(ranking, relevant, k):
+    gains = [2 ** relevant.get(source, 0) - 1 for source in ranking[:k]]
+    dcg = sum(g / np.log2(i + 2) for i, g in enumerate(gains))
+    ideal = sorted((2 ** g - 1 for g in relevant.values()), reverse=True)[:k]
+    idcg = sum(g / np.log2(i + 2) for i, g in enumerate(ideal))
+    return dcg / idcg if idcg else 0.0
+
+
+# ------------------------------
+# Speicher
+# ------------------------------
+def rss_mib():
+    """Aktueller Resident Set Size (Linux), sonst der Spitzenwert."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return peak_rss_mib()
+
+
+def peak_rss_mib():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux: KiB, macOS: Bytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def index_footprint(retriever):
+    """Grösse der Index-Strukturen in MiB (ohne Python-Objekt-Overhead)."""
+    index = retriever.vectorstore.index
+    bm25 = retriever.bm25
+    postings = bm25._postings or bm25._build()
+    return {
+        "vectors_mib": index.vectors.nbytes / 2**20,
+        "int8_codes_mib": index.codes.nbytes / 2**20 if index.codes is not None else 0.0,
+        "bm25_mib": (sum(a.nbytes for a in bm25.doc_terms) + sum(a.nbytes for a in bm25.doc_tfs)
+                     + bm25.df.nbytes + sum(a.nbytes for a in postings)) / 2**20,
+        "texts_mib": sum(len(doc.page_content.encode("utf-8")) for doc in retriever.texts) / 2**20,
+    }
+
+
+# ------------------------------
+# Aufbau und Messung
+# ------------------------------
+def build_retriever(docs_path, embedding_model, vector_index="exact", index_params=None, reranker=None):
+    """Baut den Index wie init_vectorstore() (ohne Index-Cache) und misst die Dauer jeder Phase."""
+    build = {}
+    start = time.perf_counter()
+    docs = load_documents_from_folder(docs_path)
+    build["load_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorstore = InMemoryVectorStore.from_documents(docs, embedding_model, index=vector_index, **(index_params or {}))
+    build["embed_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    retriever = HybridRetriever(vectorstore, docs, embedding_model, reranker=reranker)
+    retriever.bm25._build()
+    build["bm25_s"] = time.perf_counter() - start
+    build["total_s"] = sum(build.values())
+    return retriever, build
+
+
+def run_query(retriever, query, k, alpha, fusion, highlight=True, filters=None):
+    """Eine Suche mit Zeit pro Stufe (Sekunden) wie im Such-Tab: Suche, dann Highlighting der Snippets."""
+    timings = {}
+    start = time.perf_counter()
+    results = retriever.search(query, k=k, alpha=alpha, fusion=fusion, timings=timings, filters=filters)
+    timings["search"] = time.perf_counter() - start
+    if highlight:
+        highlight_cache.clear()
+        start = time.perf_counter()
+        compute_highlight_terms([make_snippet(doc) for doc, _ in results], query, retriever.embedding_model)
+        timings["highlight"] = time.perf_counter() - start
+    timings["total"] = timings["search"] + timings.get("highlight", 0.0)
+    return results, timings
+
+
+def percentiles_ms(values):
+    values = np.asarray(values) * 1000
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "mean": float(values.mean()),
+    }
+
+
+def run_benchmark(retriever, queries, k=10, alpha=0.5, fusion=None, repeat=3, warmup=1, highlight=True,
+                  filters=None):
+    """Misst alle Anfragen `repeat`-mal (nach `warmup` ungemessenen Durchläufen) und bewertet die Rankings."""
+    for _ in range(warmup):
+        for item in queries:
+            run_query(retriever, item["query"], k, alpha, fusion, highlight, filters)
+
+    samples = {stage: [] for stage in STAGES}
+    per_query = []
+    for item in queries:
+        for _ in range(repeat):
+            results, timings = run_query(retriever, item["query"], k, alpha, fusion, highlight, filters)
+            for stage, seconds in timings.items():
+                samples[stage].append(seconds)
+
+        ranking = ranked_sources(results)
+        row = {"query": item["query"], "sources": ranking, "total_ms": timings["total"] * 1000}
+        if item["relevant"]:
+            row.update({
+                "recall": recall_at_k(ranking, item["relevant"], k),
+                "rr": reciprocal_rank(ranking, item["relevant"]),
+                "ndcg": ndcg_at_k(ranking, item["relevant"], k),
+            })
+        per_query.append(row)
+
+    judged = [row for row in per_query if "recall" in row]
+    quality = {"judged_queries": len(judged)}
+    if judged:
+        quality.update({
+            f"recall@{k}": float(np.mean([row["recall"] for row in judged])),
+            "mrr": float(np.mean([row["rr"] for row in judged])),
+            f"ndcg@{k}": float(np.mean([row["ndcg"] for row in judged])),
+        })
+    latency = {stage: percentiles_ms(values) for stage, values in samples.items() if values}
+    return latency, quality, per_query
+
+
+# ------------------------------
+# Vergleich zweier Läufe
+# ------------------------------
+def flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare_runs(current, previous):
+    """Zeilen (Kennzahl, alt, neu, Änderung in %) für alle Kennzahlen, die in beiden Läufen vorkommen."""
+    sections = ("build", "memory", "latency_ms", "quality")
+    old = flatten({s: previous.get(s, {}) for s in sections})
+    new = flatten({s: current.get(s, {}) for s in sections})
+    rows = []
+    for name in new:
+        if name in old:
+            change = (new[name] - old[name]) / old[name] * 100 if old[name] else 0.0
+            rows.append((name, old[name], new[name], change))
+    return rows
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(report, k):
+    corpus, build, memory = report["corpus"], report["build"], report["memory"]
+    print(f"{corpus['chunks']} Chunks aus {corpus['files']} Dateien, {corpus['queries']} Anfragen")
+    print(f"Aufbau: {build['total_s']:.2f} s (Laden {build['load_s']:.2f} s, Embeddings {build['embed_s']:.2f} s, "
+          f"BM25 {build['bm25_s']:.2f} s)")
+    print(f"Speicher: RSS {memory['rss_mib']:.0f} MiB (Spitze {memory['peak_rss_mib']:.0f} MiB, "
+          f"Index +{memory['rss_build_mib']:.0f} MiB); Vektoren {memory['vectors_mib']:.1f} MiB, "
+          f"BM25 {memory['bm25_mib']:.1f} MiB, Texte {memory['texts_mib']:.1f} MiB")
+    print(f"{'Stufe':<10} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+    for stage, values in report["latency_ms"].items():
+        print(f"{stage:<10} {values['p50']:9.2f} {values['p95']:9.2f} {values['p99']:9.2f}")
+    quality = report["quality"]
+    if quality["judged_queries"]:
+        print(f"Qualität ({quality['judged_queries']} bewertete Anfragen): Recall@{k} {quality[f'recall@{k}']:.3f}   "
+              f"MRR {quality['mrr']:.3f}   nDCG@{k} {quality[f'ndcg@{k}']:.3f}")
+    else:
+        print("Keine Relevanzlabels: nur Latenz gemessen.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default="docs/")
+    parser.add_argument("--queries", default=SAMPLE_QUERIES, help="Anfragen mit Labels (.jsonl/.json) oder Admin-Export (.csv)")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="SentenceTransformer-Modell")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--fusion", default=None, help="minmax, zscore, rrf oder none (Standard des Retrievers)")
+    parser.add_argument("--filter", action="append", default=[], metavar="FELD=WERT",
+                        help="Metadaten-Filter, z. B. category=Verträge (mehrfach möglich)")
+    parser.add_argument("--vector-index", default="exact", help="exact oder ivf")
+    parser.add_argument("--index-params", default="{}", help='z. B. \'{"nlist": 256, "nprobe": 16}\'')
+    parser.add_argument("--rerank", action="store_true", help="Cross-Encoder als zweite Stufe")
+    parser.add_argument("--no-highlight", action="store_true")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--output", help="Ergebnis als JSON speichern")
+    parser.add_argument("--compare", help="Früheren JSON-Lauf zum Vergleich")
+    parser.add_argument("--write-template", help="JSONL-Vorlage zum Bewerten der Anfragen schreiben")
+    args = parser.parse_args()
+
+    filters = {}
+    for spec in args.filter:
+        field, _, value = spec.partition("=")
+        filters.setdefault(field, []).append(value)
+
+    queries = load_queries(args.queries)
+    if not queries:
+        print(f"Keine Anfragen in {args.queries}")
+        return 1
+
+    rss_start = rss_mib()
+    embedding_model = SentenceTransformerProvider(SentenceTransformer(args.model))
+    reranker = None
+    if args.rerank:
+        # Kein Zeitbudget und kein Score-Cache: gemessen wird die volle Rechenzeit
+        reranker = CrossEncoderReranker(time_budget=None, cache=QueryCache(maxsize=1, ttl=None))
+        reranker.warmup()
+    rss_model = rss_mib()
+
+    retriever, build = build_retriever(
+        args.docs, embedding_model, args.vector_index, json.loads(args.index_params), reranker
+    )
+    if not retriever.texts:
+        print(f"Keine Dokumente in {args.docs}")
+        return 1
+    memory = {"rss_mib": rss_mib(), "peak_rss_mib": peak_rss_mib(), "model_mib": rss_model - rss_start,
+              "rss_build_mib": rss_mib() - rss_model, **index_footprint(retriever)}
+
+    latency, quality, per_query = run_benchmark(
+        retriever, queries, args.k, args.alpha, args.fusion, args.repeat, args.warmup, not args.no_highlight, filters
+    )
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "model": args.model,
+            "chunker_version": CHUNKER_VERSION,
+            "k": args.k,
+            "alpha": args.alpha,
+            "fusion": args.fusion or retriever.fusion,
+            "filters": filters,
+            "vector_index": args.vector_index,
+            "index_params": json.loads(args.index_params),
+            "rerank": args.rerank,
+            "repeat": args.repeat,
+        },
+        "corpus": {"files": len({doc.metadata.get("source") for doc in retriever.texts}),
+                   "chunks": len(retriever.texts), "queries": len(queries)},
+        "build": build,
+        "memory": memory,
+        "latency_ms": latency,
+        "quality": quality,
+        "queries": per_query,
+    }
+    print_report(report, args.k)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Gespeichert: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        print(f"\nVergleich mit {args.compare} ({previous.get('meta', {}).get('git_commit')}):")
+        for name, old, new, change in compare_runs(report, previous):
+            print(f"  {name:<28} {old:12.3f} → {new:12.3f}  ({change:+6.1f} %)")
+
+    if args.write_template:
+        with open(args.write_template, "w", encoding="utf-8") as f:
+            for item, row in zip(queries, per_query):
+                f.write(json.dumps({"query": item["query"], "relevant": item["relevant"],
+                                    "candidates": row["sources"]}, ensure_ascii=False) + "\n")
+        print(f"Vorlage zum Bewerten: {args.write_template}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+# benchmarks/startup_benchmark.py
+"""
+Misst Importzeiten der App-Module (jeweils in einem frischen Interpreter) sowie
+die Zeit bis zur ersten gerenderten Seite und bis der Suchindex im Hintergrund
+bereit ist (streamlit.testing.AppTest, ohne Browser).
+
+    python -m benchmarks.startup_benchmark [--repeat 3] [--output runs/startup.json]
+    python -m benchmarks.startup_benchmark --max-first-render 2.0
+
+Beendet sich mit Exit-Code 1, wenn die erste Seite länger als --max-first-render
+Sekunden braucht (Schutz vor schweren Imports auf dem Render-Pfad).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Module, die beim ersten Rendern geladen werden, und die bewusst aufgeschobenen
+RENDER_MODULES = [
+    "streamlit",
+    "utils.startup",
+    "utils.metrics",
+    "tabs.documents_tab",
+    "tabs.admin_tab",
+    "tabs.search_tab",
+    "tabs.chat_tab",
+]
+DEFERRED_MODULES = [
+    "utils.document_loader",
+    "utils.index_store",
+    "sentence_transformers",
+]
+
+
+def import_time(module, repeat):
+    """Median der Importzeit in Sekunden (frischer Interpreter pro Messung); None, falls nicht installiert."""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    samples = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def measure_app(script, ready_timeout, poll_interval=0.5):
+    """(Sekunden bis zur ersten Seite, Sekunden bis der Index bereit ist oder None) in diesem Prozess."""
+    from streamlit.testing.v1 import AppTest
+
+    start = time.perf_counter()
+    app = AppTest.from_file(os.path.abspath(script), default_timeout=ready_timeout)
+    app.run()
+    first_render = time.perf_counter() - start
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+
+    deadline = start + ready_timeout
+    while time.perf_counter() < deadline:
+        if app.session_state["index_ready"]:
+            return first_render, time.perf_counter() - start
+        time.sleep(poll_interval)
+        app.run()
+    return first_render, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--script", default="streamlit_app.py")
+    parser.add_argument("--repeat", type=int, default=3, help="Messungen pro Modul-Import")
+    parser.add_argument("--ready-timeout", type=float, default=600.0, help="Sekunden, die auf den Index gewartet wird")
+    parser.add_argument("--max-first-render", type=float, default=None, help="Budget für die erste Seite in Sekunden")
+    parser.add_argument("--skip-imports", action="store_true")
+    parser.add_argument("--output", help="Ergebnis als JSON speichern")
+    args = parser.parse_args()
+
+    report = {"imports_ms": {}, "deferred_imports_ms": {}}
+    # App zuerst messen: dieser Prozess hat bis hierher nur die Standardbibliothek geladen
+    first_render, ready = measure_app(args.script, args.ready_timeout)
+    report["first_render_s"] = first_render
+    report["ready_s"] = ready
+    print(f"Erste Seite:   {first_render:8.2f} s")
+    print(f"Index bereit:  {ready:8.2f} s" if ready is not None else "Index bereit:  Zeitüberschreitung")
+
+    if not args.skip_imports:
+        print(f"\n{'Modul':<28} {'Import':>10}")
+        for key, modules in (("imports_ms", RENDER_MODULES), ("deferred_imports_ms", DEFERRED_MODULES)):
+            if key == "deferred_imports_ms":
+                print("aufgeschoben (Hintergrund-Thread):")
+            for module in modules:
+                seconds = import_time(module, args.repeat)
+                report[key][module] = seconds * 1000 if seconds is not None else None
+                print(f"{module:<28} " + (f"{seconds * 1000:8.0f} ms" if seconds is not None else "  fehlt"))
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Gespeichert: {args.output}")
+
+    if args.max_first_render is not None and first_render > args.max_first_render:
+        print(f"Erste Seite langsamer als {args.max_first_render:.2f} s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
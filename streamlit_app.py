@@ -1,10 +1,9 @@
 # streamlit_app.py
 import streamlit as st
 import os
-from tabs import search_tab, documents_tab, admin_tab, chat_tab
-from utils.document_loader import load_documents_from_folder
-from utils.search import InMemoryVectorStore, HybridRetriever
-from sentence_transformers import SentenceTransformer
+import time
+from utils.startup import BackgroundLoader
+from utils.metrics import metrics
 
 # ------------------------------
 # Page Config
@@ -15,30 +14,167 @@ st.set_page_config(page_title="LexMind", layout="wide")
 # Dokumentenpfad
 # ------------------------------
 DOCS_PATH = "docs/"
+INDEX_PATH = ".index_cache/"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_THREADS = None  # None = Torch-Standard (alle Kerne)
+# Vektor-Index: "exact" (Brute Force) oder "ivf" (approximativ, für sehr grosse Korpora)
+VECTOR_INDEX = "exact"
+# z. B. {"nlist": 1024, "nprobe": 16} für "ivf"; {"quantize": True} hält nur int8-Codes
+# im Speicher (4× weniger) und bewertet die besten Kandidaten exakt aus dem Index-Cache nach
+VECTOR_INDEX_PARAMS = {}
+WATCH_INTERVAL = 5.0  # Sekunden zwischen zwei Abgleichen von docs/
+# Ergebnis-Cache für wiederholte Suchanfragen (über alle Sessions, bei Index-Änderung geleert)
+QUERY_CACHE_SIZE = 512
+QUERY_CACHE_TTL = 600  # Sekunden
+# Zweite Stufe: Cross-Encoder bewertet die besten RERANK_TOP_N Kandidaten neu
+# (Modell wird beim ersten Aufruf geladen; nach RERANK_TIME_BUDGET Sekunden gilt die Reihenfolge der ersten Stufe)
+RERANKER_ENABLED = False
+RERANK_TOP_N = 20
+RERANK_TIME_BUDGET = 0.5
+# Gemeinsamer Retrieval-Service: parallele Suchen, Micro-Batching der Query-Embeddings
+RETRIEVAL_WORKERS = 4
+RETRIEVAL_MAX_PENDING = 64
+# Port für den lokalen HTTP-Endpunkt (None = aus), damit weitere App-Prozesse den Index mitnutzen
+RETRIEVAL_HTTP_PORT = None
+# DOCX-Vorschauen im Hintergrund vorab erzeugen (sonst erst beim Klick auf "PDF-Vorschau")
+PREVIEW_WARMUP = False
+# Sekunden zwischen zwei Aktualisierungen der Ladeanzeige, solange der Index aufgebaut wird
+WARMUP_POLL_INTERVAL = 1.0
+# Laufzeitmessung pro Stufe (Admin-Tab); aus = kein Messaufwand auf dem Suchpfad
+METRICS_ENABLED = True
+metrics.enabled = METRICS_ENABLED
 
 # ------------------------------
-# Vectorstore & Retriever initialisieren
+# Vectorstore & Retriever im Hintergrund initialisieren
 # ------------------------------
-@st.cache_resource
-def init_vectorstore():
+def load_embedding_model(progress=None):
+    # sentence-transformers (und damit torch) erst hier importieren: dauert mehrere Sekunden
+    from sentence_transformers import SentenceTransformer
+    from utils.embeddings import SentenceTransformerProvider
+
+    return SentenceTransformerProvider(
+        SentenceTransformer(EMBEDDING_MODEL_NAME),
+        batch_size=EMBEDDING_BATCH_SIZE, num_threads=EMBEDDING_THREADS, progress=progress
+    )
+
+def load_index(loader):
+    """Läuft im Hintergrund-Thread (ohne Streamlit-Kontext); meldet den Fortschritt über `loader`."""
+    from utils.document_loader import load_documents_from_folder, IngestReport, CHUNKER_VERSION
+    from utils.search import InMemoryVectorStore, HybridRetriever
+    from utils.index_store import IndexStore, FolderWatcher, scan_folder, sync_retriever
+    from utils.query_cache import QueryCache
+    from utils.reranker import CrossEncoderReranker
+
     if not os.path.exists(DOCS_PATH):
-        st.warning(f"Dokumentenordner '{DOCS_PATH}' nicht gefunden.")
-        return [], None, None
+        return [], None, None, None
+
+    # Ingestion-Fehler pro Datei (wird im Admin-Tab angezeigt)
+    report = IngestReport()
 
-    docs = load_documents_from_folder(DOCS_PATH)
-    if not docs:
-        return [], None, None
+    # Embedding-Modell (mit Fortschrittsanzeige beim Kodieren grösserer Mengen)
+    loader.update("Embedding-Modell wird geladen …")
+    embedding_model = load_embedding_model(
+        progress=lambda done, total: loader.update(f"Embeddings: {done}/{total} Chunks", done / total)
+    )
 
-    # Embedding-Modell
-    embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+    reranker = None
+    if RERANKER_ENABLED:
+        # Vorab laden: sonst verbraucht die erste Suche ihr Zeitbudget mit dem Laden des Modells
+        loader.update("Re-Ranking-Modell wird geladen …")
+        reranker = CrossEncoderReranker(top_n=RERANK_TOP_N, time_budget=RERANK_TIME_BUDGET)
+        try:
+            reranker.warmup()
+        except Exception as e:
+            # Suche läuft auch ohne Re-Ranking; der Reranker versucht es bei Bedarf erneut
+            print(f"Re-Ranking-Modell nicht ladbar: {e}")
 
-    # InMemoryVectorStore
-    vectorstore = InMemoryVectorStore.from_documents(docs, embedding_model)
+    # Nicht lesbare Dateien {Pfad: Manifest-Eintrag}; erst nach einer Änderung erneut versuchen
+    failed = {}
+
+    # Gespeicherten Index laden und nur die Differenz zu docs/ neu indexieren
+    loader.update("Suchindex wird geladen …")
+    index_store = IndexStore(INDEX_PATH, EMBEDDING_MODEL_NAME, CHUNKER_VERSION)
+    cached = index_store.load()
+    if cached:
+        cached_files, docs, embeddings, bm25 = cached
+        files = scan_folder(DOCS_PATH, previous=cached_files)
+        vectorstore = InMemoryVectorStore.from_documents(
+            docs, embedding_model, embeddings, VECTOR_INDEX, normalized=True, **VECTOR_INDEX_PARAMS
+        )
+        retriever = HybridRetriever(
+            vectorstore, docs, embedding_model, bm25=bm25,
+            cache=QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL), reranker=reranker
+        )
+        if sync_retriever(retriever, cached_files, files, report, failed) or files != cached_files:
+            index_store.save_retriever(files, retriever)
+    else:
+        loader.update("Vorlagen werden eingelesen …")
+        files = scan_folder(DOCS_PATH)
+        docs = load_documents_from_folder(DOCS_PATH, report=report)
+        # Fehlerhafte Dateien nicht ins Manifest: der FolderWatcher versucht sie nach einer Änderung erneut
+        failed = {path: files.pop(path) for path in report.errors if path in files}
+        if not docs:
+            return [], None, None, report
 
-    # HybridRetriever
-    retriever = HybridRetriever(vectorstore, docs, embedding_model)
+        # InMemoryVectorStore
+        vectorstore = InMemoryVectorStore.from_documents(
+            docs, embedding_model, index=VECTOR_INDEX, **VECTOR_INDEX_PARAMS
+        )
 
-    return docs, vectorstore, retriever
+        # HybridRetriever
+        retriever = HybridRetriever(
+            vectorstore, docs, embedding_model,
+            cache=QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL), reranker=reranker
+        )
+
+        index_store.save_retriever(files, retriever)
+
+    # Spätere Aktualisierungen (FolderWatcher) sollen die Ladeanzeige nicht mehr verändern
+    embedding_model.progress = None
+
+    # Neue, geänderte und gelöschte Vorlagen im Hintergrund übernehmen
+    FolderWatcher(DOCS_PATH, retriever, index_store, files, interval=WATCH_INTERVAL, report=report,
+                  failed=failed).start()
+
+    if PREVIEW_WARMUP:
+        from utils.preview import PreviewWorker
+        PreviewWorker().submit(files)
+
+    loader.update("Bereit", 1.0)
+    return docs, vectorstore, retriever, report
+
+@st.cache_resource
+def start_warmup():
+    # Einmal pro Prozess; alle Sessions teilen sich Modell und Index
+    return BackgroundLoader(load_index, name="IndexWarmup")
+
+@st.cache_resource
+def init_retrieval_service(_retriever):
+    from utils.retrieval_service import RetrievalService, serve_http
+
+    service = RetrievalService(_retriever, max_workers=RETRIEVAL_WORKERS, max_pending=RETRIEVAL_MAX_PENDING)
+    if RETRIEVAL_HTTP_PORT:
+        serve_http(service, port=RETRIEVAL_HTTP_PORT)
+    return service
+
+@st.cache_resource
+def init_query_log():
+    # Prozessweit ein Log (JSON Lines unter .query_log/, rotiert nach Grösse)
+    from utils.query_log import QueryLog
+    return QueryLog()
+
+@st.fragment(run_every=WARMUP_POLL_INTERVAL)
+def render_warmup_status(loader):
+    if loader.ready:
+        # Ganze Seite neu ausführen, damit die Tabs den fertigen Index übernehmen
+        st.rerun()
+    status, progress = loader.snapshot()
+    elapsed = time.monotonic() - loader.started
+    if progress is None:
+        st.info(f"⏳ {status} ({elapsed:.0f} s) – die Suche ist gleich verfügbar.")
+    else:
+        st.progress(progress, text=f"⏳ {status}")
 
 # ------------------------------
 # Session State vorbereiten
@@ -49,38 +185,76 @@ if "vectorstore" not in st.session_state:
     st.session_state.vectorstore = None
 if "retriever" not in st.session_state:
     st.session_state.retriever = None
-
-# **Neu: search_queries initialisieren**
-if "search_queries" not in st.session_state:
-    st.session_state.search_queries = []
+if "ingest_report" not in st.session_state:
+    st.session_state.ingest_report = None
+if "retrieval_service" not in st.session_state:
+    st.session_state.retrieval_service = None
 
 # Optional: Suchergebnisse (falls search_tab sie nutzt)
 if "search_results" not in st.session_state:
     st.session_state.search_results = []
     
-# Vectorstore & Retriever initialisieren, falls noch nicht vorhanden
-if not st.session_state.retriever:
-    st.session_state.docs, st.session_state.vectorstore, st.session_state.retriever = init_vectorstore()
-
 # ------------------------------
 # App UI
 # ------------------------------
 st.title("LexMind - KI-Assistent für Juristen")
 st.write("Durchsuchen Sie juristische Vorlagen mit KI. Intelligent, schnell und präzise.")
 
+# Modell und Index laden im Hintergrund; die Seite wird sofort gerendert
+loader = start_warmup()
+st.session_state.index_ready = loader.ready
+if not loader.ready:
+    render_warmup_status(loader)
+elif loader.error:
+    st.error(f"Suchindex konnte nicht geladen werden: {loader.error}")
+    if st.button("🔄 Erneut versuchen"):
+        # Fehlgeschlagenen Loader verwerfen, sonst bleibt er bis zum Neustart im Cache.
+        # Hat eine andere Session schon neu gestartet, wird deren Loader nicht verworfen.
+        if start_warmup().error:
+            start_warmup.clear()
+        st.rerun()
+elif not st.session_state.retriever:
+    (st.session_state.docs, st.session_state.vectorstore,
+     st.session_state.retriever, st.session_state.ingest_report) = loader.result
+    if st.session_state.retriever:
+        st.session_state.retrieval_service = init_retrieval_service(st.session_state.retriever)
+    elif not os.path.exists(DOCS_PATH):
+        st.warning(f"Dokumentenordner '{DOCS_PATH}' nicht gefunden.")
+
+# Tab-Module erst nach Titel und Ladeanzeige importieren (langchain & Co. brauchen beim ersten Aufruf etwas Zeit)
+from tabs import search_tab, documents_tab, admin_tab, chat_tab
+
+query_log = init_query_log()
+
 tab_suche, tab_chat, tab_dokumente, tab_admin = st.tabs(["Suche", "Chat", "Dokumente", "Admin"])
+loading_message = "Suchindex wird geladen …"
 
 with tab_suche:
     if st.session_state.retriever:
-        search_tab.render(st.session_state.docs, st.session_state.retriever)
+        search_tab.render(st.session_state.docs, st.session_state.retrieval_service, query_log)
+    elif not loader.ready:
+        st.info(loading_message)
     else:
         st.warning("Keine Dokumente verfügbar. Bitte Dokumente in 'docs/' ablegen.")
 
 with tab_chat:
-    chat_tab.render()
+    if loader.ready:
+        chat_tab.render(st.session_state.retrieval_service)
+    else:
+        st.info(loading_message)
 
 with tab_dokumente:
-    documents_tab.render(st.session_state.docs)
+    if loader.ready:
+        retriever = st.session_state.retriever
+        documents_tab.render(st.session_state.docs, retriever.version if retriever else None)
+    else:
+        st.info(loading_message)
 
 with tab_admin:
-    admin_tab.render()
+    if not loader.ready:
+        st.caption(f"⏳ {loader.snapshot()[0]}")
+    elif loader.elapsed is not None:
+        st.caption(f"Suchindex bereit nach {loader.elapsed:.1f} s")
+    admin_tab.render(
+        st.session_state.ingest_report, st.session_state.retriever, st.session_state.retrieval_service, query_log
+    )
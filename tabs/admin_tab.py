@@ -1,17 +1,157 @@
 # tabs/admin_tab.py
 import streamlit as st
 import pandas as pd
+from utils.result_card import highlight_cache
+from utils.metrics import metrics, profile
 
-def render():
-    st.header("Admin – Suchanfragen")
+# Trefferzahl für das Profilieren einer einzelnen Suche (wie im Suche-Tab)
+PROFILE_TOP_K = 30
+
+def render_cache_stats(retriever):
+    reranker = retriever.reranker if retriever else None
+    caches = {
+        "Suchergebnisse": retriever.cache if retriever else None,
+        "Highlighting": highlight_cache,
+        "Re-Ranking-Scores": reranker.cache if reranker else None,
+    }
+    rows = []
+    for name, cache in caches.items():
+        if cache is None:
+            continue
+        stats = cache.stats()
+        rows.append({
+            "Cache": name,
+            "Trefferquote": f"{stats['hit_rate']:.0%}",
+            "Treffer": stats["hits"],
+            "Fehlschläge": stats["misses"],
+            "Einträge": f"{stats['entries']}/{stats['maxsize']}",
+            "Verdrängt": stats["evictions"],
+            "Invalidiert": stats["invalidations"],
+        })
+    st.subheader("Caches")
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    if reranker:
+        st.caption(f"Re-Ranking: {reranker.reranked} neu sortiert, {reranker.timeouts} Zeitüberschreitungen, "
+                   f"{reranker.cold} vor dem Laden des Modells, "
+                   f"{reranker.errors} Fehler (jeweils Reihenfolge der ersten Stufe)")
+
+def render_service_metrics(service):
+    snapshot = service.metrics()
+    st.subheader("Retrieval-Service")
+    cols = st.columns(5)
+    cols[0].metric("Warteschlange", snapshot["queue_depth"])
+    cols[1].metric("Aktiv", f"{snapshot['running']}/{service.max_workers}")
+    cols[2].metric("p50 / p95", f"{snapshot['p50_ms']:.0f} / {snapshot['p95_ms']:.0f} ms")
+    cols[3].metric("Ø Batch-Grösse", f"{snapshot['mean_batch_size']:.1f}")
+    cols[4].metric("Abgelehnt", snapshot["rejected"])
+
+def render_stage_metrics():
+    st.subheader("Laufzeit pro Stufe")
+    if not metrics.enabled:
+        st.info("Messung ist deaktiviert (METRICS_ENABLED in streamlit_app.py).")
+        return
+    snapshot = metrics.snapshot()
+    if not snapshot:
+        st.caption("Noch keine Messungen.")
+        return
+    st.dataframe(
+        pd.DataFrame([
+            {
+                "Stufe": name,
+                "Anzahl": values["count"],
+                "Ø ms": round(values["mean_ms"], 2),
+                "p50 ms": round(values["p50_ms"], 2),
+                "p95 ms": round(values["p95_ms"], 2),
+                "p99 ms": round(values["p99_ms"], 2),
+                "Max ms": round(values["max_ms"], 2),
+                "Total s": round(values["total_s"], 2),
+            }
+            for name, values in snapshot.items()
+        ]),
+        use_container_width=True, hide_index=True
+    )
+    st.caption("Perzentile sind aus Histogramm-Buckets geschätzt.")
+    st.download_button(
+        "📥 Prometheus-Format", file_name="metrics.prom", mime="text/plain", on_click="ignore",
+        data=lambda: metrics.prometheus().encode("utf-8")
+    )
+
+def render_profiler(retriever):
+    with st.expander("🔬 Einzelne Suche profilieren (cProfile)"):
+        query = st.text_input("Anfrage", key="profile_query")
+        if st.button("Profil erstellen", key="profile_run") and query.strip():
+            # Direkt auf dem Retriever (nicht über den Service), damit cProfile den Thread erfasst
+            try:
+                results, report = profile(retriever.search, query, k=PROFILE_TOP_K, use_cache=False)
+            except ValueError as e:
+                # z. B. läuft bereits ein anderer Profiler
+                st.warning(str(e))
+                return
+            st.caption(f"{len(results)} Treffer")
+            st.code(report, language=None)
 
-    if not st.session_state.search_queries:
+def render_query_analytics(query_log):
+    st.header("Admin – Suchanfragen")
+    if query_log is None:
+        st.info("Anfrage-Log ist nicht aktiv.")
+        return
+    stats = query_log.rollups()
+    if not stats["searches"]:
         st.info("Noch keine Suchanfragen vorhanden.")
         return
 
-    df = pd.DataFrame(st.session_state.search_queries)
-    st.dataframe(df, use_container_width=True)
+    total = stats["latency_ms"].get("total")
+    cols = st.columns(4)
+    cols[0].metric("Suchen", stats["searches"])
+    cols[1].metric("Verschiedene Anfragen", stats["distinct_queries"])
+    cols[2].metric("Ohne Treffer", f"{stats['zero_result_searches'] / stats['searches']:.0%}")
+    cols[3].metric("Klicks", stats["clicks"])
+    if total:
+        st.caption(f"Suchdauer p50 / p95 / p99: {total['p50']:.0f} / {total['p95']:.0f} / {total['p99']:.0f} ms")
+
+    col_top, col_zero = st.columns(2)
+    with col_top:
+        st.subheader("Häufigste Anfragen")
+        st.dataframe(pd.DataFrame(stats["top_queries"], columns=["Anfrage", "Anzahl"]),
+                     use_container_width=True, hide_index=True)
+    with col_zero:
+        st.subheader("Ohne Treffer")
+        st.dataframe(pd.DataFrame(stats["zero_result_queries"], columns=["Anfrage", "Anzahl"]),
+                     use_container_width=True, hide_index=True)
+
+    if stats["top_clicked"]:
+        st.subheader("Meistgeklickte Vorlagen")
+        st.dataframe(pd.DataFrame(stats["top_clicked"], columns=["Vorlage", "Klicks"]),
+                     use_container_width=True, hide_index=True)
+
+    st.subheader("Latenz pro Stufe (ms)")
+    st.dataframe(
+        pd.DataFrame([{"Stufe": stage, **values} for stage, values in stats["latency_ms"].items()]),
+        use_container_width=True, hide_index=True
+    )
+    if stats["dropped"] or stats["write_errors"]:
+        st.caption(f"Log: {stats['dropped']} Ereignisse verworfen, {stats['write_errors']} Schreibfehler")
+
+    # Export der Anfragen (Spalte "query", z. B. für benchmarks.retrieval_benchmark); erst beim Klick erzeugt
+    st.download_button(
+        "📥 Anfragen als CSV", file_name="search_queries.csv", mime="text/csv", on_click="ignore",
+        data=lambda: pd.DataFrame(query_log.query_counts(), columns=["query", "count"]).to_csv(index=False).encode("utf-8")
+    )
+
+def render(ingest_report=None, retriever=None, service=None, query_log=None):
+    if ingest_report is not None and ingest_report.errors:
+        with st.expander(f"⚠️ {len(ingest_report.errors)} Dokumente konnten nicht importiert werden"):
+            st.dataframe(
+                pd.DataFrame(
+                    [{"Datei": path, "Fehler": error} for path, error in sorted(ingest_report.errors.items())]
+                ),
+                use_container_width=True
+            )
 
-    # Optional: Export als CSV
-    csv = df.to_csv(index=False).encode("utf-8")
-    st.download_button("📥 Export als CSV", data=csv, file_name="search_queries.csv", mime="text/csv")
+    if service is not None:
+        render_service_metrics(service)
+    render_cache_stats(retriever)
+    render_stage_metrics()
+    if retriever is not None:
+        render_profiler(retriever)
+    render_query_analytics(query_log)
@@ -1,61 +1,102 @@
 # tabs/chat_tab.py
+import threading
 import streamlit as st
 import requests
-import time
+from utils.rag import (
+    RAG_TOP_K, answer_cache, answer_cache_key, build_rag_prompt, extractive_answer
+)
+from utils.search_llm import LLMBusyError, get_llm_service
+from utils.chat_client import ChatBackendError, ChatCancelled, get_chat_client
+from utils.retrieval_service import ServiceBusyError
+
+# "hf" (Hugging Face API), "local" (GPT4All, siehe utils/search_llm.py)
+# oder "extractive" (ohne Sprachmodell, zeigt nur die gefundenen Auszüge)
+CHAT_BACKEND = "hf"
+UNAVAILABLE_MESSAGE = "⚠️ Das Modell ist aktuell nicht erreichbar. Bitte versuche es in ein paar Sekunden erneut."
+STOPPED_MESSAGE = "⏹️ Antwort abgebrochen."
 
 # -------------------------------
 # Hugging Face API Call
 # -------------------------------
-def generate_hf_response(messages):
-    HF_TOKEN = st.secrets["HUGGINGFACE_TOKEN"]
-    # MODEL = "mistralai/Mistral-7B-Instruct-v0.2"
-    MODEL = "HuggingFaceH4/zephyr-7b-beta"
-
-    # Prompt aus bisherigen Nachrichten zusammenbauen
-    dialogue = ""
-    for m in messages:
-        dialogue += f"{m['role'].capitalize()}: {m['content']}\n"
-    dialogue += "Assistant:"
-
-    headers = {"Authorization": f"Bearer {HF_TOKEN}"}
-    payload = {
-        "inputs": dialogue,
-        "parameters": {
-            "temperature": 0.7,
-            "max_new_tokens": 400,
-            "return_full_text": False
-        }
-    }
-
-    # Retry-Mechanismus (HF ist manchmal kurz ausgelastet)
-    for attempt in range(3):
-        response = requests.post(
-            f"https://api-inference.huggingface.co/models/{MODEL}",
-            headers=headers,
-            json=payload,
-            timeout=60,
-        )
-        if response.status_code == 200:
-            data = response.json()
-            if isinstance(data, list) and len(data) > 0 and "generated_text" in data[0]:
-                return data[0]["generated_text"].strip()
-            else:
-                return str(data)
-        elif response.status_code == 503:
-            # Modell lädt noch (kommt häufig bei HF)
-            st.info("🚀 Modell wird geladen – bitte kurz warten...")
-            time.sleep(10)
-        else:
-            st.error(f"Fehler {response.status_code}: {response.text}")
-            break
+def stream_hf_response(prompt, status, cancel=None):
+    """Streamt die Antwort über den geteilten Client; Wartezeiten werden in `status` angezeigt."""
+    client = get_chat_client(st.secrets["HUGGINGFACE_TOKEN"])
+
+    def on_retry(attempt, delay, reason):
+        # Jede Anzeige ist für Streamlit ein Unterbrechungspunkt (neue Eingabe, Stopp-Button)
+        status.info(f"🚀 Modell wird geladen oder ist ausgelastet ({reason}) – "
+                    f"neuer Versuch {attempt} in {delay:.0f} s...")
+
+    yield from client.stream(prompt, cancel=cancel, on_retry=on_retry)
+    status.empty()
+
+
+def _backend_stream(prompt, question, docs, status, cancel):
+    if CHAT_BACKEND == "local":
+        return get_llm_service().stream(prompt)
+    if CHAT_BACKEND == "extractive":
+        return iter([extractive_answer(question, docs)])
+    return stream_hf_response(prompt, status, cancel)
+
 
-    return "⚠️ Das Modell ist aktuell nicht erreichbar. Bitte versuche es in ein paar Sekunden erneut."
+def stream_answer(prompt, question, docs, status, cancel=None):
+    """
+    Antwort des konfigurierten Backends als Token-Strom (für st.write_stream).
+    Fehler beim Laden oder Streamen beenden den Strom mit UNAVAILABLE_MESSAGE;
+    bereits gelieferter Text bleibt stehen, der Grund erscheint in `status`.
+    Ist das Event `cancel` gesetzt, endet der Strom mit STOPPED_MESSAGE.
+    """
+    started = False
+    try:
+        for token in _backend_stream(prompt, question, docs, status, cancel):
+            if cancel is not None and cancel.is_set():
+                raise ChatCancelled()
+            started = True
+            yield token
+        return
+    except ChatCancelled:
+        status.empty()
+        yield ("\n\n" if started else "") + STOPPED_MESSAGE
+        return
+    except (ChatBackendError, LLMBusyError) as e:
+        reason = str(e)
+    except ImportError:
+        reason = "Lokales Sprachmodell nicht verfügbar: gpt4all ist nicht installiert."
+    except requests.RequestException as e:
+        # vor OSError: RequestException ist eine Unterklasse davon
+        reason = f"Verbindung zum Modell unterbrochen ({type(e).__name__})."
+    except OSError as e:
+        reason = f"Lokales Sprachmodell konnte nicht geladen werden: {e}"
+    status.error(reason)
+    yield ("\n\n" if started else "") + UNAVAILABLE_MESSAGE
+
+
+def _recorded(tokens, parts):
+    """Reicht die Tokens durch und merkt sie in `parts` (Teilantwort für den Stopp-Button)."""
+    for token in tokens:
+        parts.append(token)
+        yield token
+
+
+def stop_generation():
+    """
+    on_click des Stopp-Buttons. Streamlit hat den laufenden Lauf beim Klick schon am
+    nächsten Ausgabepunkt abgebrochen; hier wird das Cancel-Event gesetzt und die bis
+    dahin gestreamte Teilantwort in den Verlauf übernommen.
+    """
+    st.session_state.chat_cancel.set()
+    parts = st.session_state.pop("chat_partial", None)
+    if parts is None:
+        return  # Antwort war schon fertig
+    partial = "".join(parts)
+    st.session_state.chat_messages.append(
+        {"role": "assistant", "content": (partial + "\n\n" if partial else "") + STOPPED_MESSAGE})
 
 
 # -------------------------------
 # Chat Interface
 # -------------------------------
-def render():
+def render(retriever=None):
     st.subheader("💬 Chat mit LexMind")
 
     if "chat_messages" not in st.session_state:
@@ -68,15 +109,42 @@ def render():
 
     # Neue Nutzereingabe
     if prompt := st.chat_input("Frage stellen oder mit der KI chatten..."):
+        history = list(st.session_state.chat_messages)
         st.session_state.chat_messages.append({"role": "user", "content": prompt})
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # Antwort generieren
+        # Passende Vorlagen-Auszüge als Kontext
+        try:
+            docs = [doc for doc, _ in retriever.search(prompt, k=RAG_TOP_K)] if retriever else []
+        except ServiceBusyError:
+            # Ohne Kontext antworten statt den Chat zu blockieren
+            docs = []
+        cache_key = answer_cache_key(prompt, docs)
+
+        # Antwort generieren (oder aus dem Cache)
         with st.chat_message("assistant"):
-            with st.spinner("Mistral denkt nach..."):
-                answer = generate_hf_response(st.session_state.chat_messages)
+            answer = answer_cache.get(cache_key)
+            if answer is not None:
                 st.markdown(answer)
+                st.caption("⚡ Antwort aus dem Cache")
+            else:
+                llm_prompt = build_rag_prompt(prompt, docs, history)
+                status = st.empty()
+                cancel = st.session_state.chat_cancel = threading.Event()
+                parts = st.session_state.chat_partial = []
+                stop = st.empty()
+                stop.button("⏹️ Antwort stoppen", on_click=stop_generation, key="chat_stop")
+                answer = st.write_stream(_recorded(stream_answer(llm_prompt, prompt, docs, status, cancel), parts))
+                st.session_state.pop("chat_partial", None)
+                stop.empty()
+                if answer and not answer.endswith((UNAVAILABLE_MESSAGE, STOPPED_MESSAGE)):
+                    answer_cache.put(cache_key, answer)
+
+            if docs:
+                with st.expander("📚 Quellen"):
+                    for i, doc in enumerate(docs, start=1):
+                        st.write(f"[{i}] {doc.metadata.get('source', 'Unbekannt')} – {doc.metadata.get('heading', '–')}")
 
         # Antwort speichern
         st.session_state.chat_messages.append({"role": "assistant", "content": answer})
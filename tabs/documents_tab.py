@@ -1,27 +1,44 @@
 import streamlit as st
 import os
+from utils.pagination import paginate, render_page_controls
 
-def render(docs):
-    # Einzigartige Dokumente filtern
-    seen = set()
-    unique_docs = []
+# Pro Rerun werden nur die Zeilen der aktuellen Seite gerendert
+DOCUMENTS_PER_PAGE = 50
+
+def document_overview(docs):
+    # Einzigartige Dokumente filtern (Name, Kategorie), alphabetisch
+    seen = {}
     for doc in docs:
         source = doc.metadata.get("source")
         if source not in seen:
-            seen.add(source)
-            unique_docs.append(doc)
+            seen[source] = (os.path.basename(source or "Unbekannt"), doc.metadata.get("category", "–"))
+    return sorted(seen.values(), key=lambda row: row[0].lower())
+
+def render(docs, version=None):
+    # Übersicht nur neu aufbauen, wenn sich der Index geändert hat (nicht bei jedem Rerun über alle Chunks)
+    cached = st.session_state.get("documents_overview")
+    if cached is None or cached[0] != (version, len(docs)):
+        cached = ((version, len(docs)), document_overview(docs))
+        st.session_state.documents_overview = cached
+    rows = cached[1]
 
     # Titel mit Anzahl
-    st.subheader(f"Dokumentenübersicht – Total {len(unique_docs)} Vorlagen")
+    st.subheader(f"Dokumentenübersicht – Total {len(rows)} Vorlagen")
+
+    name_filter = st.text_input(
+        "Vorlage suchen", key="documents_filter", placeholder="Name enthält …",
+        on_change=lambda: st.session_state.update(documents_page=1)
+    )
+    if name_filter:
+        needle = name_filter.lower()
+        rows = [row for row in rows if needle in row[0].lower()]
 
-    # Dokumentliste
-    for doc in unique_docs:
-        name = os.path.basename(doc.metadata.get("source", "Unbekannt"))
-        category = doc.metadata.get("category", "–")
+    # Dokumentliste (seitenweise)
+    page_rows, _, page, n_pages = paginate(rows, DOCUMENTS_PER_PAGE, "documents_page")
+    for name, category in page_rows:
         col1, col2 = st.columns([3, 1])
         with col1:
             st.write(f"📄 **{name}**")
         with col2:
             st.write(f"📁 *Kategorie:* `{category}`")
-
-
+    render_page_controls(page, n_pages, "documents_page")
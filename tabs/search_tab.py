@@ -1,10 +1,17 @@
 # tabs/search_tab.py
 import streamlit as st
-from utils.result_card import render_result_card
-from utils.search import HybridRetriever
-from datetime import datetime
+from utils.result_card import render_result_card, compute_highlight_terms, make_snippet
+from utils.retrieval_service import RetrievalService, ServiceBusyError
+from utils.pagination import paginate, render_page_controls
+from utils.query_log import QueryLog
+from utils.rag import chunk_id
+import time
 
-def render(docs, retriever: HybridRetriever):
+SEARCH_TOP_K = 30
+# Pro Rerun werden nur die Karten der aktuellen Seite gerendert
+RESULTS_PER_PAGE = 10
+
+def render(docs, retriever: RetrievalService, query_log: QueryLog = None):
     if not docs or not retriever:
         st.warning("Keine Dokumente oder Retriever verfügbar.")
         return
@@ -18,23 +25,64 @@ def render(docs, retriever: HybridRetriever):
         height=100
     )
 
+    # Filter: nur Chunks der gewählten Kategorien/Vorlagen werden bewertet
+    col_category, col_source = st.columns(2)
+    categories = col_category.multiselect(
+        "Kategorie", list(retriever.filter_values("category")), key="filter_category", placeholder="Alle Kategorien"
+    )
+    sources = col_source.multiselect(
+        "Vorlage", list(retriever.filter_values("source")), key="filter_source", placeholder="Alle Vorlagen"
+    )
+
     # Suche starten
     search = st.button("🔍 Suche")
 
     if search and query.strip():
-        results = retriever.search(query, k=10, alpha=alpha)
+        filters = {"category": categories, "source": sources}
+        timings = {}
+        start = time.perf_counter()
+        try:
+            results = retriever.search(query, k=SEARCH_TOP_K, alpha=alpha, filters=filters, timings=timings)
+        except ServiceBusyError as e:
+            st.warning(f"⏳ {e}")
+            return
+        timings["total"] = time.perf_counter() - start
 
-        # Logging
-        st.session_state.search_queries.append({
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "query": query.strip(),
-            "results_count": len(results)
-        })
+        # Logging (asynchron, prozessweit)
+        if query_log is not None:
+            query_log.record_search(
+                query.strip(), len(results), [chunk_id(doc) for doc, _ in results], filters, timings
+            )
+
+        # Ergebnisse merken, damit sie Reruns (z. B. durch Vorschau-Buttons) überstehen
+        st.session_state.search_results = results
+        st.session_state.search_results_query = query
+        st.session_state.search_page = 1
 
         if not results:
             st.warning("⚠️ Keine relevanten Dokumente gefunden.")
-        else:
-            st.write(f"{len(results)} relevante Treffer gefunden:")
 
-            for i, (doc, score) in enumerate(results):
-                render_result_card(doc, i, query, retriever.embedding_model, score)
+    results = st.session_state.search_results
+    if results:
+        result_query = st.session_state.get("search_results_query", query)
+        st.write(f"{len(results)} relevante Treffer gefunden:")
+
+        page_results, start, page, n_pages = paginate(results, RESULTS_PER_PAGE, "search_page")
+        # Highlighting für alle Karten der Seite in einem Aufruf (bei Reruns aus dem Highlight-Cache)
+        highlights = compute_highlight_terms(
+            [make_snippet(doc) for doc, _ in page_results], result_query, retriever.embedding_model,
+            service=retriever
+        )
+        for i, (doc, score) in enumerate(page_results, start=start):
+            render_result_card(
+                doc, i, result_query, retriever.embedding_model, score, highlight_terms=highlights,
+                log_click=_click_logger(query_log, result_query, doc)
+            )
+        render_page_controls(page, n_pages, "search_page")
+
+
+def _click_logger(query_log, query, doc):
+    if query_log is None:
+        return None
+    result_id, source = chunk_id(doc), doc.metadata.get("source")
+    return lambda action: query_log.record_click(query.strip(), result_id, source, action)
@@ -0,0 +1,75 @@
+import random
+import numpy as np
+from rank_bm25 import BM25Okapi
+from utils.bm25 import IncrementalBM25
+
+VOCAB = [
+    "miete", "kündigung", "frist", "vertrag", "haftung", "gesellschaft", "arbeit",
+    "lohn", "ferien", "gerichtsstand", "recht", "bürgschaft", "darlehen", "zins",
+]
+
+
+def random_corpus(n, seed):
+    rng = random.Random(seed)
+    return [[rng.choice(VOCAB) for _ in range(rng.randint(1, 12))] for _ in range(n)]
+
+
+def queries():
+    return [[term] for term in VOCAB] + [["miete", "frist"], ["vertrag", "vertrag", "zins"], ["unbekannt"]]
+
+
+def assert_same_scores(bm25, corpus):
+    reference = BM25Okapi(corpus)
+    for query in queries():
+        np.testing.assert_allclose(bm25.get_scores(query), reference.get_scores(query), rtol=1e-9, atol=1e-12)
+
+
+def test_matches_bm25okapi():
+    corpus = random_corpus(60, seed=1)
+    assert_same_scores(IncrementalBM25(corpus), corpus)
+
+
+def test_matches_after_add():
+    corpus = random_corpus(40, seed=2)
+    bm25 = IncrementalBM25(corpus[:25])
+    bm25.get_scores(["miete"])  # Postings aufbauen, damit das Hinzufügen sie invalidieren muss
+    bm25.add_documents(corpus[25:] + [["neuerbegriff", "miete"]])
+    assert_same_scores(bm25, corpus + [["neuerbegriff", "miete"]])
+
+
+def test_matches_after_remove():
+    corpus = random_corpus(40, seed=3)
+    bm25 = IncrementalBM25(corpus)
+    bm25.get_scores(["miete"])
+    removed = {0, 7, 8, 39}
+    bm25.remove_indices(removed)
+    assert_same_scores(bm25, [doc for i, doc in enumerate(corpus) if i not in removed])
+
+
+def test_matches_after_update():
+    # Update wie HybridRetriever.update_source: alte Chunks entfernen, neue anhängen
+    corpus = random_corpus(30, seed=4)
+    bm25 = IncrementalBM25(corpus)
+    bm25.get_scores(["miete"])
+    replacement = random_corpus(5, seed=5)
+    bm25.remove_indices(range(10, 15))
+    bm25.add_documents(replacement)
+    assert_same_scores(bm25, corpus[:10] + corpus[15:] + replacement)
+
+
+def test_sparse_scores_respect_allowed_ids():
+    corpus = random_corpus(50, seed=6)
+    bm25 = IncrementalBM25(corpus)
+    full = bm25.get_scores(["vertrag", "haftung"])
+    allowed = np.array([1, 4, 9, 20, 33])
+    ids, scores = bm25.get_sparse_scores(["vertrag", "haftung"], allowed)
+    assert set(ids) <= set(allowed)
+    np.testing.assert_allclose(scores, full[ids])
+    assert set(ids) == {i for i in allowed if full[i] != 0}
+
+
+def test_single_and_empty_corpus():
+    assert_same_scores(IncrementalBM25([["miete"]]), [["miete"]])
+    empty = IncrementalBM25()
+    assert empty.get_scores(["miete"]).shape == (0,)
+    assert len(empty.get_sparse_scores(["miete"])[0]) == 0
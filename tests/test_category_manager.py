@@ -0,0 +1,51 @@
+import pytest
+from utils import category_manager
+from utils.category_manager import CategoryMatcher
+
+CATEGORIES = {
+    "Verträge": ["vertrag", "miete", "gründungsvertrag"],
+    "Urkunden": ["gründung", "register"],
+    "Klagen": ["gericht", "klage", "klagen"],
+    "Andere": [],
+}
+
+
+@pytest.fixture(params=["automaton", "words"])
+def matcher(request):
+    matcher = CategoryMatcher(CATEGORIES)
+    if request.param == "words":
+        matcher.automaton = None
+    elif matcher.automaton is None:
+        pytest.skip("pyahocorasick nicht installiert")
+    return matcher
+
+
+def test_counts_hits_inside_compounds(matcher):
+    assert matcher.count("Der Mietvertrag und der Kaufvertrag.") == {"Verträge": 2}
+
+
+def test_longest_keyword_wins_without_overlap(matcher):
+    # "gründungsvertrag" zählt einmal für Verträge, nicht zusätzlich "gründung" und "vertrag"
+    assert matcher.count("Gründungsvertrag") == {"Verträge": 1}
+    assert matcher.count("Klagen vor Gericht") == {"Klagen": 2}
+
+
+def test_most_hits_win_and_ties_follow_category_order(matcher):
+    assert matcher.assign("Vertrag. Klage beim Gericht, Klage abgewiesen.") == "Klagen"
+    assert matcher.assign("Vertrag und Register") == "Verträge"
+    assert matcher.assign("Nichts Passendes") == "Andere"
+
+
+def test_batch_matches_single(matcher):
+    texts = ["Registergericht", "Mietvertrag", "", "Klage\nKlage\nVertrag"] * 3
+    assert matcher.count_many(texts) == [matcher.count(t) for t in texts]
+    assert matcher.assign_many(texts) == [matcher.assign(t) for t in texts]
+
+
+def test_word_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(category_manager, "WORD_CACHE_SIZE", 5)
+    matcher = CategoryMatcher(CATEGORIES)
+    matcher.automaton = None
+    matcher.count("eins zwei drei vier fünf sechs sieben Vertrag")
+    assert len(matcher._seen) <= 8
+    assert matcher.count("Vertrag") == {"Verträge": 1}
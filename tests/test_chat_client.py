@@ -0,0 +1,185 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.chat_client import ChatBackendError, ChatCancelled, HFChatClient, RateLimiter
+
+
+def sse(*tokens, special=()):
+    lines = [f"data: {json.dumps({'token': {'text': t, 'special': t in special}})}\n\n" for t in tokens]
+    return "".join(lines).encode("utf-8")
+
+
+class MockServer:
+    """HF-Inference-Endpunkt im Test-Thread; `replies` wird pro Anfrage der Reihe nach abgearbeitet."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                server.requests.append((self.path, self.headers["Authorization"], json.loads(body)))
+                status, headers, payload = server.replies.pop(0) if server.replies else (200, {}, b"")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, args=(0.01,), daemon=True).start()
+
+    def client(self, **params):
+        params = {"backoff_base": 0.01, "backoff_max": 0.05, "timeout": 5,
+                  "rate_limiter": RateLimiter(rate=1000, burst=1000), **params}
+        return HFChatClient("secret", model="test/model", base_url=self.url, **params)
+
+
+@pytest.fixture
+def mock_server():
+    servers = []
+
+    def start(*replies):
+        servers.append(MockServer(replies))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.httpd.shutdown()
+        server.httpd.server_close()
+
+
+SSE_HEADERS = {"Content-Type": "text/event-stream"}
+
+
+def test_stream_parses_server_sent_events(mock_server):
+    server = mock_server((200, SSE_HEADERS, sse("Hallo", " Wel", "t", "</s>", special={"</s>"})))
+
+    tokens = list(server.client().stream("Frage", max_new_tokens=5))
+
+    assert tokens == ["Hallo", " Wel", "t"]
+    path, auth, payload = server.requests[0]
+    assert path == "/test/model"
+    assert auth == "Bearer secret"
+    assert payload["inputs"] == "Frage" and payload["stream"] is True
+    assert payload["parameters"]["max_new_tokens"] == 5
+
+
+def test_stream_decodes_utf8_without_charset(mock_server):
+    server = mock_server((200, SSE_HEADERS, sse("Gemäß", " §", " 5")))
+
+    assert server.client().generate("Frage") == "Gemäß § 5"
+
+
+def test_non_streaming_json_response(mock_server):
+    body = json.dumps([{"generated_text": "  Ganze Antwort  "}]).encode()
+    server = mock_server((200, {"Content-Type": "application/json"}, body))
+
+    assert list(server.client().stream("Frage")) == ["Ganze Antwort"]
+
+
+def test_error_event_raises(mock_server):
+    body = b'data: {"error": "Input too long"}\n\n'
+    server = mock_server((200, SSE_HEADERS, body))
+
+    with pytest.raises(ChatBackendError, match="Input too long"):
+        list(server.client().stream("Frage"))
+
+
+def test_retries_503_then_streams(mock_server):
+    loading = json.dumps({"error": "loading", "estimated_time": 0.01}).encode()
+    server = mock_server((503, {}, loading), (429, {"Retry-After": "0"}, b""),
+                         (200, SSE_HEADERS, sse("ok")))
+    retries = []
+
+    tokens = list(server.client().stream("Frage", on_retry=lambda *args: retries.append(args)))
+
+    assert tokens == ["ok"]
+    assert len(server.requests) == 3
+    assert {(attempt, reason) for attempt, _, reason in retries} == {(1, "HTTP 503"), (2, "HTTP 429")}
+
+
+def test_gives_up_after_max_retries(mock_server):
+    server = mock_server(*[(502, {}, b"")] * 5)
+
+    with pytest.raises(ChatBackendError, match="HTTP 502"):
+        list(server.client(max_retries=2).stream("Frage"))
+    assert len(server.requests) == 3
+
+
+def test_client_error_is_not_retried(mock_server):
+    server = mock_server((401, {}, b"Invalid token"), (200, SSE_HEADERS, sse("ok")))
+
+    with pytest.raises(ChatBackendError, match="401"):
+        list(server.client().stream("Frage"))
+    assert len(server.requests) == 1
+
+
+def test_backoff_honours_estimated_time():
+    client = HFChatClient("secret", backoff_base=0.0, backoff_max=20.0)
+
+    class Response:
+        status_code = 503
+        headers = {}
+
+        def json(self):
+            return {"estimated_time": 7.5}
+
+    assert client._backoff(0, Response()) == 7.5
+
+
+def test_cancel_during_backoff(mock_server):
+    server = mock_server(*[(503, {"Retry-After": "10"}, b"")] * 3)
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+
+    start = time.monotonic()
+    with pytest.raises(ChatCancelled):
+        list(server.client(backoff_max=10).stream("Frage", cancel=cancel))
+    assert time.monotonic() - start < 2
+    assert len(server.requests) == 1
+
+
+def test_cancel_while_streaming(mock_server):
+    server = mock_server((200, SSE_HEADERS, sse("a", "b", "c")))
+    cancel = threading.Event()
+    stream = server.client().stream("Frage", cancel=cancel)
+
+    assert next(stream) == "a"
+    cancel.set()
+    with pytest.raises(ChatCancelled):
+        next(stream)
+
+
+def test_rate_limiter_spaces_requests_after_burst():
+    limiter = RateLimiter(rate=50, burst=2)
+
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+
+    # 2 sofort aus dem Burst, die übrigen 3 im Abstand von 1/50 s
+    assert time.monotonic() - start >= 0.05
+
+
+def test_rate_limiter_wait_can_be_cancelled():
+    limiter = RateLimiter(rate=0.1, burst=1)
+    limiter.acquire()
+    cancel = threading.Event()
+    cancel.set()
+
+    with pytest.raises(ChatCancelled):
+        limiter.acquire(cancel)
@@ -0,0 +1,153 @@
+import os
+import stat
+import struct
+
+import pytest
+
+from utils import doc_converter
+from utils.doc_converter import (
+    CONVERTER_MEMORY_LIMIT, CONVERTER_TIMEOUT, convert_doc_to_text, extract_text_from_doc_binary,
+    extract_text_with_converter,
+)
+
+SECTOR = 512
+FREE, END, FAT_SECTOR, NO_STREAM = 0xFFFFFFFF, 0xFFFFFFFE, 0xFFFFFFFD, 0xFFFFFFFF
+TEXT_OFFSET = 0x800
+
+
+# -------------------------------
+# Minimaler Compound-File-Writer (OLE v3, nur grosse Streams)
+# -------------------------------
+def _dir_entry(name, kind, start=END, size=0, left=NO_STREAM, right=NO_STREAM, child=NO_STREAM):
+    encoded = (name + "\0").encode("utf-16-le")
+    return (encoded.ljust(64, b"\0") + struct.pack("<HBB3I", len(encoded), kind, 1, left, right, child)
+            + b"\0" * 36 + struct.pack("<IQ", start, size))
+
+
+def write_ole(path, streams):
+    """Schreibt `streams` {Name: Bytes} als Compound File; Streams ≥ 4096 Bytes (kein Mini-Stream)."""
+    names = sorted(streams, key=lambda n: (len(n), n.upper()))
+    fat = [FAT_SECTOR, END]  # Sektor 0: FAT, Sektor 1: Verzeichnis
+    data, starts = b"", {}
+    for name in names:
+        payload = streams[name].ljust(max(len(streams[name]), 4096), b"\0")
+        sectors = -(-len(payload) // SECTOR)
+        starts[name] = len(fat)
+        fat += [len(fat) + i + 1 for i in range(sectors - 1)] + [END]
+        data += payload.ljust(sectors * SECTOR, b"\0")
+    assert len(fat) <= SECTOR // 4
+
+    # Verzeichnis: Root -> erster Stream, weitere als rechte Geschwister (aufsteigend sortiert)
+    entries = [_dir_entry("Root Entry", 5, child=1)]
+    for i, name in enumerate(names, start=1):
+        right = i + 1 if i < len(names) else NO_STREAM
+        entries.append(_dir_entry(name, 2, starts[name], len(streams[name].ljust(4096, b"\0")), right=right))
+    directory = b"".join(entries).ljust(SECTOR, b"\0")
+
+    header = (bytes.fromhex("D0CF11E0A1B11AE1") + b"\0" * 16
+              + struct.pack("<HHHHH", 0x3E, 3, 0xFFFE, 9, 6) + b"\0" * 6
+              + struct.pack("<IIIIIIIII", 0, 1, 1, 0, 4096, END, 0, END, 0)
+              + struct.pack("<109I", 0, *[FREE] * 108))
+    fat_sector = struct.pack(f"<{SECTOR // 4}I", *(fat + [FREE] * (SECTOR // 4 - len(fat))))
+    with open(path, "wb") as f:
+        f.write(header + fat_sector + directory + data)
+
+
+# -------------------------------
+# Word-97-Dokument mit Piece Table
+# -------------------------------
+def word_document(path, pieces, ccp_text=None, encrypted=False, table="0Table", table_name=None, prc=False):
+    """`pieces`: Liste (Text, komprimiert); komprimierte Stücke in cp1252, sonst UTF-16."""
+    word = bytearray(TEXT_OFFSET)
+    cps, pcds, cp = [0], b"", 0
+    for text, compressed in pieces:
+        offset = len(word)
+        word += text.encode("cp1252" if compressed else "utf-16-le")
+        fc = (offset * 2) | 0x40000000 if compressed else offset
+        pcds += struct.pack("<HIH", 0, fc, 0)
+        cp += len(text)
+        cps.append(cp)
+    flags = (0x0100 if encrypted else 0) | (0x0200 if table == "1Table" else 0)
+    struct.pack_into("<HH", word, 0, 0xA5EC, 0x00C1)
+    struct.pack_into("<H", word, 0x0A, flags)
+    struct.pack_into("<i", word, 0x4C, cp if ccp_text is None else ccp_text)
+
+    plc = struct.pack(f"<{len(cps)}I", *cps) + pcds
+    clx = (b"\x01" + struct.pack("<H", 3) + b"\x00\x00\x00" if prc else b"") + b"\x02" + struct.pack("<I", len(plc)) + plc
+    struct.pack_into("<II", word, 0x01A2, 0, len(clx))
+    write_ole(path, {"WordDocument": bytes(word), table_name or table: clx})
+    return path
+
+
+def test_compressed_and_utf16_pieces(tmp_path):
+    path = word_document(tmp_path / "a.doc", [
+        ("Vertrag über 5 €\r", True),
+        ("Kündigung § 3 – Frist\r", False),
+        ("\x13 HYPERLINK \"x\" \x14Link\x15 Ende\r", True),
+    ])
+
+    assert extract_text_from_doc_binary(str(path)) == "Vertrag über 5 €\nKündigung § 3 – Frist\nLink Ende"
+
+
+def test_text_after_main_document_is_ignored(tmp_path):
+    main = "Haupttext\r"
+    path = word_document(tmp_path / "a.doc", [(main, True), ("Fussnote\r", False)], ccp_text=len(main))
+
+    assert extract_text_from_doc_binary(str(path)) == "Haupttext"
+
+
+def test_formatting_entries_before_piece_table_are_skipped(tmp_path):
+    path = word_document(tmp_path / "a.doc", [("Mit Prc\r", False)], table="1Table", prc=True)
+
+    assert extract_text_from_doc_binary(str(path)) == "Mit Prc"
+
+
+def test_encrypted_document_is_rejected(tmp_path):
+    path = word_document(tmp_path / "a.doc", [("geheim", True)], encrypted=True)
+
+    with pytest.raises(ValueError, match="verschlüsselt"):
+        extract_text_from_doc_binary(str(path))
+
+
+def test_missing_table_stream(tmp_path):
+    path = word_document(tmp_path / "a.doc", [("Text", True)], table="1Table", table_name="0Table")
+
+    with pytest.raises(ValueError, match="1Table fehlt"):
+        extract_text_from_doc_binary(str(path))
+
+
+def test_converter_fallback_and_cache(tmp_path, monkeypatch):
+    path = word_document(tmp_path / "a.doc", [("geheim", True)], encrypted=True)
+    calls = []
+    monkeypatch.setattr(doc_converter, "extract_text_with_converter",
+                        lambda p: calls.append(p) or "Text vom Konverter")
+    cache = str(tmp_path / "cache")
+
+    assert convert_doc_to_text(str(path), cache) == "Text vom Konverter"
+    assert convert_doc_to_text(str(path), cache) == "Text vom Konverter"
+    assert len(calls) == 1
+
+
+def test_unreadable_without_converter(tmp_path, monkeypatch):
+    path = word_document(tmp_path / "a.doc", [("geheim", True)], encrypted=True)
+    monkeypatch.setattr(doc_converter, "extract_text_with_converter", lambda p: None)
+
+    with pytest.raises(ValueError, match=".doc nicht lesbar: Dokument ist verschlüsselt"):
+        convert_doc_to_text(str(path), str(tmp_path / "cache"))
+
+
+@pytest.mark.skipif(os.name != "posix", reason="ulimit-Sandbox nur unter POSIX")
+def test_external_converter_runs_with_limits(tmp_path, monkeypatch):
+    # Ersatz für antiword: gibt die im Kindprozess geltenden Limits und die Argumente aus
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "antiword"
+    script.write_text('#!/bin/sh\nulimit -v\nulimit -t\necho "$@"\n')
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", str(bin_dir))
+    doc = tmp_path / "a.doc"
+    doc.write_bytes(b"")
+
+    text = extract_text_with_converter(str(doc))
+
+    assert text.split("\n") == [str(CONVERTER_MEMORY_LIMIT // 1024), str(CONVERTER_TIMEOUT), f"-w 0 {doc}"]
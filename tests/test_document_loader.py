@@ -0,0 +1,36 @@
+from utils.document_loader import split_into_chunks_by_heading
+
+
+def contents(chunks):
+    return "\n".join(chunk["content"] for chunk in chunks)
+
+
+def test_heading_lines_with_sentence_text_are_indexed():
+    text = (
+        "Art. 1 Die Bürgschaft richtet sich nach Art. 492 ff. OR.\n"
+        "Art. 2 Der Bürge haftet solidarisch mit dem Hauptschuldner.\n"
+    )
+    chunks = split_into_chunks_by_heading(text)
+    assert "Die Bürgschaft richtet sich nach Art. 492 ff. OR." in contents(chunks)
+    assert "Der Bürge haftet solidarisch mit dem Hauptschuldner." in contents(chunks)
+
+
+def test_bare_heading_only_appears_in_heading_path():
+    text = "Art. 3 Mietzins\n§ 12 Kündigung\nDie Kündigung erfolgt schriftlich.\n"
+    chunks = split_into_chunks_by_heading(text)
+    assert len(chunks) == 1
+    assert chunks[0]["heading_path"] == "Art. 3 Mietzins > § 12 Kündigung"
+
+
+def test_no_chunk_consists_of_a_bare_heading_alone():
+    text = "§ 4 Pflichten des Vertreters\n" + "Er wahrt die Interessen.\n" * 3
+    chunks = split_into_chunks_by_heading(text, max_tokens=6, overlap=2)
+    assert all(chunk["content"] != "§ 4 Pflichten des Vertreters" for chunk in chunks)
+    assert "Pflichten des Vertreters" in contents(chunks)
+
+
+def test_long_sections_are_split_with_overlap():
+    words = [f"wort{i}" for i in range(30)]
+    chunks = split_into_chunks_by_heading(" ".join(words), max_tokens=10, overlap=2)
+    assert all(len(chunk["content"].split()) <= 10 for chunk in chunks)
+    assert chunks[1]["content"].split()[:2] == words[8:10]
@@ -0,0 +1,111 @@
+from utils import index_store
+from utils.index_store import sync_retriever
+
+
+class RecordingRetriever:
+    def __init__(self):
+        self.sources = {}
+
+    def remove_source(self, path):
+        self.sources.pop(path, None)
+
+    def update_source(self, path, chunks):
+        self.sources[path] = chunks
+
+
+def entry(sha1, mtime_ns=1):
+    return {"size": 10, "mtime_ns": mtime_ns, "sha1": sha1}
+
+
+def fake_ingest(results):
+    def iter_documents_from_files(paths, max_workers=None, report=None):
+        for path in paths:
+            chunks, error = results[path]
+            if report is not None:
+                report.record(path, len(chunks), error)
+            yield path, chunks, error
+    return iter_documents_from_files
+
+
+def test_parse_error_keeps_previous_chunks_and_hash(monkeypatch):
+    retriever = RecordingRetriever()
+    retriever.sources = {"a.docx": ["alt"], "b.docx": ["b"]}
+    old = {"a.docx": entry("old"), "b.docx": entry("b")}
+    new = {"a.docx": entry("new", mtime_ns=2), "b.docx": entry("b")}
+    monkeypatch.setattr(index_store, "iter_documents_from_files", fake_ingest({"a.docx": ([], "ValueError: kaputt")}))
+
+    assert sync_retriever(retriever, old, new) == 0
+    assert retriever.sources["a.docx"] == ["alt"]
+    assert new["a.docx"] == old["a.docx"]
+
+    # Nächster Abgleich: Datei gilt weiterhin als geändert und wird erneut eingelesen
+    monkeypatch.setattr(index_store, "iter_documents_from_files", fake_ingest({"a.docx": (["neu"], None)}))
+    newer = {"a.docx": entry("new", mtime_ns=2), "b.docx": entry("b")}
+    assert sync_retriever(retriever, new, newer) == 1
+    assert retriever.sources["a.docx"] == ["neu"]
+    assert newer["a.docx"]["sha1"] == "new"
+
+
+def test_failed_new_file_stays_out_of_manifest(monkeypatch):
+    retriever = RecordingRetriever()
+    new = {"c.pdf": entry("c")}
+    monkeypatch.setattr(index_store, "iter_documents_from_files", fake_ingest({"c.pdf": ([], "RuntimeError: x")}))
+    assert sync_retriever(retriever, {}, new) == 0
+    assert "c.pdf" not in new and "c.pdf" not in retriever.sources
+
+
+def test_failed_file_is_skipped_until_its_content_changes(monkeypatch):
+    retriever = RecordingRetriever()
+    retriever.sources = {"a.docx": ["alt"]}
+    failed = {}
+    calls = []
+    broken = fake_ingest({"a.docx": ([], "ValueError: kaputt")})
+    monkeypatch.setattr(index_store, "iter_documents_from_files",
+                        lambda paths, **kw: (calls.append(list(paths)), broken(paths, **kw))[1])
+
+    old = {"a.docx": entry("old")}
+    new = {"a.docx": entry("new", mtime_ns=2)}
+    sync_retriever(retriever, old, new, failed=failed)
+    assert failed == {"a.docx": entry("new", mtime_ns=2)}
+
+    # Gleicher Inhalt: kein erneutes Einlesen
+    again = {"a.docx": entry("new", mtime_ns=2)}
+    assert sync_retriever(retriever, new, again, failed=failed) == 0
+    assert calls == [["a.docx"], []]
+    assert again["a.docx"] == old["a.docx"]
+
+    # Inhalt geändert: neuer Versuch, bei Erfolg vergessen
+    monkeypatch.setattr(index_store, "iter_documents_from_files", fake_ingest({"a.docx": (["neu"], None)}))
+    fixed = {"a.docx": entry("fixed", mtime_ns=3)}
+    assert sync_retriever(retriever, again, fixed, failed=failed) == 1
+    assert retriever.sources["a.docx"] == ["neu"] and not failed
+
+
+def test_failed_file_is_forgotten_when_deleted(monkeypatch):
+    failed = {"c.pdf": entry("c")}
+    monkeypatch.setattr(index_store, "iter_documents_from_files", fake_ingest({}))
+
+    sync_retriever(RecordingRetriever(), {}, {}, failed=failed)
+
+    assert not failed
+
+
+def test_folder_watcher_neither_reparses_nor_rehashes_a_broken_file(tmp_path, monkeypatch):
+    (tmp_path / "kaputt.docx").write_bytes(b"kein docx")
+    calls, hashed = [], []
+    broken = fake_ingest({str(tmp_path / "kaputt.docx"): ([], "BadZipFile: kein docx")})
+    monkeypatch.setattr(index_store, "iter_documents_from_files",
+                        lambda paths, **kw: (calls.extend(paths), broken(paths, **kw))[1])
+    original_sha1 = index_store.file_sha1
+    monkeypatch.setattr(index_store, "file_sha1", lambda path: hashed.append(path) or original_sha1(path))
+
+    class Store:
+        def save_retriever(self, files, retriever):
+            pass
+
+    watcher = index_store.FolderWatcher(str(tmp_path), RecordingRetriever(), Store(), {})
+    for _ in range(3):
+        watcher.sync()
+
+    assert len(calls) == len(hashed) == 1
+    assert watcher.files == {}
@@ -0,0 +1,39 @@
+from utils import query_log
+from utils.query_log import QueryLog
+
+
+def test_counters_stay_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_log, "MAX_DISTINCT_QUERIES", 100)
+    log = QueryLog(str(tmp_path / "queries.jsonl"))
+
+    for _ in range(3):
+        log.record_search("häufig ohne treffer", 0)
+    for i in range(1000):
+        log.record_search(f"selten {i}", 0)
+    log.flush()
+
+    rollups = log.rollups(top=1)
+    assert len(log._queries) <= 100 and len(log._zero_results) <= 100
+    assert rollups["zero_result_queries"] == [("häufig ohne treffer", 3)]
+    assert rollups["zero_result_searches"] <= 100 + 3
+    assert rollups["searches"] == 1003
+
+
+def test_rollups_are_rebuilt_from_the_log(tmp_path):
+    path = str(tmp_path / "queries.jsonl")
+    log = QueryLog(path)
+    log.record_search("Kündigung", 2, ["a", "b"], timings={"total": 0.01})
+    log.record_search("Mietvertrag?", 0)
+    log.record_click("Kündigung", "a", "kuendigung.docx")
+    log.flush()
+
+    restarted = QueryLog(path)
+    # Der Schreib-Thread baut die Rollups erst aus dem Log auf und verarbeitet dann die Warteschlange
+    restarted.record_search("Frist", 1)
+    restarted.flush()
+    rollups = restarted.rollups()
+
+    assert (rollups["searches"], rollups["clicks"]) == (3, 1)
+    assert rollups["zero_result_queries"] == [("mietvertrag?", 1)]
+    assert rollups["top_clicked"] == [("kuendigung.docx", 1)]
+    assert rollups["latency_ms"]["total"]["p50"] == 10.0
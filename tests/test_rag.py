@@ -0,0 +1,80 @@
+import pytest
+from langchain.docstore.document import Document
+
+from utils.rag import (
+    AnswerCache, answer_cache_key, build_rag_prompt, estimate_tokens, extractive_answer,
+    truncate_to_tokens,
+)
+
+
+def doc(text, source="vertrag.docx", path="/vorlagen/vertrag.docx", heading="§ 1"):
+    return Document(page_content=text, metadata={"source": source, "path": path, "heading": heading})
+
+
+def long_text(words):
+    return " ".join(f"wort{i}" for i in range(words))
+
+
+@pytest.mark.parametrize("budget", [120, 200, 333, 500, 777, 1500])
+def test_prompt_stays_within_budget(budget):
+    docs = [doc(long_text(800), heading=f"§ {i}") for i in range(5)]
+    history = [{"role": "user", "content": long_text(400)}, {"role": "assistant", "content": long_text(400)}] * 3
+
+    prompt = build_rag_prompt("Wie lange gilt die Kündigungsfrist?", docs, history, budget=budget)
+
+    assert estimate_tokens(prompt) <= budget
+    assert prompt.endswith("User: Wie lange gilt die Kündigungsfrist?\nAssistant:")
+
+
+def test_prompt_keeps_newest_history_and_all_short_excerpts():
+    docs = [doc("Die Frist beträgt drei Monate.", heading="§ 5"), doc("Schriftform ist erforderlich.", heading="§ 6")]
+    history = [{"role": "user", "content": "alt " * 500}, {"role": "assistant", "content": "Neueste Antwort"}]
+
+    prompt = build_rag_prompt("Frist?", docs, history)
+
+    assert "[1] vertrag.docx – § 5\nDie Frist beträgt drei Monate." in prompt
+    assert "[2] vertrag.docx – § 6\nSchriftform ist erforderlich." in prompt
+    assert "Assistant: Neueste Antwort" in prompt
+    assert prompt.count("alt ") < 500
+
+
+def test_unused_excerpt_budget_goes_to_later_docs():
+    docs = [doc("kurz"), doc(long_text(2000))]
+
+    prompt = build_rag_prompt("Frage", docs, [], budget=600, history_budget=0)
+
+    # Der zweite Auszug erhält mehr als die Hälfte des Budgets
+    assert prompt.count("wort") * 1.5 > (600 - estimate_tokens(prompt.split("Auszüge:")[0])) / 2
+
+
+def test_truncate_cuts_at_word_boundary():
+    assert truncate_to_tokens("eins zwei drei vier", 3) == "eins zwei …"
+    assert truncate_to_tokens("kurz", 3) == "kurz"
+    assert truncate_to_tokens("Donaudampfschifffahrt", 2) == "Donaudam …"
+
+
+def test_cache_key_normalises_question_and_tracks_chunks():
+    docs = [doc("Inhalt A"), doc("Inhalt B")]
+
+    assert answer_cache_key("  Wie lange  gilt die Frist? ", docs) == answer_cache_key("wie lange gilt die frist", docs)
+    assert answer_cache_key("Frist?", docs) != answer_cache_key("Frist?", docs[::-1])
+    assert answer_cache_key("Frist?", docs) != answer_cache_key("Frist?", [doc("Inhalt A geändert"), docs[1]])
+
+
+def test_answer_cache_evicts_least_recently_used():
+    cache = AnswerCache(maxsize=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "C")
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c"), len(cache)) == ("A", "C", 2)
+
+
+def test_extractive_answer_lists_sources():
+    answer = extractive_answer("Frage", [doc("x" * 500, source="nda.pdf")], max_chars=10)
+
+    assert "**[1] nda.pdf**" in answer
+    assert "x" * 10 + "…" in answer and "x" * 11 not in answer
+    assert "keine passenden Vorlagen" in extractive_answer("Frage", [])
@@ -0,0 +1,101 @@
+import threading
+import time
+
+from langchain.docstore.document import Document
+
+from utils.query_cache import QueryCache
+from utils.reranker import CrossEncoderReranker
+
+
+class StubCrossEncoder:
+    """Bewertet nach Textlänge; `gate` hält Vorhersagen an, bis der Test sie freigibt."""
+
+    def __init__(self, delay=0.0, gate=None):
+        self.delay = delay
+        self.gate = gate
+        self.calls = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.calls.append(pairs)
+        if self.gate is not None:
+            self.gate.wait(5)
+        time.sleep(self.delay)
+        return [float(len(doc)) for _, doc in pairs]
+
+
+def results(*texts):
+    return [(Document(page_content=text, metadata={"path": text}), 1.0 - i / 10) for i, text in enumerate(texts)]
+
+
+def reranker(model, **params):
+    return CrossEncoderReranker(model=model, cache=QueryCache(maxsize=100, ttl=None), **params)
+
+
+def test_reranks_after_warmup_and_caches_scores():
+    model = StubCrossEncoder()
+    rr = reranker(model, time_budget=1.0)
+    rr.warmup()
+
+    ranked, complete = rr.rerank("Frage", results("a", "ccc", "bb"), k=2)
+    again, _ = rr.rerank("Frage", results("a", "ccc", "bb"), k=2)
+
+    assert complete
+    assert [doc.page_content for doc, _ in ranked] == [doc.page_content for doc, _ in again] == ["ccc", "bb"]
+    assert len(model.calls) == 2  # Warmup + eine Bewertung, der zweite Aufruf kommt aus dem Cache
+
+
+def test_cold_model_does_not_spend_the_budget():
+    gate = threading.Event()
+    rr = reranker(StubCrossEncoder(gate=gate), time_budget=1.0)
+
+    start = time.monotonic()
+    ranked, complete = rr.rerank("Frage", results("a", "ccc"), k=2)
+
+    assert time.monotonic() - start < 0.5
+    assert not complete and rr.cold == 1 and rr.timeouts == 0
+    assert [doc.page_content for doc, _ in ranked] == ["a", "ccc"]
+
+    gate.set()
+    assert rr._ready.wait(2)
+    ranked, complete = rr.rerank("Frage", results("a", "ccc"), k=2)
+    assert complete and ranked[0][0].page_content == "ccc"
+
+
+def test_timed_out_jobs_do_not_pile_up():
+    gate = threading.Event()
+    model = StubCrossEncoder()
+    rr = reranker(model, time_budget=0.05)
+    rr.warmup()
+    model.gate = gate
+
+    for i in range(5):
+        _, complete = rr.rerank(f"Frage {i}", results("a", "bb"), k=2)
+        assert not complete
+    gate.set()
+    rr._executor.submit(lambda: None).result(2)
+
+    assert rr.timeouts == 5
+    # Warmup + die bereits laufende erste Anfrage; die wartenden wurden verworfen
+    assert len(model.calls) == 2
+    # Die laufende Rechnung hat den Score-Cache trotzdem gefüllt
+    assert rr.rerank("Frage 0", results("a", "bb"), k=2)[1]
+
+
+def test_without_budget_waits_for_model_load():
+    rr = reranker(StubCrossEncoder(delay=0.05), time_budget=None)
+
+    ranked, complete = rr.rerank("Frage", results("a", "ccc"), k=1)
+
+    assert complete and ranked[0][0].page_content == "ccc" and rr.cold == 0
+
+
+def test_k_above_top_n_keeps_first_stage_tail():
+    rr = reranker(StubCrossEncoder(), time_budget=1.0, top_n=2)
+    rr.warmup()
+    first_stage = results("a", "ccc", "dddd", "bb", "e")
+
+    ranked, complete = rr.rerank("Frage", first_stage, k=4)
+
+    assert complete
+    assert [doc.page_content for doc, _ in ranked] == ["ccc", "a", "dddd", "bb"]
+    assert ranked[2:] == first_stage[2:4]
@@ -0,0 +1,131 @@
+import threading
+import time
+import zlib
+
+import numpy as np
+import pytest
+from langchain.docstore.document import Document
+
+from utils.embeddings import EmbeddingProvider
+from utils.metrics import metrics
+from utils.result_card import compute_highlight_terms, highlight_cache, word_embedding_cache
+from utils.retrieval_service import QueryEncoder, RetrievalService, ServiceBusyError
+from utils.search import HybridRetriever, InMemoryVectorStore
+
+
+class RecordingEmbeddings(EmbeddingProvider):
+    """Bag-of-Words-Vektoren; merkt sich jeden Modellaufruf mit Thread und Batch."""
+
+    def __init__(self, delay=0.0):
+        super().__init__()
+        self.delay = delay
+        self.calls = []
+
+    def _encode_batch(self, texts):
+        self.calls.append((threading.current_thread().name, list(texts)))
+        time.sleep(self.delay)
+        out = np.full((len(texts), 32), 1e-3, dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                out[row, zlib.crc32(word.encode()) % 32] += 1.0
+        return out
+
+
+def test_concurrent_queries_are_encoded_in_few_batches():
+    provider = RecordingEmbeddings(delay=0.02)
+    encoder = QueryEncoder(provider, batch_size=8, max_wait=0.05)
+    texts = [f"anfrage {i}" for i in range(16)]
+    results = {}
+    threads = [threading.Thread(target=lambda t=t: results.setdefault(t, encoder.encode(t))) for t in texts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert encoder.encoded == 16 and encoder.batches < 16
+    assert all(len(batch) <= 8 for _, batch in provider.calls)
+    for text in texts:
+        np.testing.assert_allclose(results[text], provider.encode_query(text), rtol=1e-6)
+
+
+def test_document_jobs_run_on_the_encoder_thread():
+    provider = RecordingEmbeddings()
+    encoder = QueryEncoder(provider)
+
+    embeddings = encoder.encode_documents(["miete", "pacht"])
+
+    assert embeddings.shape == (2, 32)
+    assert provider.calls == [("QueryEncoder", ["miete", "pacht"])]
+    assert encoder.batches == 0  # zählt nur Anfrage-Batches
+
+
+def test_encoder_errors_reach_the_caller():
+    class Broken(RecordingEmbeddings):
+        def _encode_batch(self, texts):
+            raise RuntimeError("Modell kaputt")
+
+    encoder = QueryEncoder(Broken())
+    with pytest.raises(RuntimeError, match="kaputt"):
+        encoder.encode("anfrage")
+    with pytest.raises(RuntimeError, match="kaputt"):
+        encoder.encode_documents(["wort"])
+    # Der Encoder-Thread läuft weiter
+    assert encoder._thread.is_alive()
+
+
+class BlockingRetriever:
+    def __init__(self):
+        self.embedding_model = RecordingEmbeddings()
+        self.release = threading.Event()
+
+    def search(self, query, k, alpha, fusion, encoder=None, timings=None, filters=None):
+        self.release.wait(5)
+        return []
+
+
+def test_full_queue_rejects_with_service_busy_error():
+    retriever = BlockingRetriever()
+    service = RetrievalService(retriever, max_workers=1, max_pending=2, wait_timeout=0.05)
+    accepted = [service.submit("a"), service.submit("b")]
+
+    with pytest.raises(ServiceBusyError):
+        service.submit("c")
+    assert service.metrics()["rejected"] == 1
+
+    retriever.release.set()
+    for future in accepted:
+        assert future.result(5) == []
+    # Plätze wieder frei
+    assert service.search("d") == []
+    assert service.metrics()["completed"] == 3
+
+
+def make_service():
+    docs = [Document(page_content=text, metadata={"path": f"/v/{i}"})
+            for i, text in enumerate(["Mietvertrag Wohnung Kündigung", "Pachtvertrag Acker", "Arbeitsvertrag Probezeit"])]
+    provider = RecordingEmbeddings()
+    retriever = HybridRetriever(InMemoryVectorStore(docs, provider), docs, provider)
+    return RetrievalService(retriever), provider
+
+
+def test_highlighting_reuses_query_embedding_and_encoder_thread():
+    service, provider = make_service()
+    results = service.search("Mietvertrag Kündigung", k=2)
+    highlight_cache.clear()
+    word_embedding_cache._data.clear()
+    provider.calls.clear()
+    metrics.reset()
+
+    terms = compute_highlight_terms(
+        [doc.page_content for doc, _ in results], "Mietvertrag Kündigung", provider, threshold=0.5, service=service
+    )
+
+    assert "Mietvertrag" in terms
+    # Kein zweites Query-Embedding; Wörter in einem Auftrag im Encoder-Thread
+    assert len(provider.calls) == 1
+    thread, words = provider.calls[0]
+    assert thread == "QueryEncoder" and "Mietvertrag Kündigung" not in words
+    # Highlighting läuft unter eigener Stufe, nicht unter der Indexierung
+    stages = metrics.snapshot()
+    assert stages["ui.highlight.encode"]["count"] == 1
+    assert "embed.documents" not in stages
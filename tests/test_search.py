@@ -0,0 +1,148 @@
+import threading
+import zlib
+
+import numpy as np
+import pytest
+from langchain.docstore.document import Document
+
+from utils.bm25 import IncrementalBM25
+from utils.embeddings import EmbeddingProvider
+from utils.index_store import IndexStore
+from utils.search import HybridRetriever, InMemoryVectorStore, ReadWriteLock, tokenize
+
+
+class HashEmbeddings(EmbeddingProvider):
+    """Deterministische Bag-of-Words-Vektoren statt eines echten Modells."""
+
+    def _encode_batch(self, texts):
+        out = np.zeros((len(texts), 32), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in tokenize(text):
+                out[row, zlib.crc32(word.encode()) % 32] += 1.0
+        return out + 1e-3
+
+
+def make_retriever(n=20):
+    docs = [Document(page_content=f"Vertrag {i} regelt Miete und Kündigung {i % 3}",
+                     metadata={"path": f"/v/{i % 5}.docx", "source": f"{i % 5}.docx"}) for i in range(n)]
+    model = HashEmbeddings()
+    return HybridRetriever(InMemoryVectorStore(docs, model), docs, model)
+
+
+def run_in_thread(fn):
+    thread = threading.Thread(target=fn, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_readers_share_the_lock():
+    lock = ReadWriteLock()
+    both_inside = threading.Barrier(2, timeout=2)
+
+    def reader():
+        with lock.read():
+            both_inside.wait()
+
+    threads = [run_in_thread(reader) for _ in range(2)]
+    for thread in threads:
+        thread.join(3)
+    assert not both_inside.broken
+
+
+def test_waiting_writer_excludes_readers_and_has_priority():
+    lock = ReadWriteLock()
+    order = []
+    release_reader = threading.Event()
+
+    def first_reader():
+        with lock.read():
+            release_reader.wait(2)
+            order.append("reader 1")
+
+    def writer():
+        with lock.write():
+            order.append("writer")
+
+    def second_reader():
+        with lock.read():
+            order.append("reader 2")
+
+    threads = [run_in_thread(first_reader)]
+    while not lock._readers:
+        pass
+    threads.append(run_in_thread(writer))
+    while not lock._waiting_writers:
+        pass
+    threads.append(run_in_thread(second_reader))
+    release_reader.set()
+    for thread in threads:
+        thread.join(3)
+
+    assert order == ["reader 1", "writer", "reader 2"]
+
+
+def test_searches_and_updates_run_while_index_is_saved(tmp_path, monkeypatch):
+    retriever = make_retriever()
+    store = IndexStore(str(tmp_path), "hash", 1)
+    writing, finish = threading.Event(), threading.Event()
+    original_save = IndexStore.save
+
+    def slow_save(self, *args):
+        writing.set()
+        finish.wait(5)
+        original_save(self, *args)
+
+    monkeypatch.setattr(IndexStore, "save", slow_save)
+    saver = run_in_thread(lambda: store.save_retriever({}, retriever))
+    assert writing.wait(2)
+
+    # Beides darf nicht auf den Schreibvorgang warten
+    results = []
+    worker = run_in_thread(lambda: (
+        results.append(retriever.search("Miete Kündigung", k=3)),
+        retriever.update_source("/v/0.docx", [Document(page_content="Neu", metadata={"path": "/v/0.docx"})]),
+    ))
+    worker.join(2)
+    assert not worker.is_alive() and results[0]
+
+    finish.set()
+    saver.join(5)
+    # Index hat sich während des Speicherns geändert: Matrix bleibt im Speicher
+    assert not isinstance(retriever.vectorstore.embeddings, np.memmap)
+    assert len(retriever.vectorstore.embeddings) == len(retriever.texts) == 17
+
+
+def test_saved_snapshot_matches_index_and_attaches_memory_map(tmp_path):
+    retriever = make_retriever()
+    store = IndexStore(str(tmp_path), "hash", 1)
+
+    store.save_retriever({}, retriever)
+
+    assert isinstance(retriever.vectorstore.embeddings, np.memmap)
+    _, docs, embeddings, bm25 = store.load()
+    assert [doc.page_content for doc in docs] == [doc.page_content for doc in retriever.texts]
+    np.testing.assert_allclose(embeddings, retriever.vectorstore.embeddings)
+    query = tokenize("Miete Kündigung 2")
+    np.testing.assert_allclose(bm25.get_scores(query), retriever.bm25.get_scores(query))
+
+
+def test_snapshot_is_independent_of_later_updates():
+    retriever = make_retriever()
+    docs, embeddings, bm25, version = retriever.snapshot()
+    expected = IncrementalBM25([tokenize(doc.page_content) for doc in docs])
+
+    retriever.remove_source("/v/1.docx")
+    retriever.add_documents([Document(page_content="Pacht und Miete", metadata={"path": "/v/9.docx"})])
+
+    assert len(docs) == len(embeddings) == 20 and version != retriever.version
+    for query in (["miete"], ["pacht"], ["kündigung", "1"]):
+        np.testing.assert_allclose(bm25.get_scores(query), expected.get_scores(query))
+    assert not retriever.attach_vectors(np.array(embeddings), version)
+
+
+def test_embedding_provider_without_encode_batch_fails_at_instantiation():
+    class Incomplete(EmbeddingProvider):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
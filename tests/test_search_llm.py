@@ -0,0 +1,130 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from tabs import chat_tab
+from tabs.chat_tab import STOPPED_MESSAGE, UNAVAILABLE_MESSAGE
+from utils.chat_client import ChatBackendError
+from utils.search_llm import LLMBusyError, LLMService
+
+
+class StubModel:
+    def __init__(self, tokens=("Die ", "Antwort", "."), delay=0.0, error=None):
+        self.tokens = tokens
+        self.delay = delay
+        self.error = error
+
+    def generate(self, prompt, max_tokens=400, temp=0.7, streaming=True):
+        for token in self.tokens:
+            time.sleep(self.delay)
+            yield token
+        if self.error is not None:
+            raise self.error
+
+
+class Status:
+    def __init__(self):
+        self.messages = []
+
+    def info(self, text):
+        self.messages.append(("info", text))
+
+    def error(self, text):
+        self.messages.append(("error", text))
+
+    def empty(self):
+        self.messages.append(("empty", None))
+
+
+def test_stream_yields_tokens_and_returns_model_to_pool():
+    created = []
+    service = LLMService(lambda: created.append(1) or StubModel(), pool_size=1)
+
+    assert list(service.stream("Frage")) == ["Die ", "Antwort", "."]
+    assert service.generate("Frage") == "Die Antwort."
+    assert len(created) == 1
+
+
+def test_busy_pool_raises_after_queue_timeout():
+    service = LLMService(StubModel, pool_size=1, queue_timeout=0.05)
+    running = service.stream("Frage")
+    next(running)  # hält die einzige Instanz
+
+    with pytest.raises(LLMBusyError):
+        next(service.stream("Frage"))
+
+    running.close()
+    assert next(service.stream("Frage")) == "Die "
+
+
+def test_generation_timeout_keeps_partial_answer():
+    service = LLMService(lambda: StubModel(tokens=["a"] * 50, delay=0.01), generation_timeout=0.05)
+
+    answer = service.generate("Frage")
+
+    assert 1 <= len(answer) < 50
+
+
+def test_failed_model_load_frees_pool_slot():
+    calls = []
+
+    def factory():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ImportError("No module named 'gpt4all'")
+        return StubModel()
+
+    service = LLMService(factory, pool_size=1, queue_timeout=0.05)
+    with pytest.raises(ImportError):
+        service.generate("Frage")
+    assert service.generate("Frage") == "Die Antwort."
+
+
+@pytest.mark.parametrize("error", [
+    LLMBusyError("ausgelastet"),
+    ImportError("No module named 'gpt4all'"),
+    requests.ConnectionError("reset"),
+    ChatBackendError("Modell nicht erreichbar"),
+    OSError("Modelldatei fehlt"),
+])
+def test_stream_answer_keeps_partial_answer_on_backend_error(monkeypatch, error):
+    service = LLMService(lambda: StubModel(error=error))
+    monkeypatch.setattr(chat_tab, "CHAT_BACKEND", "local")
+    monkeypatch.setattr(chat_tab, "get_llm_service", lambda: service)
+    status = Status()
+
+    answer = "".join(chat_tab.stream_answer("Prompt", "Frage", [], status))
+
+    assert answer.startswith("Die Antwort.")
+    assert answer.endswith(UNAVAILABLE_MESSAGE)
+    assert [kind for kind, _ in status.messages] == ["error"]
+
+
+def test_stream_answer_reports_missing_local_backend(monkeypatch):
+    def missing():
+        raise ImportError("No module named 'gpt4all'")
+
+    monkeypatch.setattr(chat_tab, "CHAT_BACKEND", "local")
+    monkeypatch.setattr(chat_tab, "get_llm_service", lambda: LLMService(missing))
+    status = Status()
+
+    answer = "".join(chat_tab.stream_answer("Prompt", "Frage", [], status))
+
+    assert answer == UNAVAILABLE_MESSAGE
+    assert "gpt4all" in status.messages[0][1]
+
+
+def test_stream_answer_stops_when_cancelled(monkeypatch):
+    service = LLMService(lambda: StubModel(tokens=["a", "b", "c"]))
+    monkeypatch.setattr(chat_tab, "CHAT_BACKEND", "local")
+    monkeypatch.setattr(chat_tab, "get_llm_service", lambda: service)
+    cancel = threading.Event()
+    stream = chat_tab.stream_answer("Prompt", "Frage", [], Status(), cancel)
+
+    assert next(stream) == "a"
+    cancel.set()
+
+    assert "".join(stream) == "\n\n" + STOPPED_MESSAGE
+    assert service.generate("Frage") == "abc"  # Instanz wieder frei
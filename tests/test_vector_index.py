@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from utils.vector_index import VectorIndex, create_vector_index, normalize_rows
+
+
+def random_vectors(n, dim=16, seed=0, spread=1.0):
+    rng = np.random.default_rng(seed)
+    return normalize_rows(rng.standard_normal((n, dim)).astype(np.float32) * spread)
+
+
+def test_add_refits_quantizer_when_values_exceed_scale():
+    # Kleine Werte in Dimension 0 ergeben dort eine kleine Skala
+    spread = np.ones(16, dtype=np.float32)
+    spread[0] = 0.01
+    index = create_vector_index("exact", random_vectors(200, spread=spread), quantize=True, normalized=True)
+    outlier = np.zeros((1, 16), dtype=np.float32)
+    outlier[0, 0] = 1.0
+
+    index.add(outlier)
+
+    decoded = index.codes[-1].astype(np.float32) * index.scale
+    assert decoded[0] == pytest.approx(1.0, rel=0.01)
+    ids, scores = index.search(outlier[0], k=1)
+    assert ids[0] == 200 and scores[0] == pytest.approx(1.0, abs=1e-6)
+
+
+def test_add_within_scale_keeps_codes_of_existing_rows():
+    vectors = random_vectors(300, seed=1)
+    index = create_vector_index("exact", vectors[:200], quantize=True, normalized=True)
+    codes, scale = index.codes.copy(), index.scale.copy()
+    inside = vectors[200:][(np.abs(vectors[200:]) <= scale * 127).all(axis=1)]
+
+    index.add(inside)
+
+    np.testing.assert_array_equal(index.codes[:200], codes)
+    np.testing.assert_array_equal(index.scale, scale)
+
+
+@pytest.mark.parametrize("kind", ["exact", "ivf"])
+def test_quantized_search_matches_exact_after_adds(kind):
+    vectors = random_vectors(1000, seed=2)
+    params = {"min_train_size": 100} if kind == "ivf" else {}
+    index = create_vector_index(kind, vectors[:100], quantize=True, normalized=True, **params)
+    exact = create_vector_index("exact", vectors, normalized=True)
+    for start in range(100, 1000, 100):
+        index.add(vectors[start:start + 100])
+
+    query = vectors[123]
+    assert index.search(query, k=1)[0][0] == exact.search(query, k=1)[0][0] == 123
+
+
+def test_subclass_without_search_fails_at_instantiation():
+    class Incomplete(VectorIndex):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete(np.eye(2, dtype=np.float32))
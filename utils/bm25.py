@@ -0,0 +1,170 @@
+# utils/bm25.py
+from collections import Counter
+from typing import Iterable, List, Tuple
+import numpy as np
+
+
+# ------------------------------
+# Inkrementeller BM25-Index (invertierter Index)
+# ------------------------------
+class IncrementalBM25:
+    """
+    BM25 mit denselben Formeln und Parametern wie `rank_bm25.BM25Okapi`.
+
+    Dokumente werden als kompakte Arrays (Term-IDs, Häufigkeiten) gehalten;
+    daraus wird bei Bedarf ein invertierter Index mit Postings-Arrays gebaut.
+    Eine Suche bewertet damit nur Dokumente, die einen Suchbegriff enthalten.
+    Hinzufügen und Entfernen schreibt die Dokument-Häufigkeiten fort und
+    markiert den Postings-Index lediglich als veraltet.
+    """
+
+    def __init__(self, corpus: Iterable[List[str]] = (), k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        self.vocab = {}
+        self.df = np.zeros(0, dtype=np.int64)
+        self.doc_terms: List[np.ndarray] = []
+        self.doc_tfs: List[np.ndarray] = []
+        self.doc_len: List[int] = []
+        self.num_tokens = 0
+        self._postings = None
+
+        self.add_documents(corpus)
+
+    @property
+    def corpus_size(self) -> int:
+        return len(self.doc_len)
+
+    @property
+    def avgdl(self) -> float:
+        return self.num_tokens / self.corpus_size if self.corpus_size else 0.0
+
+    # ------------------------------
+    # Aktualisierung
+    # ------------------------------
+    def add_documents(self, tokenized_docs: Iterable[List[str]]):
+        for tokens in tokenized_docs:
+            freqs = Counter(tokens)
+            term_ids = np.fromiter(
+                (self.vocab.setdefault(term, len(self.vocab)) for term in freqs),
+                dtype=np.int32, count=len(freqs)
+            )
+            if len(self.vocab) > len(self.df):
+                # Amortisiert wachsen, statt bei jedem neuen Term zu kopieren
+                grow = max(len(self.vocab), 2 * len(self.df)) - len(self.df)
+                self.df = np.concatenate([self.df, np.zeros(grow, dtype=np.int64)])
+            self.df[term_ids] += 1
+            self.doc_terms.append(term_ids)
+            self.doc_tfs.append(np.fromiter(freqs.values(), dtype=np.float64, count=len(freqs)))
+            self.doc_len.append(len(tokens))
+            self.num_tokens += len(tokens)
+        self._postings = None
+
+    def copy(self) -> "IncrementalBM25":
+        """
+        Unabhängige Kopie (z. B. zum Speichern ohne gehaltenen Lock). Die Arrays pro
+        Dokument werden nie verändert, nur angehängt oder entfernt, und daher geteilt.
+        """
+        clone = IncrementalBM25(k1=self.k1, b=self.b, epsilon=self.epsilon)
+        clone.vocab = dict(self.vocab)
+        clone.df = self.df.copy()
+        clone.doc_terms = list(self.doc_terms)
+        clone.doc_tfs = list(self.doc_tfs)
+        clone.doc_len = list(self.doc_len)
+        clone.num_tokens = self.num_tokens
+        return clone
+
+    def remove_indices(self, indices: Iterable[int]):
+        """Entfernt Dokumente anhand ihrer Position; nachfolgende Positionen rücken nach."""
+        for i in sorted(set(indices), reverse=True):
+            self.df[self.doc_terms.pop(i)] -= 1
+            self.doc_tfs.pop(i)
+            self.num_tokens -= self.doc_len.pop(i)
+        self._postings = None
+
+    # ------------------------------
+    # Invertierter Index
+    # ------------------------------
+    def _build(self):
+        """Baut Postings (pro Term: Dokument-IDs und Häufigkeiten) sowie IDF und Längennormierung."""
+        n_terms = len(self.vocab)
+        df = self.df[:n_terms]
+
+        if self.doc_terms:
+            terms = np.concatenate(self.doc_terms)
+            tfs = np.concatenate(self.doc_tfs)
+            docs = np.repeat(np.arange(self.corpus_size, dtype=np.int32), [len(t) for t in self.doc_terms])
+        else:
+            terms = np.zeros(0, dtype=np.int32)
+            tfs = np.zeros(0)
+            docs = np.zeros(0, dtype=np.int32)
+        order = np.argsort(terms, kind="stable")
+        ptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=n_terms), out=ptr[1:])
+
+        # IDF wie BM25Okapi._calc_idf; negative Werte werden durch epsilon * mittlere IDF ersetzt
+        present = df > 0
+        idf = np.zeros(n_terms)
+        idf[present] = np.log(self.corpus_size - df[present] + 0.5) - np.log(df[present] + 0.5)
+        if present.any():
+            eps = self.epsilon * idf[present].mean()
+            idf[present & (idf < 0)] = eps
+
+        doc_len = np.asarray(self.doc_len, dtype=np.float64)
+        norm = self.k1 * (1 - self.b + self.b * doc_len / self.avgdl) if self.corpus_size else doc_len
+
+        self._postings = (ptr, docs[order], tfs[order], idf, norm)
+        return self._postings
+
+    def _query_terms(self, query: List[str]) -> List[int]:
+        # Wiederholte Suchbegriffe zählen mehrfach (wie bei BM25Okapi)
+        return [self.vocab[q] for q in query if q in self.vocab]
+
+    def get_sparse_scores(self, query: List[str], ids: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores nur für Dokumente, die mindestens einen Suchbegriff enthalten: (Indizes, Scores).
+        Mit `ids` werden nur diese Positionen bewertet (z. B. Metadaten-Filter).
+        """
+        if not self.corpus_size or (ids is not None and not len(ids)):
+            return np.zeros(0, dtype=np.int32), np.zeros(0)
+        ptr, post_docs, post_tfs, idf, norm = self._postings or self._build()
+        if ids is not None:
+            allowed = np.zeros(self.corpus_size, dtype=bool)
+            allowed[ids] = True
+
+        hits, contributions = [], []
+        for term in self._query_terms(query):
+            start, end = ptr[term], ptr[term + 1]
+            if start == end:
+                continue
+            docs = post_docs[start:end]
+            tf = post_tfs[start:end]
+            if ids is not None:
+                keep = allowed[docs]
+                docs, tf = docs[keep], tf[keep]
+                if not len(docs):
+                    continue
+            hits.append(docs)
+            contributions.append(idf[term] * (tf * (self.k1 + 1) / (tf + norm[docs])))
+
+        if not hits:
+            return np.zeros(0, dtype=np.int32), np.zeros(0)
+        ids, inverse = np.unique(np.concatenate(hits), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(contributions), minlength=len(ids))
+        return ids, scores
+
+    def get_scores(self, query: List[str]) -> np.ndarray:
+        scores = np.zeros(self.corpus_size)
+        ids, values = self.get_sparse_scores(query)
+        scores[ids] = values
+        return scores
+
+    # ------------------------------
+    # Serialisierung (Postings werden nach dem Laden neu aufgebaut)
+    # ------------------------------
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_postings"] = None
+        return state
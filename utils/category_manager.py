@@ -1,4 +1,13 @@
 # utils/category_manager.py
+import re
+from collections import Counter
+from typing import Dict, Iterable, List
+
+try:
+    # pyahocorasick (optional): Aho-Corasick in C, ein Durchlauf pro Text
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 CATEGORIES = {
     "Verträge": [
@@ -24,16 +33,134 @@ CATEGORIES = {
     "Andere": []  # Fallback
 }
 
+FALLBACK_CATEGORY = "Andere"
+# Obergrenze für den Wort-Cache des Matchers (wird bei Erreichen geleert)
+WORD_CACHE_SIZE = 200_000
+
+# ------------------------------
+# Kompilierter Keyword-Matcher
+# ------------------------------
+def _trie_pattern(words: Iterable[str]) -> str:
+    """
+    Regex aus einem Präfixbaum der Keywords: gemeinsame Präfixe werden nur einmal
+    geprüft, und dank gieriger Quantoren gewinnt bei Überlappung das längste Keyword.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class CategoryMatcher:
+    """
+    Zählt Keyword-Treffer pro Kategorie und vergibt die Kategorie mit den meisten
+    Treffern; bei Gleichstand entscheidet die Reihenfolge in `categories`. (Bis
+    CHUNKER_VERSION 1 gewann die erste Kategorie mit irgendeinem Treffer, meist "Verträge".)
+
+    Gezählt wird nicht überlappend, längstes Keyword zuerst, auch innerhalb von Komposita
+    ("Mietvertrag" → "vertrag"). Mit pyahocorasick in einem Durchlauf pro Text; sonst wird
+    der Text in Wörter zerlegt und der Präfixbaum-Regex nur einmal pro neuem Wort angewendet.
+    Beide Wege liefern dieselben Zählungen.
+    """
+
+    def __init__(self, categories: Dict[str, List[str]] = CATEGORIES, fallback: str = FALLBACK_CATEGORY):
+        self.categories = list(categories)
+        self.fallback = fallback
+        # Keyword -> Kategorie; kommt ein Keyword mehrfach vor, zählt die erste Kategorie
+        self.keyword_category = {}
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                self.keyword_category.setdefault(keyword.lower(), category)
+        self.pattern = re.compile(_trie_pattern(self.keyword_category)) if self.keyword_category else None
+
+        self.automaton = None
+        if ahocorasick is not None and self.keyword_category:
+            self.automaton = ahocorasick.Automaton()
+            for keyword, category in self.keyword_category.items():
+                self.automaton.add_word(keyword, category)
+            self.automaton.make_automaton()
+
+        # Ohne pyahocorasick: bereits geprüfte Wörter; nur die mit Treffern stehen in
+        # _word_hits (Wort -> {Kategorie: Treffer})
+        self._seen = set()
+        self._word_hits = {}
+
+    def _learn(self, words):
+        if len(self._seen) + len(words) > WORD_CACHE_SIZE:
+            self._seen.clear()
+            self._word_hits.clear()
+        for word in words:
+            matches = self.pattern.findall(word)
+            if matches:
+                self._word_hits[word] = Counter(self.keyword_category[m] for m in matches)
+        self._seen.update(words)
+
+    def count(self, text: str) -> Dict[str, int]:
+        """Anzahl Keyword-Treffer pro Kategorie (nur Kategorien mit Treffern)."""
+        if self.pattern is None:
+            return {}
+        if self.automaton is not None:
+            return dict(Counter(category for _, category in self.automaton.iter_long(text.lower())))
+
+        # Keywords enthalten keine Leerzeichen: jeder Treffer liegt innerhalb eines Wortes
+        words = text.lower().split()
+        distinct = set(words)
+        unseen = distinct - self._seen
+        if unseen:
+            self._learn(unseen)
+        counts = Counter()
+        # Mengenoperationen statt einer Schleife über alle Wörter: nur Wörter mit Treffern zählen
+        for word in distinct & self._word_hits.keys():
+            n = words.count(word)
+            for category, hits in self._word_hits[word].items():
+                counts[category] += hits * n
+        return dict(counts)
+
+    def count_many(self, texts: Iterable[str]) -> List[Dict[str, int]]:
+        """Wie count() für viele Texte (der Wort-Cache wird über alle Texte geteilt)."""
+        return [self.count(text) for text in texts]
+
+    def best(self, counts: Dict[str, int]) -> str:
+        if not counts:
+            return self.fallback
+        # max() liefert bei Gleichstand die erste Kategorie
+        return max(self.categories, key=lambda c: counts.get(c, 0))
+
+    def assign(self, text: str) -> str:
+        return self.best(self.count(text))
+
+    def assign_many(self, texts: Iterable[str]) -> List[str]:
+        return [self.best(counts) for counts in self.count_many(texts)]
+
+
+_matcher = CategoryMatcher()
+
+
 def assign_category(text: str) -> str:
     """
-    Weist einem Text auf Basis einfacher Keyword-Erkennung eine Kategorie zu.
+    Weist einem Text die Kategorie mit den meisten Keyword-Treffern zu.
     Falls kein Treffer, wird 'Andere' zurückgegeben.
     """
-    text_lower = text.lower()
-    for category, keywords in CATEGORIES.items():
-        if any(keyword in text_lower for keyword in keywords):
-            return category
-    return "Andere"
+    return _matcher.assign(text)
+
+def assign_categories(texts: Iterable[str]) -> List[str]:
+    """Batch-Variante von assign_category() für viele Chunks."""
+    return _matcher.assign_many(texts)
+
+def count_category_hits(text: str) -> Dict[str, int]:
+    """Keyword-Treffer pro Kategorie, z. B. zur Erklärung einer Zuordnung."""
+    return _matcher.count(text)
 
 def get_all_categories() -> list:
     """Gibt eine Liste aller verfügbaren Kategorien zurück (z. B. für Filter)."""
@@ -0,0 +1,199 @@
+# utils/chat_client.py
+import json
+import random
+import threading
+import time
+from typing import Callable, Iterator, Optional
+import requests
+from requests.adapters import HTTPAdapter
+
+HF_API_URL = "https://api-inference.huggingface.co/models"
+HF_MODEL = "HuggingFaceH4/zephyr-7b-beta"
+# MODEL = "mistralai/Mistral-7B-Instruct-v0.2"
+
+
+class ChatBackendError(RuntimeError):
+    """Backend nach allen Wiederholungen nicht erreichbar oder Anfrage abgelehnt."""
+
+
+class ChatCancelled(RuntimeError):
+    """Anfrage wurde über das Cancel-Event abgebrochen."""
+
+
+# ------------------------------
+# Globale Ratenbegrenzung (Token Bucket)
+# ------------------------------
+class RateLimiter:
+    """Höchstens `rate` Anfragen pro Sekunde (kurzzeitig bis `burst`), über alle Sessions."""
+
+    def __init__(self, rate: float = 2.0, burst: int = 5):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Nimmt ein Token, falls vorhanden (0.0); sonst Wartezeit bis zum nächsten Token."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, cancel: Optional[threading.Event] = None):
+        while True:
+            wait = self._reserve()
+            if not wait:
+                return
+            if cancel is not None and cancel.wait(wait):
+                raise ChatCancelled()
+            if cancel is None:
+                time.sleep(wait)
+
+
+# ------------------------------
+# HTTP-Client mit Verbindungs-Pool
+# ------------------------------
+class HFChatClient:
+    """
+    Client für die Hugging Face Inference API. Alle Anfragen teilen eine Session mit
+    Keep-alive-Verbindungs-Pool und einen globalen RateLimiter. Fehlgeschlagene
+    Anfragen (503, 429, 5xx, Netzwerkfehler) werden mit exponentiellem Backoff und
+    Jitter wiederholt; Wartezeiten lassen sich über ein Cancel-Event abbrechen.
+
+    `base_url` kann auf einen lokalen Mock-Server zeigen.
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, token: str, model: str = HF_MODEL, base_url: str = HF_API_URL,
+                 max_retries: int = 3, backoff_base: float = 1.0, backoff_max: float = 20.0,
+                 timeout: float = 60.0, rate_limiter: RateLimiter = None, pool_size: int = 10):
+        self.url = f"{base_url.rstrip('/')}/{model}"
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or RateLimiter()
+
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {token}"
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response]) -> float:
+        # "Full Jitter": zufällig zwischen 0 und dem exponentiell wachsenden Maximum
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if response is not None:
+            hint = response.headers.get("Retry-After")
+            if hint is None and response.status_code == 503:
+                # HF meldet beim Laden des Modells die geschätzte Ladezeit
+                try:
+                    hint = response.json().get("estimated_time")
+                except ValueError:
+                    hint = None
+            try:
+                delay = max(delay, min(float(hint), self.backoff_max))
+            except (TypeError, ValueError):
+                pass
+        return delay
+
+    def _post(self, payload: dict, stream: bool, cancel: Optional[threading.Event],
+              on_retry: Optional[Callable[[int, float, str], None]]) -> requests.Response:
+        for attempt in range(self.max_retries + 1):
+            if cancel is not None and cancel.is_set():
+                raise ChatCancelled()
+            self.rate_limiter.acquire(cancel)
+
+            response, reason = None, ""
+            try:
+                response = self.session.post(self.url, json=payload, stream=stream, timeout=self.timeout)
+                if response.status_code == 200:
+                    return response
+                reason = f"HTTP {response.status_code}"
+                if response.status_code not in self.RETRY_STATUS:
+                    message = f"Fehler {response.status_code}: {response.text[:500]}"
+                    response.close()
+                    raise ChatBackendError(message)
+            except requests.RequestException as e:
+                reason = type(e).__name__
+
+            if attempt == self.max_retries:
+                break
+            delay = self._backoff(attempt, response)
+            if response is not None:
+                response.close()
+            # In kurzen Schritten warten; on_retry erhält bei jedem Schritt die Restzeit
+            deadline = time.monotonic() + delay
+            while (remaining := deadline - time.monotonic()) > 0:
+                if on_retry is not None:
+                    on_retry(attempt + 1, remaining, reason)
+                if cancel is not None and cancel.wait(min(remaining, 0.5)):
+                    raise ChatCancelled()
+                if cancel is None:
+                    time.sleep(min(remaining, 0.5))
+        raise ChatBackendError(f"Backend nicht erreichbar ({reason})")
+
+    def stream(self, prompt: str, max_new_tokens: int = 400, temperature: float = 0.7,
+               cancel: Optional[threading.Event] = None,
+               on_retry: Optional[Callable[[int, float, str], None]] = None) -> Iterator[str]:
+        """
+        Liefert die Antwort Token für Token (Server-Sent Events). Antwortet der Server
+        ohne Streaming, wird der ganze Text auf einmal geliefert.
+        """
+        payload = {
+            "inputs": prompt,
+            "parameters": {
+                "temperature": temperature,
+                "max_new_tokens": max_new_tokens,
+                "return_full_text": False
+            },
+            "stream": True,
+        }
+        response = self._post(payload, True, cancel, on_retry)
+        try:
+            if "text/event-stream" not in response.headers.get("Content-Type", ""):
+                data = response.json()
+                if isinstance(data, list) and data and "generated_text" in data[0]:
+                    yield data[0]["generated_text"].strip()
+                else:
+                    yield str(data)
+                return
+
+            # SSE ist immer UTF-8, auch ohne charset im Content-Type
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                if cancel is not None and cancel.is_set():
+                    raise ChatCancelled()
+                if not line or not line.startswith("data:"):
+                    continue
+                event = json.loads(line[5:])
+                if "error" in event:
+                    raise ChatBackendError(event["error"])
+                token = event.get("token") or {}
+                if token.get("text") and not token.get("special"):
+                    yield token["text"]
+        finally:
+            # Verbindung freigeben, auch bei Abbruch durch den Aufrufer
+            response.close()
+
+    def generate(self, prompt: str, **params) -> str:
+        return "".join(self.stream(prompt, **params)).strip()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_chat_client(token: str, model: str = HF_MODEL, base_url: str = HF_API_URL) -> HFChatClient:
+    """Ein geteilter Client (Pool und Ratenbegrenzung) pro Token/Modell/URL im Prozess."""
+    key = (token, model, base_url)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = HFChatClient(token, model, base_url)
+        return _clients[key]
@@ -0,0 +1,157 @@
+# utils/doc_converter.py
+import os
+import re
+import shutil
+import struct
+import hashlib
+import subprocess
+import olefile
+
+DOC_TEXT_CACHE = ".doc_cache/"
+# Externe Konverter (falls installiert) als Rückfallebene für Dateien, die der Parser nicht lesen kann
+EXTERNAL_CONVERTERS = (("antiword", "-w", "0"), ("catdoc", "-w"))
+CONVERTER_TIMEOUT = 60  # Sekunden
+CONVERTER_MEMORY_LIMIT = 1 << 30  # Bytes Adressraum für externe Konverter
+
+
+# -------------------------------
+# Word-97-2003-Binärformat (.doc) mit olefile lesen
+# -------------------------------
+def _read_piece_table(word_stream, table_stream, fc_clx, lcb_clx):
+    """Liefert die Textstücke (cp_start, cp_end, fc, compressed) aus der Piece Table (CLX)."""
+    clx = table_stream[fc_clx:fc_clx + lcb_clx]
+    pos = 0
+    # Prc-Einträge (Formatierungen) überspringen
+    while pos < len(clx) and clx[pos] == 0x01:
+        (cb_grpprl,) = struct.unpack_from("<H", clx, pos + 1)
+        pos += 3 + cb_grpprl
+    if pos >= len(clx) or clx[pos] != 0x02:
+        raise ValueError("Keine Piece Table gefunden")
+    (lcb,) = struct.unpack_from("<I", clx, pos + 1)
+    plc = clx[pos + 5:pos + 5 + lcb]
+
+    n = (len(plc) - 4) // 12
+    cps = struct.unpack_from(f"<{n + 1}I", plc, 0)
+    pieces = []
+    for i in range(n):
+        (fc,) = struct.unpack_from("<I", plc, 4 * (n + 1) + 8 * i + 2)
+        compressed = bool(fc & 0x40000000)
+        fc &= 0x3FFFFFFF
+        pieces.append((cps[i], cps[i + 1], fc // 2 if compressed else fc, compressed))
+    return pieces
+
+
+def _clean_word_text(text):
+    # Feldfunktionen: Anweisung (zwischen \x13 und \x14) verwerfen, Ergebnis behalten
+    text = re.sub(r"\x13[^\x13\x14\x15]*\x14", "", text)
+    text = re.sub(r"\x13[^\x13\x14\x15]*\x15", "", text)
+    text = text.replace("\x15", "")
+    # Absatz, Zeilenumbruch, Seiten-/Abschnittswechsel, Tabellenzellen
+    text = re.sub(r"[\r\x0b\x0c\x07]", "\n", text)
+    text = text.replace("\x1e", "-").replace("\x1f", "").replace("\xa0", " ")
+    # Übrige Steuerzeichen (Bilder, Fussnotenzeichen, Objekte)
+    text = re.sub(r"[\x00-\x08\x0e-\x1d]", "", text)
+    return "\n".join(line.strip() for line in text.split("\n") if line.strip())
+
+
+def extract_text_from_doc_binary(path):
+    """Haupttext einer Word-97-2003-Datei ohne externe Programme."""
+    with olefile.OleFileIO(path) as ole:
+        if not ole.exists("WordDocument"):
+            raise ValueError("Kein WordDocument-Stream (keine Word-Datei)")
+        word = ole.openstream("WordDocument").read()
+
+        ident, nfib = struct.unpack_from("<HH", word, 0)
+        (flags,) = struct.unpack_from("<H", word, 0x0A)
+        if ident != 0xA5EC or nfib < 101:
+            raise ValueError("Word-Format vor Word 97 wird nicht unterstützt")
+        if flags & 0x0100:
+            raise ValueError("Dokument ist verschlüsselt")
+
+        table_name = "1Table" if flags & 0x0200 else "0Table"
+        if not ole.exists(table_name):
+            raise ValueError(f"Stream {table_name} fehlt")
+        table = ole.openstream(table_name).read()
+
+    (ccp_text,) = struct.unpack_from("<i", word, 0x4C)
+    fc_clx, lcb_clx = struct.unpack_from("<II", word, 0x01A2)
+
+    parts = []
+    for cp_start, cp_end, fc, compressed in _read_piece_table(word, table, fc_clx, lcb_clx):
+        if cp_start >= ccp_text:
+            break
+        # Nur den Haupttext (ohne Fuss-/Endnoten, Kopfzeilen, Kommentare)
+        count = min(cp_end, ccp_text) - cp_start
+        if compressed:
+            parts.append(word[fc:fc + count].decode("cp1252", errors="replace"))
+        else:
+            parts.append(word[fc:fc + 2 * count].decode("utf-16-le", errors="replace"))
+    return _clean_word_text("".join(parts))
+
+
+# -------------------------------
+# Externe Konverter in einer Sandbox
+# -------------------------------
+def _with_limits(command):
+    """
+    Startet `command` über eine Shell, die vorher Speicher und CPU-Zeit per ulimit begrenzt.
+    (preexec_fn ist in Prozessen mit Threads wie dem Streamlit-Server nicht sicher.)
+    """
+    if os.name != "posix":
+        return command
+    limits = f"ulimit -v {CONVERTER_MEMORY_LIMIT // 1024} && ulimit -t {CONVERTER_TIMEOUT}"
+    return ["/bin/sh", "-c", limits + ' && exec "$0" "$@"', *command]
+
+
+def extract_text_with_converter(path):
+    """Text über antiword/catdoc; Kindprozess mit minimaler Umgebung, Zeit- und Speicherlimit."""
+    for tool, *args in EXTERNAL_CONVERTERS:
+        executable = shutil.which(tool)
+        if not executable:
+            continue
+        result = subprocess.run(
+            _with_limits([executable, *args, os.path.abspath(path)]),
+            capture_output=True, timeout=CONVERTER_TIMEOUT, cwd=os.path.dirname(os.path.abspath(path)),
+            env={"PATH": os.environ.get("PATH", ""), "LANG": "C.UTF-8"},
+        )
+        if result.returncode == 0 and result.stdout.strip():
+            return _clean_word_text(result.stdout.decode("utf-8", errors="replace"))
+    return None
+
+
+# -------------------------------
+# Konvertierung mit Cache (nach Inhalts-Hash)
+# -------------------------------
+def _content_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def convert_doc_to_text(path, cache_dir=DOC_TEXT_CACHE):
+    """
+    Gibt den Text einer .doc-Datei zurück. Ergebnisse werden unter dem SHA-1 des
+    Inhalts gespeichert, sodass jede Fassung einer Datei nur einmal konvertiert wird
+    (auch nach Umbenennen oder Verschieben).
+    """
+    cache_path = os.path.join(cache_dir, _content_hash(path) + ".txt")
+    if os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as f:
+            return f.read()
+
+    try:
+        text = extract_text_from_doc_binary(path)
+    except Exception as e:
+        text = extract_text_with_converter(path)
+        if text is None:
+            raise ValueError(f".doc nicht lesbar: {e}") from e
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # Pro Prozess eigene temporäre Datei, da mehrere Worker dieselbe Datei konvertieren können
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, cache_path)
+    return text
@@ -1,140 +1,297 @@
 # utils/document_loader.py
 import os
-import fitz  # PyMuPDF
+import io
 import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from langchain.docstore.document import Document
-from utils.category_manager import assign_category
-from docx import Document as DocxDocument
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
+from utils.category_manager import assign_categories
+from utils.doc_converter import convert_doc_to_text
+from utils.metrics import metrics
+
+# Bei Änderungen an Chunking oder Kategorisierung erhöhen (invalidiert den Index-Cache).
+# 2: Kategorie nach Anzahl Keyword-Treffern statt erster Treffer, 5: Überschriften mit Satztext,
+# 6: Zuordnung mit Aho-Corasick/Wort-Cache neu aufgebaut (gleiche Zählregeln wie 2)
+CHUNKER_VERSION = 6
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".doc")
+# Obergrenze pro Chunk in Wörtern (all-MiniLM-L6-v2 liest max. 256 Wordpiece-Tokens)
+CHUNK_MAX_TOKENS = 150
+# Wörter, die beim Teilen eines langen Abschnitts in den nächsten Chunk übernommen werden
+CHUNK_OVERLAP = 25
 
 # -------------------------------
 # Text in strukturierte Abschnitte (Chunks) teilen
 # -------------------------------
-def split_into_chunks_by_heading(text):
-    pattern = r"(?=^\s*(§{1,2}\s*\d+[^\n]*|Art\.?\s*\d+[^\n]*|Ziff\.?\s*\d+[^\n]*|Artikel\s+\d+[^\n]*))"
-    chunks = re.split(pattern, text, flags=re.MULTILINE)
+HEADING_PATTERN = re.compile(r"^\s*(Artikel\s+\d+|Art\.?\s*\d+|§{1,2}\s*\d+|Ziff\.?\s*\d+)")
+HEADING_MAX_CHARS = 120
+# Nur kurze Überschriften ohne Satz ("§ 3 Rechtsstellung des Vertreters") gelten als reine
+# Überschrift; längere Treffer ("Art. 505 OR regelt …") sind Fliesstext und werden indexiert
+HEADING_MAX_WORDS = 8
+
+def _heading_level(heading):
+    # Art. > § > Ziff.
+    if heading.startswith("Art"):
+        return 1
+    if heading.startswith("§"):
+        return 2
+    return 3
+
+def _is_bare_heading(line, match):
+    rest = line[match.end():].split()
+    return len(rest) <= HEADING_MAX_WORDS and not line.endswith((".", "!", "?", ";"))
+
+def iter_chunks(lines, max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP):
+    """
+    Chunkt einen Strom von (Seite, Zeile) über Seitengrenzen hinweg. Ein neuer Chunk
+    beginnt bei jeder Überschrift (§, Art., Ziff., Artikel); Abschnitte über
+    `max_tokens` Wörter werden geteilt, wobei die letzten `overlap` Wörter im
+    nächsten Chunk wiederholt werden. Es wird immer nur der aktuelle Chunk gehalten.
+
+    Liefert Dicts mit content, heading, heading_path (z. B. "Art. 3 … > § 12 …") und
+    page (Seite der ersten Zeile, bei Fliesstext None).
+    """
+    if not 0 <= overlap < max_tokens:
+        raise ValueError("overlap muss kleiner als max_tokens sein")
 
-    grouped = []
-    for i in range(0, len(chunks) - 1, 2):
-        heading = chunks[i].strip()
-        content = chunks[i + 1].strip()
-        grouped.append({"heading": heading, "content": content})
+    stack = []  # (Ebene, Überschrift) der übergeordneten Abschnitte
+    buffer, size, carried, page = [], 0, 0, None
+    heading_only = False  # Chunk enthält bisher nur eine reine Überschrift (ohne Satz)
+
+    def chunk():
+        return {
+            "content": "\n".join(buffer),
+            "heading": stack[-1][1] if stack else "–",
+            "heading_path": " > ".join(h for _, h in stack) or "–",
+            "page": page,
+        }
+
+    def carry_over():
+        tail = " ".join(buffer).split()[-overlap:] if overlap else []
+        return ([" ".join(tail)] if tail else []), len(tail)
+
+    for line_page, line in lines:
+        line = line.strip()
+        if not line:
+            continue
 
-    if len(chunks) % 2 == 1:
-        grouped.append({"heading": "–", "content": chunks[-1].strip()})
-    return grouped
+        match = HEADING_PATTERN.match(line)
+        if match:
+            # Eine Überschrift ohne eigenen Text steckt bereits im heading_path der Unterabschnitte
+            if size > carried and not heading_only:
+                yield chunk()
+            buffer, size, carried, page = [], 0, 0, None
+            level = _heading_level(match.group(1))
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, line[:HEADING_MAX_CHARS]))
+
+        words = line.split()
+        while size + len(words) > max_tokens:
+            if size > carried and len(words) <= max_tokens and not heading_only:
+                # Zeile passt in einen neuen Chunk: an der Zeilengrenze teilen
+                yield chunk()
+            else:
+                # Zeile ist zu lang (oder der Chunk enthielte nur die Überschrift): innerhalb der Zeile teilen
+                take = max_tokens - size
+                buffer.append(" ".join(words[:take]))
+                if page is None:
+                    page = line_page
+                words = words[take:]
+                yield chunk()
+            buffer, size = carry_over()
+            carried, page, heading_only = size, None, False
+
+        heading_only = bool(match) and size == 0 and len(words) < max_tokens and _is_bare_heading(line, match)
+        if words:
+            buffer.append(" ".join(words))
+            size += len(words)
+            if page is None:
+                page = line_page
+
+    if size > carried:
+        yield chunk()
+
+def split_into_chunks_by_heading(text, max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP):
+    """Chunkt einen fertigen Text; Liste von Dicts wie iter_chunks()."""
+    return list(iter_chunks(((None, line) for line in io.StringIO(text)), max_tokens, overlap))
+
+def _documents_from_lines(path, lines):
+    return [
+        Document(
+            page_content=chunk["content"],
+            metadata={
+                "source": os.path.basename(path),
+                "path": path,
+                "page": chunk["page"],
+                "heading": chunk["heading"],
+                "heading_path": chunk["heading_path"]
+            }
+        )
+        for chunk in iter_chunks(lines)
+    ]
 
 # -------------------------------
 # PDF-Dateien laden & chunken
 # -------------------------------
-def extract_chunks_from_pdf(path):
-    try:
-        doc = fitz.open(path)
-    except Exception as e:
-        print(f"Fehler beim Öffnen von PDF {path}: {e}")
-        return []
-
-    all_chunks = []
+def _pdf_lines(doc):
+    # Seite für Seite, damit nie der Text des ganzen Dokuments im Speicher liegt
     for i, page in enumerate(doc, start=1):
-        text = page.get_text()
-        page_chunks = split_into_chunks_by_heading(text)
-        for chunk in page_chunks:
-            all_chunks.append(Document(
-                page_content=chunk["content"],
-                metadata={
-                    "source": os.path.basename(path),
-                    "path": path,
-                    "page": i,
-                    "heading": chunk["heading"]
-                }
-            ))
-    return all_chunks
+        for line in page.get_text().splitlines():
+            yield i, line
+
+def extract_chunks_from_pdf(path):
+    # PyMuPDF und python-docx erst beim Einlesen importieren (nicht beim Start der App)
+    import fitz  # PyMuPDF
+    with fitz.open(path) as doc:
+        return _documents_from_lines(path, _pdf_lines(doc))
 
 # -------------------------------
 # DOCX-Dateien laden & chunken
 # -------------------------------
+def _docx_lines(doc):
+    for paragraph in doc.paragraphs:
+        for line in paragraph.text.split("\n"):
+            yield None, line
+
 def extract_chunks_from_docx(path):
-    try:
-        doc = DocxDocument(path)
-    except Exception as e:
-        print(f"Fehler beim Laden von DOCX {path}: {e}")
-        return []
+    # Die PDF-Vorschau wird nicht mehr hier, sondern bei Bedarf erzeugt (siehe utils/preview.py)
+    from docx import Document as DocxDocument
+    return _documents_from_lines(path, _docx_lines(DocxDocument(path)))
 
-    full_text = "\n".join([p.text for p in doc.paragraphs if p.text.strip()])
-    chunks = split_into_chunks_by_heading(full_text)
-    all_chunks = []
+# -------------------------------
+# DOC-Dateien (Word 97-2003) laden & chunken
+# -------------------------------
+def extract_chunks_from_doc(path):
+    # Manche Vorlagen sind DOCX-Dateien (ZIP) mit Endung .doc; zipfile.is_zipfile() ist
+    # hier ungeeignet, da Word auch in binäre .doc-Dateien ZIP-Daten (Designs) einbettet
+    with open(path, "rb") as f:
+        if f.read(4) == b"PK\x03\x04":
+            return extract_chunks_from_docx(path)
+    text = convert_doc_to_text(path)
+    return _documents_from_lines(path, ((None, line) for line in io.StringIO(text)))
 
-    for chunk in chunks:
-        all_chunks.append(Document(
-            page_content=chunk["content"],
-            metadata={
-                "source": os.path.basename(path),
-                "path": path,
-                "page": None,
-                "heading": chunk["heading"]
-            }
-        ))
+# -------------------------------
+# Einzelne Datei laden & Kategorie zuweisen
+# -------------------------------
+def load_documents_from_file(full_path, timings=None):
+    """
+    Lädt, chunkt und kategorisiert eine Datei. Fehler beim Parsen werden weitergereicht.
+    `timings` erhält die Dauer von "parse_<endung>" (Einlesen & Chunking) und "categorize".
+    """
+    ext = os.path.splitext(full_path)[-1].lower()
+
+    start = time.perf_counter()
+    if ext == ".pdf":
+        chunks = extract_chunks_from_pdf(full_path)
+    elif ext == ".docx":
+        chunks = extract_chunks_from_docx(full_path)
+    elif ext == ".doc":
+        chunks = extract_chunks_from_doc(full_path)
+    else:
+        return []
+    if timings is not None:
+        timings["parse_" + ext[1:]] = time.perf_counter() - start
 
-    # Vorschau erzeugen
-    export_docx_to_pdf(path)
-    return all_chunks
+    start = time.perf_counter()
+    for chunk, category in zip(chunks, assign_categories(chunk.page_content for chunk in chunks)):
+        chunk.metadata["category"] = category
+    if timings is not None:
+        timings["categorize"] = time.perf_counter() - start
+    return chunks
 
 # -------------------------------
-# Lade alle Dokumente im Ordner & Kategorie zuweisen
+# Fehlerbericht pro Datei
 # -------------------------------
-def load_documents_from_folder(folder_path):
-    documents = []
-    if not os.path.exists(folder_path):
-        print(f"Ordner {folder_path} existiert nicht.")
-        return []
+class IngestReport:
+    """Sammelt pro Datei die Anzahl Chunks bzw. die Fehlermeldung einer Ingestion."""
 
-    for filename in os.listdir(folder_path):
-        full_path = os.path.join(folder_path, filename)
-        ext = os.path.splitext(filename)[-1].lower()
+    def __init__(self):
+        self.chunks = {}
+        self.errors = {}
 
-        chunks = []
-        if ext == ".pdf":
-            chunks = extract_chunks_from_pdf(full_path)
-        elif ext == ".docx":
-            chunks = extract_chunks_from_docx(full_path)
+    def record(self, path, chunks=0, error=None):
+        if error:
+            self.errors[path] = error
+            self.chunks.pop(path, None)
         else:
-            continue
+            self.chunks[path] = chunks
+            self.errors.pop(path, None)
 
-        for chunk in chunks:
-            category = assign_category(chunk.page_content)
-            chunk.metadata["category"] = category
-            documents.append(chunk)
+    @property
+    def total_chunks(self):
+        return sum(self.chunks.values())
 
-    return documents
+def _ingest_file(full_path):
+    # Läuft im Worker-Prozess: Rückgabe muss picklebar sein, Ausnahmen werden zu Text.
+    # Die Zeiten gehen mit zurück, da Messungen im Worker den Elternprozess nicht erreichen.
+    timings = {}
+    try:
+        return load_documents_from_file(full_path, timings), None, timings
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}", timings
 
 # -------------------------------
-# DOCX zu PDF Vorschau exportieren
+# Parallele Ingestion
 # -------------------------------
-def export_docx_to_pdf(docx_path, output_dir="previews"):
-    os.makedirs(output_dir, exist_ok=True)
-    try:
-        doc = DocxDocument(docx_path)
-    except Exception as e:
-        print(f"Fehler beim Export von DOCX {docx_path}: {e}")
-        return None
-
-    pdf_path = os.path.join(output_dir, os.path.basename(docx_path).replace(".docx", ".pdf"))
-    c = canvas.Canvas(pdf_path, pagesize=A4)
-    width, height = A4
-    y = height - 40
-
-    for para in doc.paragraphs:
-        text = para.text.strip()
-        if not text:
-            y -= 15
-            continue
-        for line in text.split("\n"):
-            c.drawString(40, y, line[:120])
-            y -= 15
-            if y < 50:
-                c.showPage()
-                y = height - 40
-
-    c.save()
-    return pdf_path
+def iter_documents_from_files(paths, max_workers=None, report=None):
+    """
+    Lädt Dateien in einem Prozess-Pool und liefert (Pfad, Chunks, Fehler oder None) in der
+    Reihenfolge von `paths`. Es sind höchstens 2 × max_workers Dateien gleichzeitig in Arbeit,
+    damit der Speicherbedarf unabhängig von der Anzahl Dateien bleibt.
+    """
+    paths = list(paths)
+    workers = min(max_workers or os.cpu_count() or 1, len(paths))
+
+    def _record(path, chunks, error, timings):
+        if report is not None:
+            report.record(path, len(chunks), error)
+        metrics.observe_all("ingest", timings)
+
+    # Für einzelne Dateien (z. B. FolderWatcher) lohnt sich kein Pool
+    if workers <= 1:
+        for path in paths:
+            chunks, error, timings = _ingest_file(path)
+            _record(path, chunks, error, timings)
+            yield path, chunks, error
+        return
+
+    remaining = iter(paths)
+    # "spawn" statt fork: der Elternprozess hält Threads (Streamlit, FolderWatcher, torch)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"), max_tasks_per_child=100) as pool:
+        pending = deque()
+        for path in remaining:
+            pending.append((path, pool.submit(_ingest_file, path)))
+            if len(pending) >= 2 * workers:
+                break
+
+        while pending:
+            path, future = pending.popleft()
+            chunks, error, timings = future.result()
+            next_path = next(remaining, None)
+            if next_path is not None:
+                pending.append((next_path, pool.submit(_ingest_file, next_path)))
+            _record(path, chunks, error, timings)
+            yield path, chunks, error
+
+# -------------------------------
+# Lade alle Dokumente im Ordner & Kategorie zuweisen
+# -------------------------------
+def list_supported_files(folder_path):
+    return [
+        os.path.join(folder_path, filename)
+        for filename in sorted(os.listdir(folder_path))
+        if os.path.splitext(filename)[-1].lower() in SUPPORTED_EXTENSIONS
+    ]
+
+def load_documents_from_folder(folder_path, max_workers=None, report=None):
+    if not os.path.exists(folder_path):
+        if report is not None:
+            report.record(folder_path, error="Ordner existiert nicht.")
+        return []
+
+    documents = []
+    for _, chunks, _ in iter_documents_from_files(list_supported_files(folder_path), max_workers, report):
+        documents.extend(chunks)
+    return documents
@@ -0,0 +1,75 @@
+# utils/downloads.py
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+# Obergrenze für zwischengespeicherte Download-Inhalte (über alle Sessions)
+DOWNLOAD_CACHE_BYTES = 64 * 2**20
+
+MIME_TYPES = {
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".doc": "application/msword",
+}
+
+
+def mime_type(file_name: str) -> str:
+    return MIME_TYPES.get(os.path.splitext(file_name)[1].lower(), "application/octet-stream")
+
+
+# ------------------------------
+# Byte-Cache für Downloads
+# ------------------------------
+class FileBytesCache:
+    """
+    LRU-Cache für Dateiinhalte, begrenzt auf `max_bytes`. Schlüssel sind Pfad, Änderungszeit
+    und Grösse: eine geänderte Vorlage wird beim nächsten Download neu gelesen, ältere
+    Fassungen fallen mit der Zeit heraus. Dateien über `max_bytes` werden nicht gecacht.
+    """
+
+    def __init__(self, max_bytes: int = DOWNLOAD_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> bytes:
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            data = self._data.get(key)
+            if data is not None:
+                self._data.move_to_end(key)
+                return data
+
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) > self.max_bytes:
+            return data
+        with self._lock:
+            if key not in self._data:
+                self._data[key] = data
+                self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= len(evicted)
+        return data
+
+    def __len__(self):
+        return len(self._data)
+
+
+download_cache = FileBytesCache()
+
+
+def deferred_file(path: str, on_read: Optional[Callable[[], None]] = None) -> Callable[[], bytes]:
+    """
+    Für `st.download_button(data=...)`: die Datei wird erst beim Klick gelesen (bzw. aus dem Cache geholt).
+    `on_read` läuft dabei mit (z. B. Klick protokollieren), ausserhalb des Streamlit-Kontexts.
+    """
+    def read():
+        if on_read is not None:
+            on_read()
+        return download_cache.get(path)
+    return read
@@ -0,0 +1,105 @@
+# utils/embeddings.py
+from abc import ABC, abstractmethod
+from typing import Callable, List, Optional
+import numpy as np
+from utils.vector_index import normalize_rows
+from utils.metrics import metrics
+
+# Fortschritt: progress(erledigt, gesamt) nach jedem Block
+ProgressCallback = Callable[[int, int], None]
+
+
+# ------------------------------
+# Schnittstelle
+# ------------------------------
+class EmbeddingProvider(ABC):
+    """
+    Einheitliche Schnittstelle für Embedding-Modelle. Texte werden in Batches
+    kodiert; Ergebnisse sind L2-normalisierte float32-Vektoren, sodass der
+    Kosinus-Score überall ein Skalarprodukt ist.
+    """
+
+    def __init__(self, batch_size: int = 64, progress: Optional[ProgressCallback] = None):
+        self.batch_size = batch_size
+        self.progress = progress
+
+    @abstractmethod
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Rohe (nicht normalisierte) Embeddings eines Blocks, eine Zeile pro Text."""
+
+    def _encode_query(self, text: str) -> np.ndarray:
+        return self._encode_batch([text])[0]
+
+    def encode_documents(self, texts: List[str], progress: Optional[ProgressCallback] = None) -> np.ndarray:
+        progress = progress or self.progress
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if progress is None:
+            return normalize_rows(self._encode_batch(texts))
+
+        # Mit Fortschrittsanzeige in Blöcken zu mehreren Batches kodieren
+        block = self.batch_size * 8
+        parts = []
+        for start in range(0, len(texts), block):
+            parts.append(self._encode_batch(texts[start:start + block]))
+            progress(min(start + block, len(texts)), len(texts))
+        return normalize_rows(np.vstack(parts))
+
+    def encode_query(self, text: str) -> np.ndarray:
+        return normalize_rows(self._encode_query(text))
+
+    @metrics.timed("embed.query_batch")
+    def encode_queries(self, texts: List[str]) -> np.ndarray:
+        """Mehrere Anfragen in einem Forward-Pass (für Micro-Batching)."""
+        return normalize_rows(self._encode_batch(list(texts)))
+
+
+# ------------------------------
+# SentenceTransformer
+# ------------------------------
+class SentenceTransformerProvider(EmbeddingProvider):
+    """Kodiert mit `SentenceTransformer.encode`; `num_threads` begrenzt die Torch-Threads (CPU)."""
+
+    def __init__(self, model, batch_size: int = 64, num_threads: Optional[int] = None,
+                 progress: Optional[ProgressCallback] = None):
+        super().__init__(batch_size, progress)
+        self.model = model
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+
+    def _encode_batch(self, texts):
+        return self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+
+
+# ------------------------------
+# LangChain-Embeddings
+# ------------------------------
+class LangChainProvider(EmbeddingProvider):
+    """Kodiert mit `embed_documents` (ein Aufruf pro Block statt `embed_query` pro Dokument)."""
+
+    def __init__(self, embeddings, batch_size: int = 64, progress: Optional[ProgressCallback] = None):
+        super().__init__(batch_size, progress)
+        self.embeddings = embeddings
+
+    def _encode_batch(self, texts):
+        return np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+
+    def _encode_query(self, text):
+        return np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+
+    def encode_queries(self, texts):
+        # embed_query kann sich von embed_documents unterscheiden (z. B. Instruktions-Präfix)
+        return normalize_rows(np.vstack([self._encode_query(text) for text in texts]))
+
+
+def as_embedding_provider(model, **params) -> EmbeddingProvider:
+    """Verpackt ein SentenceTransformer- oder LangChain-Modell; Provider werden unverändert zurückgegeben."""
+    if isinstance(model, EmbeddingProvider):
+        return model
+    if hasattr(model, "embed_documents"):
+        return LangChainProvider(model, **params)
+    if hasattr(model, "encode"):
+        return SentenceTransformerProvider(model, **params)
+    raise TypeError(f"Nicht unterstütztes Embedding-Modell: {type(model).__name__}")
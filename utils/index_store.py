@@ -0,0 +1,268 @@
+# utils/index_store.py
+import os
+import json
+import pickle
+import hashlib
+import threading
+import numpy as np
+from langchain.docstore.document import Document
+from utils.document_loader import list_supported_files, iter_documents_from_files
+from utils.metrics import metrics
+
+# Bei inkompatiblen Änderungen am Dateiformat erhöhen
+INDEX_FORMAT_VERSION = 4
+
+MANIFEST_FILE = "manifest.json"
+CHUNKS_FILE = "chunks.pkl"
+EMBEDDINGS_FILE = "embeddings.npy"
+BM25_FILE = "bm25.pkl"
+
+
+# -------------------------------
+# Datei-Fingerprints
+# -------------------------------
+def file_sha1(path, block_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+@metrics.timed("index.scan")
+def scan_folder(folder_path, previous=None):
+    """
+    Erstellt ein Manifest {Pfad: {size, mtime_ns, sha1}} aller indexierbaren Dateien.
+    Der Hash wird aus `previous` übernommen, solange Grösse und mtime unverändert sind,
+    sodass ein unveränderter Ordner ohne Lesen der Dateien geprüft werden kann.
+    """
+    previous = previous or {}
+    manifest = {}
+    if not os.path.exists(folder_path):
+        return manifest
+
+    for full_path in list_supported_files(folder_path):
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            continue
+
+        old = previous.get(full_path)
+        if old and old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns:
+            sha1 = old["sha1"]
+        else:
+            sha1 = file_sha1(full_path)
+        manifest[full_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": sha1}
+    return manifest
+
+
+# -------------------------------
+# Persistenter Index auf der Festplatte
+# -------------------------------
+class IndexStore:
+    """
+    Versionierter On-Disk-Index: Chunks inkl. Metadaten, Embedding-Matrix (float32,
+    L2-normalisiert, per Memory-Map geladen) und BM25-Statistiken. Gültig ist der Index nur, solange
+    Dateien, Embedding-Modell und Chunker-Version übereinstimmen.
+    """
+
+    def __init__(self, cache_dir, model_name, chunker_version):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.chunker_version = chunker_version
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _read_manifest(self):
+        try:
+            with open(self._path(MANIFEST_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _compatible(self, manifest):
+        return (
+            manifest is not None
+            and manifest.get("format_version") == INDEX_FORMAT_VERSION
+            and manifest.get("model_name") == self.model_name
+            and manifest.get("chunker_version") == self.chunker_version
+        )
+
+    @metrics.timed("index.load")
+    def load(self):
+        """
+        Lädt den gespeicherten Index, sofern Format, Modell und Chunker-Version passen.
+        Gibt (files, docs, embeddings, bm25) oder None zurück; ob `files` noch zum
+        Dokumentenordner passt, prüft der Aufrufer (siehe `diff_files`).
+        """
+        manifest = self._read_manifest()
+        if not self._compatible(manifest):
+            return None
+
+        try:
+            with open(self._path(CHUNKS_FILE), "rb") as f:
+                chunks = pickle.load(f)
+            embeddings = np.load(self._path(EMBEDDINGS_FILE), mmap_mode="r")
+            with open(self._path(BM25_FILE), "rb") as f:
+                bm25 = pickle.load(f)
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            print(f"Index-Cache unlesbar, wird neu aufgebaut: {e}")
+            return None
+
+        if len(chunks) != manifest["count"] or embeddings.shape[0] != len(chunks):
+            return None
+
+        docs = [Document(page_content=content, metadata=metadata) for content, metadata in chunks]
+        return manifest["files"], docs, embeddings, bm25
+
+    def save(self, files, docs, embeddings, bm25):
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Manifest zuerst entfernen, damit ein abgebrochener Schreibvorgang
+        # nie als gültiger Index gelesen wird
+        try:
+            os.remove(self._path(MANIFEST_FILE))
+        except FileNotFoundError:
+            pass
+
+        chunks = [(doc.page_content, doc.metadata) for doc in docs]
+        self._atomic_write(CHUNKS_FILE, lambda f: pickle.dump(chunks, f, protocol=pickle.HIGHEST_PROTOCOL))
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self._atomic_write(EMBEDDINGS_FILE, lambda f: np.save(f, matrix))
+        self._atomic_write(BM25_FILE, lambda f: pickle.dump(bm25, f, protocol=pickle.HIGHEST_PROTOCOL))
+        self._write_manifest(files, len(docs))
+
+    @metrics.timed("index.save")
+    def save_retriever(self, files, retriever):
+        # Geschrieben wird ein Snapshot ohne gehaltenen Lock: Suchen und Aktualisierungen laufen weiter
+        docs, embeddings, bm25, version = retriever.snapshot()
+        self.save(files, docs, embeddings, bm25)
+        # Auf die gespeicherte Datei umschalten: die Matrix liegt dann im Page-Cache,
+        # den sich mehrere Streamlit-Worker teilen, statt im Speicher jedes Prozesses.
+        # Hat sich der Index inzwischen geändert, bleibt die Matrix im Speicher.
+        if len(docs):
+            retriever.attach_vectors(np.load(self._path(EMBEDDINGS_FILE), mmap_mode="r"), version)
+
+    def _write_manifest(self, files, count):
+        manifest = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "model_name": self.model_name,
+            "chunker_version": self.chunker_version,
+            "count": count,
+            "files": files,
+        }
+        self._atomic_write(
+            MANIFEST_FILE,
+            lambda f: f.write(json.dumps(manifest, ensure_ascii=False).encode("utf-8")),
+        )
+
+    def _atomic_write(self, name, write):
+        target = self._path(name)
+        tmp = target + ".tmp"
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, target)
+
+
+# -------------------------------
+# Abgleich Index <-> Dokumentenordner
+# -------------------------------
+def diff_files(old, new):
+    """Gibt (hinzugefügt, geändert, entfernt) als sortierte Pfadlisten zurück."""
+    added = sorted(p for p in new if p not in old)
+    removed = sorted(p for p in old if p not in new)
+    changed = sorted(p for p in new if p in old and new[p]["sha1"] != old[p]["sha1"])
+    return added, changed, removed
+
+
+def sync_retriever(retriever, old_files, new_files, report=None, failed=None):
+    """
+    Wendet die Differenz zweier Manifeste auf den Retriever an: nur hinzugefügte
+    und geänderte Dateien werden neu geladen, gechunkt und eingebettet.
+
+    Lässt sich eine Datei nicht einlesen, bleiben ihre bisherigen Chunks im Index und
+    `new_files` erhält wieder den alten Eintrag (bzw. keinen, falls sie neu war).
+    `failed` ({Pfad: Manifest-Eintrag}) merkt sich solche Dateien: sie werden erst
+    wieder eingelesen, wenn sich ihr Inhalt (sha1) ändert.
+    Gibt die Anzahl übernommener Dateien zurück.
+    """
+    failed = {} if failed is None else failed
+    for path in [p for p in failed if p not in new_files]:
+        del failed[path]
+
+    def keep_previous(path):
+        if path in old_files:
+            new_files[path] = old_files[path]
+        else:
+            new_files.pop(path, None)
+
+    added, changed, removed = diff_files(old_files, new_files)
+    for path in removed:
+        retriever.remove_source(path)
+    applied = len(removed)
+
+    pending = []
+    for path in changed + added:
+        if path in failed and failed[path]["sha1"] == new_files[path]["sha1"]:
+            keep_previous(path)
+        else:
+            pending.append(path)
+    for path, chunks, error in iter_documents_from_files(pending, report=report):
+        if error:
+            failed[path] = new_files[path]
+            keep_previous(path)
+            continue
+        failed.pop(path, None)
+        retriever.update_source(path, chunks)
+        applied += 1
+    return applied
+
+
+class FolderWatcher:
+    """
+    Prüft den Dokumentenordner periodisch im Hintergrund und übernimmt neue,
+    geänderte und gelöschte Dateien inkrementell in Retriever und Index-Cache.
+    Nicht lesbare Dateien (`failed`, siehe sync_retriever) werden erst nach einer
+    Änderung erneut versucht.
+    """
+
+    def __init__(self, folder_path, retriever, index_store, files, interval=5.0, report=None, failed=None):
+        self.folder_path = folder_path
+        self.retriever = retriever
+        self.index_store = index_store
+        self.files = files
+        self.interval = interval
+        self.report = report
+        self.failed = {} if failed is None else failed
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="FolderWatcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Fehler beim Abgleich von {self.folder_path}: {e}")
+
+    def sync(self):
+        """Führt einen einzelnen Abgleich aus; gibt die Anzahl betroffener Dateien zurück."""
+        # Hashes fehlgeschlagener Dateien wiederverwenden, solange Grösse und mtime gleich sind
+        files = scan_folder(self.folder_path, previous={**self.files, **self.failed})
+        changes = sync_retriever(self.retriever, self.files, files, self.report, self.failed)
+        mtime_changed = any(
+            self.files[p]["mtime_ns"] != files[p]["mtime_ns"] for p in files if p in self.files
+        )
+        self.files = files
+        if changes or mtime_changed:
+            self.index_store.save_retriever(files, self.retriever)
+        return changes
@@ -0,0 +1,98 @@
+# utils/metadata_index.py
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from langchain.docstore.document import Document
+
+# Metadaten-Felder, nach denen gefiltert werden kann
+FILTER_FIELDS = ("category", "source")
+
+# Filter: {Feld: [erlaubte Werte]}; innerhalb eines Feldes ODER, zwischen Feldern UND
+Filters = Dict[str, List[str]]
+
+
+def filters_key(filters: Optional[Filters]) -> tuple:
+    """Kanonische, hashbare Form der aktiven Filter (z. B. für Cache-Schlüssel)."""
+    return tuple(sorted((field, tuple(sorted(set(values)))) for field, values in (filters or {}).items() if values))
+
+
+# ------------------------------
+# Posting-Listen pro Metadaten-Wert
+# ------------------------------
+class MetadataIndex:
+    """
+    Hält pro Feld ein kompaktes Array mit einem Wert-Code je Chunk (Position wie im
+    Retriever). Daraus werden bei Bedarf Posting-Listen gebaut (sortierte Positionen
+    pro Wert); Hinzufügen und Entfernen markiert sie lediglich als veraltet, wie beim
+    BM25-Index. Eine gefilterte Suche bewertet damit nur die passenden Chunks.
+    """
+
+    def __init__(self, docs: Iterable[Document] = (), fields=FILTER_FIELDS):
+        self.fields = tuple(fields)
+        self.vocab = {field: {} for field in self.fields}
+        self.codes = {field: np.zeros(0, dtype=np.int32) for field in self.fields}
+        self._postings = None
+
+        self.add_documents(docs)
+
+    def __len__(self):
+        return len(self.codes[self.fields[0]]) if self.fields else 0
+
+    # ------------------------------
+    # Aktualisierung
+    # ------------------------------
+    def add_documents(self, docs: Iterable[Document]):
+        docs = list(docs)
+        for field in self.fields:
+            vocab = self.vocab[field]
+            new = np.fromiter(
+                (vocab.setdefault(str(doc.metadata.get(field, "")), len(vocab)) for doc in docs),
+                dtype=np.int32, count=len(docs)
+            )
+            self.codes[field] = np.concatenate([self.codes[field], new])
+        self._postings = None
+
+    def remove_indices(self, indices: Iterable[int]):
+        """Entfernt Chunks anhand ihrer Position; nachfolgende Positionen rücken nach."""
+        indices = sorted(set(indices))
+        for field in self.fields:
+            self.codes[field] = np.delete(self.codes[field], indices)
+        self._postings = None
+
+    def _build(self):
+        postings = {}
+        for field, codes in self.codes.items():
+            # Stabil sortiert: Positionen innerhalb eines Wertes bleiben aufsteigend
+            order = np.argsort(codes, kind="stable").astype(np.int64)
+            ptr = np.zeros(len(self.vocab[field]) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(codes, minlength=len(self.vocab[field])), out=ptr[1:])
+            postings[field] = (ptr, order)
+        self._postings = postings
+        return postings
+
+    # ------------------------------
+    # Abfrage
+    # ------------------------------
+    def select(self, filters: Optional[Filters]) -> Optional[np.ndarray]:
+        """Sortierte Positionen aller passenden Chunks; None, wenn kein Filter aktiv ist."""
+        active = dict(filters_key(filters))
+        if not active:
+            return None
+        postings = self._postings or self._build()
+
+        selected = None
+        for field, values in active.items():
+            if field not in self.vocab:
+                raise ValueError(f"Unbekanntes Filterfeld '{field}', erlaubt: {', '.join(self.fields)}")
+            ptr, order = postings[field]
+            vocab = self.vocab[field]
+            parts = [order[ptr[vocab[v]]:ptr[vocab[v] + 1]] for v in values if v in vocab]
+            ids = np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+            selected = ids if selected is None else np.intersect1d(selected, ids, assume_unique=True)
+            if not len(selected):
+                break
+        return selected
+
+    def value_counts(self, field: str) -> Dict[str, int]:
+        """Anzahl Chunks pro Wert (nur vorhandene Werte), alphabetisch sortiert."""
+        counts = np.bincount(self.codes[field], minlength=len(self.vocab[field]))
+        return {value: int(counts[code]) for value, code in sorted(self.vocab[field].items()) if counts[code]}
@@ -0,0 +1,189 @@
+# utils/metrics.py
+import bisect
+import cProfile
+import io
+import pstats
+import threading
+import time
+from functools import wraps
+from typing import Callable, Optional
+
+# Obergrenzen der Histogramm-Buckets in Sekunden (0.1 ms … 60 s, darüber "+Inf")
+BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+PROMETHEUS_METRIC = "lexmind_stage_seconds"
+
+
+# ------------------------------
+# Histogramm pro Stufe
+# ------------------------------
+class Histogram:
+    """Zählt Dauern in festen Buckets; Speicherbedarf unabhängig von der Anzahl Messungen."""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Schätzung aus den Buckets (linear innerhalb des Buckets, nie über dem Maximum)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = min(BUCKETS[i] if i < len(BUCKETS) else self.max, self.max)
+                return lower + (upper - lower) * max(rank - seen, 0) / n
+            seen += n
+        return self.max
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+# ------------------------------
+# Registry
+# ------------------------------
+class Metrics:
+    """
+    Prozessweite Laufzeitmessung nach Stufen ("search.encode", "ingest.parse_pdf", …).
+
+        with metrics.span("preview.render"): ...
+        @metrics.timed("ui.highlight")
+        metrics.observe_all("search", timings)   # Dict aus HybridRetriever.search
+
+    Ist `enabled` aus, liefert span() ein geteiltes No-op-Objekt und timed() ruft die
+    Funktion direkt auf; es wird dann weder gemessen noch gesperrt.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def span(self, name: str):
+        return _Span(self, name) if self.enabled else _NO_SPAN
+
+    def timed(self, name: Optional[str] = None) -> Callable:
+        def decorate(fn):
+            label = name or f"{fn.__module__}.{fn.__qualname__}"
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(label, time.perf_counter() - start)
+            return wrapper
+        return decorate
+
+    def observe(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_all(self, prefix: str, timings: dict):
+        """Übernimmt ein Dict {Stufe: Sekunden} (z. B. `timings` der Suche) als "<prefix>.<Stufe>"."""
+        for stage, seconds in timings.items():
+            self.observe(f"{prefix}.{stage}", seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "count": h.count,
+                    "mean_ms": h.sum / h.count * 1000,
+                    "p50_ms": h.quantile(0.5) * 1000,
+                    "p95_ms": h.quantile(0.95) * 1000,
+                    "p99_ms": h.quantile(0.99) * 1000,
+                    "max_ms": h.max * 1000,
+                    "total_s": h.sum,
+                }
+                for name, h in sorted(self._histograms.items())
+            }
+
+    def prometheus(self, metric: str = PROMETHEUS_METRIC) -> str:
+        """Histogramme im Prometheus-Textformat (Label "stage")."""
+        lines = [f"# HELP {metric} Dauer der Pipeline-Stufen in Sekunden", f"# TYPE {metric} histogram"]
+        with self._lock:
+            for name, h in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, n in zip(BUCKETS + (float("inf"),), h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{metric}_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{stage="{name}"}} {h.sum!r}')
+                lines.append(f'{metric}_count{{stage="{name}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+metrics = Metrics()
+
+
+# ------------------------------
+# cProfile für einen einzelnen Aufruf
+# ------------------------------
+_profile_lock = threading.Lock()
+
+
+def profile(fn: Callable, *args, sort: str = "cumulative", limit: int = 40, **kwargs):
+    """
+    Führt `fn(*args, **kwargs)` einmal unter cProfile aus und gibt (Ergebnis, Bericht) zurück.
+    Erfasst nur den aufrufenden Thread; es läuft immer höchstens ein Profil gleichzeitig.
+    """
+    with _profile_lock:
+        profiler = cProfile.Profile()
+        result = profiler.runcall(fn, *args, **kwargs)
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return result, out.getvalue()
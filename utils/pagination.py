@@ -0,0 +1,27 @@
+# utils/pagination.py
+import streamlit as st
+
+
+def _set_page(key, page):
+    st.session_state[key] = page
+
+
+def paginate(items, per_page, key):
+    """
+    Gibt (Einträge der aktuellen Seite, Startindex, Seite, Seitenanzahl) zurück.
+    Die Seite liegt in st.session_state[key]; gerendert wird nur dieser Ausschnitt.
+    """
+    n_pages = max(1, -(-len(items) // per_page))
+    page = min(max(st.session_state.get(key, 1), 1), n_pages)
+    start = (page - 1) * per_page
+    return items[start:start + per_page], start, page, n_pages
+
+
+def render_page_controls(page, n_pages, key):
+    """Zurück/Weiter-Buttons; die Seite wird im Callback gesetzt, damit der Rerun sie schon zeigt."""
+    if n_pages <= 1:
+        return
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    col_prev.button("◀ Zurück", key=f"{key}-prev", disabled=page <= 1, on_click=_set_page, args=(key, page - 1))
+    col_info.caption(f"Seite {page} von {n_pages}")
+    col_next.button("Weiter ▶", key=f"{key}-next", disabled=page >= n_pages, on_click=_set_page, args=(key, page + 1))
@@ -0,0 +1,107 @@
+# utils/preview.py
+import os
+import queue
+import threading
+from utils.metrics import metrics
+
+PREVIEW_DIR = "previews"
+
+# Verhindert, dass mehrere Sessions dieselbe Vorschau gleichzeitig rendern
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(path):
+    with _locks_guard:
+        return _locks.setdefault(path, threading.Lock())
+
+
+def preview_path(docx_path, output_dir=PREVIEW_DIR):
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(docx_path))[0] + ".pdf")
+
+
+def is_preview_current(docx_path, output_dir=PREVIEW_DIR):
+    """True, wenn eine Vorschau existiert, die nicht älter als die DOCX-Datei ist."""
+    pdf_path = preview_path(docx_path, output_dir)
+    try:
+        return os.path.getmtime(pdf_path) >= os.path.getmtime(docx_path)
+    except OSError:
+        return False
+
+
+# -------------------------------
+# DOCX zu PDF Vorschau exportieren
+# -------------------------------
+@metrics.timed("preview.render")
+def export_docx_to_pdf(docx_path, output_dir=PREVIEW_DIR):
+    """Rendert eine einfache PDF-Vorschau."""
+    # python-docx und reportlab erst beim ersten Rendern importieren
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    from docx import Document as DocxDocument
+
+    os.makedirs(output_dir, exist_ok=True)
+    doc = DocxDocument(docx_path)
+
+    pdf_path = preview_path(docx_path, output_dir)
+    # In eine temporäre Datei schreiben, damit nie eine halbfertige Vorschau ausgeliefert wird
+    tmp_path = pdf_path + ".tmp"
+    c = canvas.Canvas(tmp_path, pagesize=A4)
+    width, height = A4
+    y = height - 40
+
+    for para in doc.paragraphs:
+        text = para.text.strip()
+        if not text:
+            y -= 15
+            continue
+        for line in text.split("\n"):
+            c.drawString(40, y, line[:120])
+            y -= 15
+            if y < 50:
+                c.showPage()
+                y = height - 40
+
+    c.save()
+    os.replace(tmp_path, pdf_path)
+    return pdf_path
+
+
+def get_preview(docx_path, output_dir=PREVIEW_DIR):
+    """
+    Gibt den Pfad zur PDF-Vorschau zurück und erzeugt sie nur, wenn sie fehlt
+    oder veraltet ist. Bei Fehlern wird None zurückgegeben.
+    """
+    if is_preview_current(docx_path, output_dir):
+        return preview_path(docx_path, output_dir)
+
+    with _lock_for(docx_path):
+        # Eine andere Session könnte die Vorschau inzwischen erzeugt haben
+        if is_preview_current(docx_path, output_dir):
+            return preview_path(docx_path, output_dir)
+        try:
+            return export_docx_to_pdf(docx_path, output_dir)
+        except Exception:
+            return None
+
+
+# -------------------------------
+# Vorschauen im Hintergrund erzeugen
+# -------------------------------
+class PreviewWorker:
+    """Erzeugt fehlende oder veraltete Vorschauen nacheinander in einem Hintergrund-Thread."""
+
+    def __init__(self, output_dir=PREVIEW_DIR):
+        self.output_dir = output_dir
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="PreviewWorker", daemon=True)
+        self._thread.start()
+
+    def submit(self, paths):
+        for path in paths:
+            if path.lower().endswith(".docx") and not is_preview_current(path, self.output_dir):
+                self._queue.put(path)
+
+    def _run(self):
+        while True:
+            get_preview(self._queue.get(), self.output_dir)
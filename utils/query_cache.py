@@ -0,0 +1,76 @@
+# utils/query_cache.py
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+def normalize_query(query: str) -> str:
+    """Kleinschreibung und einheitliche Leerzeichen (BM25 und Embedding-Modell sind ohnehin case-insensitiv)."""
+    return re.sub(r"\s+", " ", query.lower()).strip()
+
+
+# ------------------------------
+# LRU-Cache mit Ablaufzeit und Statistik
+# ------------------------------
+class QueryCache:
+    """
+    Threadsicherer LRU-Cache mit optionaler Ablaufzeit (`ttl` in Sekunden, None = unbegrenzt),
+    prozessweit über alle Sessions geteilt. Zählt Treffer, Fehlschläge und Invalidierungen.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: Optional[float] = 600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable):
+        """Gespeicherter Wert oder None."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Verwirft alle Einträge (z. B. nach einer Index-Änderung)."""
+        with self._lock:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
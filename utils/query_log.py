@@ -0,0 +1,193 @@
+# utils/query_log.py
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from typing import Iterable, Optional
+import numpy as np
+from utils.query_cache import normalize_query
+
+QUERY_LOG_PATH = ".query_log/queries.jsonl"
+QUERY_LOG_MAX_BYTES = 5 * 2**20
+QUERY_LOG_BACKUPS = 3  # rotierte Dateien queries.jsonl.1 … .3
+# Für Perzentile werden nur die letzten Messungen pro Stufe gehalten
+LATENCY_WINDOW = 5000
+# Höchstens so viele verschiedene Anfragen werden gezählt, je für alle Anfragen und für
+# solche ohne Treffer (seltene fallen bei Bedarf heraus)
+MAX_DISTINCT_QUERIES = 20000
+
+
+# ------------------------------
+# Persistentes Anfrage-Log mit Rollups
+# ------------------------------
+class QueryLog:
+    """
+    Prozessweites, nur anhängendes Log aller Suchen und Klicks (JSON Lines).
+
+    `record()` legt ein Ereignis nur in eine Warteschlange; ein Hintergrund-Thread schreibt
+    sie gebündelt in die Datei und rotiert sie, sobald sie `max_bytes` überschreitet.
+    Zähler und Latenzen (Top-Anfragen, Anfragen ohne Treffer, Perzentile) werden beim
+    Aufzeichnen fortgeschrieben; beim Start werden sie einmal aus den vorhandenen Dateien
+    aufgebaut. Der Admin-Tab liest nur diese Rollups, nie das rohe Log.
+    """
+
+    def __init__(self, path: str = QUERY_LOG_PATH, max_bytes: int = QUERY_LOG_MAX_BYTES,
+                 backups: int = QUERY_LOG_BACKUPS, max_pending: int = 10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self.write_errors = 0
+
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.clicks = 0
+        self._queries = Counter()
+        self._zero_results = Counter()
+        self._clicked = Counter()
+        self._latencies = {}
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="QueryLog", daemon=True)
+        self._thread.start()
+
+    # ------------------------------
+    # Aufzeichnen (Request-Pfad)
+    # ------------------------------
+    def record(self, event: dict):
+        event = {"ts": time.time(), **event}
+        self._update(event)
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Log hinkt hinterher: Ereignis verwerfen statt die Suche zu blockieren
+            with self._lock:
+                self.dropped += 1
+
+    def record_search(self, query: str, results_count: int, result_ids: Iterable[str] = (),
+                      filters: Optional[dict] = None, timings: Optional[dict] = None):
+        self.record({
+            "type": "search",
+            "query": query,
+            "filters": {field: values for field, values in (filters or {}).items() if values},
+            "results_count": results_count,
+            "result_ids": list(result_ids),
+            "timings_ms": {stage: round(seconds * 1000, 3) for stage, seconds in (timings or {}).items()},
+        })
+
+    def record_click(self, query: str, result_id: str, source: str, action: str = "download"):
+        self.record({"type": "click", "query": query, "result_id": result_id, "source": source, "action": action})
+
+    def _update(self, event: dict):
+        with self._lock:
+            if event.get("type") == "search":
+                self.searches += 1
+                query = normalize_query(event.get("query", ""))
+                self._queries[query] += 1
+                if not event.get("results_count"):
+                    self._zero_results[query] += 1
+                for stage, ms in event.get("timings_ms", {}).items():
+                    self._latencies.setdefault(stage, deque(maxlen=LATENCY_WINDOW)).append(ms)
+                if len(self._queries) > MAX_DISTINCT_QUERIES:
+                    self._queries = Counter(dict(self._queries.most_common(MAX_DISTINCT_QUERIES // 2)))
+                if len(self._zero_results) > MAX_DISTINCT_QUERIES:
+                    self._zero_results = Counter(dict(self._zero_results.most_common(MAX_DISTINCT_QUERIES // 2)))
+            elif event.get("type") == "click":
+                self.clicks += 1
+                self._clicked[event.get("source")] += 1
+
+    # ------------------------------
+    # Rollups (Admin-Tab)
+    # ------------------------------
+    def rollups(self, top: int = 20) -> dict:
+        with self._lock:
+            latency = {}
+            for stage, values in self._latencies.items():
+                values = np.asarray(values)
+                latency[stage] = {p: float(np.percentile(values, q)) for p, q in (("p50", 50), ("p95", 95), ("p99", 99))}
+            return {
+                "searches": self.searches,
+                "clicks": self.clicks,
+                "distinct_queries": len(self._queries),
+                "zero_result_searches": sum(self._zero_results.values()),
+                "top_queries": self._queries.most_common(top),
+                "zero_result_queries": self._zero_results.most_common(top),
+                "top_clicked": self._clicked.most_common(top),
+                "latency_ms": latency,
+                "dropped": self.dropped,
+                "write_errors": self.write_errors,
+            }
+
+    def query_counts(self) -> list:
+        """Alle gezählten Anfragen mit Häufigkeit (z. B. als Anfrage-Set für benchmarks.retrieval_benchmark)."""
+        with self._lock:
+            return self._queries.most_common()
+
+    # ------------------------------
+    # Schreiben im Hintergrund
+    # ------------------------------
+    def _files(self):
+        """Vorhandene Log-Dateien, älteste zuerst."""
+        rotated = [f"{self.path}.{i}" for i in range(self.backups, 0, -1)]
+        return [path for path in rotated + [self.path] if os.path.exists(path)]
+
+    def _replay(self):
+        for path in self._files():
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            self._update(json.loads(line))
+                        except ValueError:
+                            continue  # z. B. halbe Zeile nach einem Absturz
+            except OSError:
+                continue
+
+    def _rotate(self):
+        if self.backups:
+            for i in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{i}"):
+                    os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _write(self, events):
+        lines = [(json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8") for event in events]
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            chunk = []
+            for line in lines:
+                # Rotieren, bevor die Datei `max_bytes` überschreiten würde (auch mitten in einem Bündel)
+                if size and size + len(line) > self.max_bytes:
+                    with open(self.path, "ab") as f:
+                        f.write(b"".join(chunk))
+                    self._rotate()
+                    size, chunk = 0, []
+                chunk.append(line)
+                size += len(line)
+            with open(self.path, "ab") as f:
+                f.write(b"".join(chunk))
+        except OSError:
+            with self._lock:
+                self.write_errors += 1
+
+    def _run(self):
+        self._replay()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self):
+        """Wartet, bis alle aufgezeichneten Ereignisse geschrieben sind."""
+        self._queue.join()
@@ -0,0 +1,152 @@
+# utils/rag.py
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from langchain.docstore.document import Document
+
+RAG_TOP_K = 5
+# Token-Budget für den gesamten Prompt (ohne Antwort) und den Anteil für den Chatverlauf
+CONTEXT_TOKEN_BUDGET = 1500
+HISTORY_TOKEN_BUDGET = 300
+# Grobe Schätzung ohne Tokenizer: ~4 Zeichen pro Token
+CHARS_PER_TOKEN = 4
+
+SYSTEM_PROMPT = (
+    "Du bist LexMind, ein juristischer Assistent. Beantworte die Frage präzise und sachlich "
+    "auf Grundlage der folgenden Auszüge aus Vorlagen. Nenne die Quelle in eckigen Klammern, "
+    "z. B. [1]. Steht die Antwort nicht in den Auszügen, sage das."
+)
+
+
+# -------------------------------
+# Token-Schätzung
+# -------------------------------
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    max_chars = max(tokens, 0) * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    # An einer Wortgrenze abschneiden
+    cut = text[:max_chars].rsplit(" ", 1)[0]
+    return cut + " …" if cut else ""
+
+
+# -------------------------------
+# Prompt mit festem Budget
+# -------------------------------
+def build_rag_prompt(question: str, docs: List[Document], history: List[Dict[str, str]],
+                     budget: int = CONTEXT_TOKEN_BUDGET, history_budget: int = HISTORY_TOKEN_BUDGET) -> str:
+    """
+    Baut den Prompt aus System-Anweisung, Auszügen und Chatverlauf, ohne `budget`
+    Tokens zu überschreiten. Der Verlauf (neueste Nachrichten zuerst) erhält höchstens
+    `history_budget`; der Rest wird auf die Auszüge verteilt, wobei kein Auszug mehr als
+    seinen Anteil am verbleibenden Budget erhält (nicht genutzter Platz geht an die folgenden).
+    """
+    head = SYSTEM_PROMPT + "\n\n"
+    tail = f"User: {question}\nAssistant:"
+    remaining = budget - estimate_tokens(head) - estimate_tokens(tail)
+
+    # Verlauf: neueste Nachrichten zuerst, einzelne lange Nachrichten gekürzt
+    history_lines = []
+    history_left = min(history_budget, max(remaining, 0))
+    for message in reversed(history):
+        line = f"{message['role'].capitalize()}: {message['content']}\n"
+        cost = estimate_tokens(line)
+        if cost > history_left:
+            line = truncate_to_tokens(line.rstrip("\n"), history_left)
+            if line:
+                history_lines.append(line + "\n")
+            break
+        history_lines.append(line)
+        history_left -= cost
+    history_text = "".join(reversed(history_lines))
+    remaining -= estimate_tokens(history_text)
+
+    excerpts = []
+    if docs:
+        remaining -= estimate_tokens("Auszüge:\n\n")
+    for i, doc in enumerate(docs, start=1):
+        label = f"[{i}] {doc.metadata.get('source', 'Unbekannt')} – {doc.metadata.get('heading', '–')}\n"
+        share = remaining // (len(docs) - i + 1)
+        room = share - estimate_tokens(label) - 1
+        if room <= 0:
+            break
+        content = truncate_to_tokens(doc.page_content, room)
+        if not content:
+            break
+        excerpts.append(label + content + "\n")
+        remaining -= estimate_tokens(excerpts[-1]) + 1  # + Trennzeile
+
+    context = "Auszüge:\n" + "\n".join(excerpts) + "\n" if excerpts else ""
+    return head + context + history_text + tail
+
+
+# -------------------------------
+# Antwort-Cache
+# -------------------------------
+def normalize_question(question: str) -> str:
+    """Kleinschreibung, einheitliche Leerzeichen, ohne Satzzeichen am Ende."""
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?!. ")
+
+
+def chunk_id(doc: Document) -> str:
+    """Stabile ID aus Pfad und Inhalt; ändert sich eine Vorlage, ändert sich die ID."""
+    h = hashlib.sha1(doc.metadata.get("path", "").encode("utf-8"))
+    h.update(doc.page_content.encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def answer_cache_key(question: str, docs: List[Document]):
+    return normalize_question(question), tuple(chunk_id(doc) for doc in docs)
+
+
+class AnswerCache:
+    """LRU-Cache für Antworten, prozessweit über alle Sessions geteilt."""
+
+    def __init__(self, maxsize: int = 1000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[str]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, answer: str):
+        with self._lock:
+            self._data[key] = answer
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+answer_cache = AnswerCache()
+
+
+# -------------------------------
+# Lokaler Ersatz ohne Sprachmodell
+# -------------------------------
+def extractive_answer(question: str, docs: List[Document], max_chars: int = 400) -> str:
+    """Antwortet mit den gefundenen Auszügen; zum Testen ohne Hugging Face API oder lokales Modell."""
+    if not docs:
+        return "Zu dieser Frage wurden keine passenden Vorlagen gefunden."
+    lines = ["Relevante Stellen aus den Vorlagen:"]
+    for i, doc in enumerate(docs, start=1):
+        snippet = doc.page_content[:max_chars] + ("…" if len(doc.page_content) > max_chars else "")
+        lines.append(f"**[{i}] {doc.metadata.get('source', 'Unbekannt')}**\n\n{snippet}")
+    return "\n\n".join(lines)
@@ -0,0 +1,143 @@
+# utils/reranker.py
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import List, Tuple
+import numpy as np
+from langchain.docstore.document import Document
+from utils.query_cache import QueryCache, normalize_query
+from utils.rag import chunk_id
+
+# Mehrsprachiges Cross-Encoder-Modell (u. a. Deutsch), auf CPU brauchbar
+RERANKER_MODEL_NAME = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+
+def load_cross_encoder(model_name: str = RERANKER_MODEL_NAME):
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(model_name, max_length=256)
+
+
+# ------------------------------
+# Cross-Encoder-Re-Ranking mit Zeitbudget
+# ------------------------------
+class CrossEncoderReranker:
+    """
+    Bewertet die `top_n` Kandidaten der ersten Stufe mit einem Cross-Encoder neu
+    (alle Paare in einem Forward-Pass). Das Modell läuft in einem eigenen Thread:
+    ist es nach `time_budget` Sekunden nicht fertig, bleibt die Reihenfolge der ersten
+    Stufe bestehen. Eine bereits laufende Rechnung füllt den Score-Cache für das nächste
+    Mal; noch wartende Aufträge werden verworfen, damit sich keine veraltete Arbeit staut.
+    Scores pro (Anfrage, Chunk) werden gecacht, sodass nur neue Paare gerechnet werden.
+
+    Das Laden des Modells zählt nicht zum Zeitbudget: warmup() lädt es vorab (z. B. beim
+    Start); bis es bereit ist, liefern Suchen mit Zeitbudget die Reihenfolge der ersten Stufe.
+    """
+
+    def __init__(self, model=None, model_name: str = RERANKER_MODEL_NAME, top_n: int = 20,
+                 time_budget: float = 0.5, batch_size: int = 32, cache: QueryCache = None):
+        self.model_name = model_name
+        self.top_n = top_n
+        self.time_budget = time_budget
+        self.batch_size = batch_size
+        self.cache = cache or QueryCache(maxsize=20000, ttl=None)
+        self.timeouts = 0
+        self.errors = 0
+        self.reranked = 0
+        self.cold = 0
+
+        self._model = model
+        self._model_lock = threading.Lock()
+        # Ein Thread: Modellaufrufe aus mehreren Sessions laufen nacheinander statt gegeneinander
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+        self._ready = threading.Event()
+        self._warming = False
+
+    @property
+    def model(self):
+        with self._model_lock:
+            if self._model is None:
+                self._model = load_cross_encoder(self.model_name)
+            return self._model
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def warmup(self):
+        """Lädt das Modell und rechnet ein Paar (erste Vorhersage initialisiert Tokenizer und Kernel)."""
+        if self.ready:
+            return
+        self.model.predict([("Vertrag", "Vertrag")], show_progress_bar=False)
+        self._ready.set()
+
+    def _warmup_in_background(self):
+        with self._model_lock:
+            if self._warming:
+                return
+            self._warming = True
+
+        def run():
+            try:
+                self.warmup()
+            except Exception:
+                self.errors += 1
+            finally:
+                with self._model_lock:
+                    self._warming = False
+
+        self._executor.submit(run)
+
+    def _score(self, query: str, docs: List[Document], keys) -> np.ndarray:
+        logits = np.asarray(self.model.predict(
+            [(query, doc.page_content) for doc in docs], batch_size=self.batch_size, show_progress_bar=False
+        ), dtype=np.float64)
+        scores = 1.0 / (1.0 + np.exp(-logits))
+        for key, score in zip(keys, scores):
+            self.cache.put(key, float(score))
+        return scores
+
+    def rerank(self, query: str, results: List[Tuple[Document, float]], k: int) -> Tuple[List[Tuple[Document, float]], bool]:
+        """
+        Gibt (Top-k, vollständig) zurück. `vollständig` ist False, wenn das Zeitbudget
+        überschritten wurde und die Reihenfolge der ersten Stufe verwendet wird.
+        Ist k grösser als top_n, folgen auf die neu sortierten Kandidaten die übrigen
+        Treffer der ersten Stufe unverändert (mit ihren Scores der ersten Stufe).
+        """
+        candidates = results[:self.top_n]
+        if not candidates:
+            return results[:k], True
+
+        normalized = normalize_query(query)
+        keys = [(normalized, chunk_id(doc)) for doc, _ in candidates]
+        scores = [self.cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        if missing and self.time_budget is not None and not self.ready:
+            # Modell noch nicht geladen: Laden anstossen statt das Zeitbudget damit zu verbrauchen
+            self._warmup_in_background()
+            self.cold += 1
+            return results[:k], False
+
+        if missing:
+            future = self._executor.submit(
+                self._score, query, [candidates[i][0] for i in missing], [keys[i] for i in missing]
+            )
+            try:
+                for i, score in zip(missing, future.result(timeout=self.time_budget)):
+                    scores[i] = float(score)
+            except FutureTimeout:
+                # Noch nicht gestartet: verwerfen, das Ergebnis wartet niemand mehr ab
+                future.cancel()
+                self.timeouts += 1
+                return results[:k], False
+            except Exception:
+                # z. B. Modell nicht ladbar: Suche funktioniert weiter mit der ersten Stufe
+                self.errors += 1
+                return results[:k], False
+
+        self.reranked += 1
+        order = np.argsort(-np.asarray(scores), kind="stable")[:k]
+        return [(candidates[i][0], scores[i]) for i in order] + results[self.top_n:k], True
+
+    def stats(self) -> dict:
+        return {"reranked": self.reranked, "timeouts": self.timeouts, "errors": self.errors,
+                "cold": self.cold, **self.cache.stats()}
@@ -3,60 +3,146 @@
 import streamlit as st
 import re
 import os
+import threading
+from collections import OrderedDict
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from utils.preview import get_preview
+from utils.downloads import deferred_file, mime_type
+from utils.embeddings import as_embedding_provider
+from utils.query_cache import QueryCache, normalize_query
+from utils.metrics import metrics
+
+HIGHLIGHT_STOPWORDS = {
+    "ein", "eine", "einer", "der", "die", "das", "und", "oder", "für", "mit", "in",
+    "auf", "von", "zu", "zur", "vom", "den", "des", "am", "im", "aus", "an", "dem",
+    "ist", "es", "sind", "dass", "welche", "das", "dies", "diese", "dieser", "dieses",
+    "etc", "sofern", "wenn", "wie", "auch"
+}
+SNIPPET_LENGTH = 300
 
 
 # -------------------------------
-# Semantisches Highlighting
+# Wort-Embedding-Cache (prozessweit, über alle Sessions)
 # -------------------------------
-def highlight_semantic_terms(text, query, embedding_model, threshold=0.7):
-    STOPWORDS = {
-        "ein", "eine", "einer", "der", "die", "das", "und", "oder", "für", "mit", "in",
-        "auf", "von", "zu", "zur", "vom", "den", "des", "am", "im", "aus", "an", "dem",
-        "ist", "es", "sind", "dass", "welche", "das", "dies", "diese", "dieser", "dieses",
-        "etc", "sofern", "wenn", "wie", "auch"
-    }
-
-    words = list(set(re.findall(r'\b\w{4,}\b', text)))
-    words_filtered = [w for w in words if w.lower() not in STOPWORDS]
-
-    if not words_filtered:
-        return text
+class WordEmbeddingCache:
+    """Begrenzter LRU-Cache für Wort-Embeddings, damit häufiges juristisches Vokabular nur einmal kodiert wird."""
+
+    def __init__(self, maxsize=50000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, words):
+        """Gibt ({Wort: Embedding} der Treffer, Liste fehlender Wörter) zurück."""
+        found, missing = {}, []
+        with self._lock:
+            for word in words:
+                if word in self._data:
+                    self._data.move_to_end(word)
+                    found[word] = self._data[word]
+                else:
+                    missing.append(word)
+        return found, missing
+
+    def put_many(self, words, embeddings):
+        with self._lock:
+            for word, embedding in zip(words, embeddings):
+                self._data[word] = embedding
+                self._data.move_to_end(word)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+word_embedding_cache = WordEmbeddingCache()
+# Fertige Highlight-Begriffe pro (Anfrage, Snippets), z. B. bei wiederholten Suchen
+highlight_cache = QueryCache(maxsize=512, ttl=None)
 
-    # --- Query-Embedding je nach Modelltyp ---
-    if hasattr(embedding_model, "embed_query"):  
-        # LangChain Embedding
-        query_embedding = embedding_model.embed_query(query)
-        word_embeddings = embedding_model.client.encode(words_filtered)
-    else:
-        # SentenceTransformer
-        query_embedding = embedding_model.encode([query])[0]
-        word_embeddings = embedding_model.encode(words_filtered)
-
-    # Similarities berechnen
-    similarities = cosine_similarity([query_embedding], word_embeddings)[0]
-
-    for word, sim in zip(words_filtered, similarities):
-        if sim >= threshold:
-            pattern = re.compile(rf"\b{re.escape(word)}\b", re.IGNORECASE)
-            text = pattern.sub(
-                f"<span style='background-color:#FEF08A; border-radius:3px; padding:0 2px;'>{word}</span>",
-                text
-            )
 
-    return text
+def make_snippet(doc):
+    return doc.page_content[:SNIPPET_LENGTH] + ("…" if len(doc.page_content) > SNIPPET_LENGTH else "")
+
+
+def extract_highlight_words(text):
+    words = set(re.findall(r'\b\w{4,}\b', text))
+    return {w for w in words if w.lower() not in HIGHLIGHT_STOPWORDS}
+
+
+# -------------------------------
+# Semantisches Highlighting
+# -------------------------------
+@metrics.timed("ui.highlight")
+def compute_highlight_terms(texts, query, embedding_model, threshold=0.7, service=None):
+    """
+    Bestimmt die semantisch zur Anfrage passenden Wörter für alle Snippets einer Suche:
+    ein Query-Embedding, alle Wörter dedupliziert und nur noch nicht gecachte in einem Batch kodiert.
+    Mit `service` (RetrievalService) wird das Query-Embedding der Suche wiederverwendet und
+    die Wörter werden in dessen Encoder-Thread kodiert, nicht parallel dazu im Script-Thread.
+    """
+    cache_key = (normalize_query(query), threshold, tuple(texts))
+    cached = highlight_cache.get(cache_key)
+    if cached is not None:
+        return set(cached)
+
+    words = sorted(set().union(*(extract_highlight_words(t) for t in texts))) if texts else []
+    if not words:
+        return set()
+
+    if service is not None:
+        encode_query, encode_words = service.encode_query, service.encode_words
+    else:
+        provider = as_embedding_provider(embedding_model)
+        encode_query, encode_words = provider.encode_query, provider.encode_documents
+    found, missing = word_embedding_cache.get_many(words)
+    query_embedding = encode_query(query)
+    if missing:
+        # Nur noch nicht gecachte Wörter, alle in einem Batch
+        with metrics.span("ui.highlight.encode"):
+            encoded = encode_words(missing)
+        word_embedding_cache.put_many(missing, encoded)
+        found.update(zip(missing, encoded))
+
+    word_embeddings = np.vstack([found[w] for w in words])
+    similarities = word_embeddings @ query_embedding
+    terms = {w for w, sim in zip(words, similarities) if sim >= threshold}
+    highlight_cache.put(cache_key, frozenset(terms))
+    return terms
+
+
+def apply_highlights(text, terms):
+    if not terms:
+        return text
+    # Längere Wörter zuerst, damit Teilwörter nicht vorher greifen
+    pattern = re.compile(
+        r"\b(" + "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)) + r")\b",
+        re.IGNORECASE
+    )
+    return pattern.sub(
+        r"<span style='background-color:#FEF08A; border-radius:3px; padding:0 2px;'>\g<0></span>",
+        text
+    )
+
+
+def highlight_semantic_terms(text, query, embedding_model, threshold=0.7, terms=None):
+    """Hebt semantisch passende Wörter hervor; `terms` aus compute_highlight_terms() spart das Kodieren."""
+    if terms is None:
+        terms = compute_highlight_terms([text], query, embedding_model, threshold)
+    return apply_highlights(text, terms)
 
 # -------------------------------
 # Result Card Rendering
 # -------------------------------
-def render_result_card(doc, idx, query, embedding_model=None, score=None):
+@metrics.timed("ui.result_card")
+def render_result_card(doc, idx, query, embedding_model=None, score=None, highlight_terms=None, log_click=None):
+    """`log_click(action)` wird bei "download" (beim Ausliefern der Datei) und "preview" aufgerufen."""
     file_path = doc.metadata.get("path")
     file_name = doc.metadata.get("source", "Dokument")
     category = doc.metadata.get("category", "–")
 
     # Dokumenttyp bestimmen
-    doc_type = "PDF" if file_name.lower().endswith(".pdf") else "DOCX"
+    doc_type = os.path.splitext(file_name)[1][1:].upper() or "–"
 
     # Titel
     title = f"### {file_name}"
@@ -65,8 +151,10 @@ def render_result_card(doc, idx, query, embedding_model=None, score=None):
     score_str = f"{score:.3f}" if score is not None else "–"
 
     # Snippet
-    snippet = doc.page_content[:300] + ("…" if len(doc.page_content) > 300 else "")
-    if embedding_model:
+    snippet = make_snippet(doc)
+    if highlight_terms is not None:
+        snippet = apply_highlights(snippet, highlight_terms)
+    elif embedding_model:
         snippet = highlight_semantic_terms(snippet, query, embedding_model)
     else:
         for term in query.split():
@@ -95,16 +183,37 @@ def render_result_card(doc, idx, query, embedding_model=None, score=None):
         """
         st.markdown(card_html, unsafe_allow_html=True)
 
-        # Download Button (separat)
+        # Download Button (separat): Datei wird erst beim Klick gelesen, ohne Rerun
         if file_path and os.path.exists(file_path):
-            with open(file_path, "rb") as f:
-                st.download_button(
-                    label=f"📥 {file_name} herunterladen",
-                    data=f,
-                    file_name=file_name,
-                    mime="application/pdf" if file_name.endswith(".pdf") else "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                    key=f"download-{idx}-{file_name}"
-                )
+            st.download_button(
+                label=f"📥 {file_name} herunterladen",
+                data=deferred_file(file_path, (lambda: log_click("download")) if log_click else None),
+                file_name=file_name,
+                mime=mime_type(file_name),
+                key=f"download-{idx}-{file_name}",
+                on_click="ignore"
+            )
+
+        # PDF-Vorschau für DOCX erst auf Anfrage erzeugen (danach aus previews/ bedient)
+        if file_path and file_path.lower().endswith(".docx") and os.path.exists(file_path):
+            preview_key = f"preview-{idx}-{file_name}"
+            clicked = st.button("👁️ PDF-Vorschau", key=preview_key)
+            if clicked and log_click:
+                log_click("preview")
+            if clicked or st.session_state.get(preview_key + "-ready"):
+                st.session_state[preview_key + "-ready"] = True
+                pdf_path = get_preview(file_path)
+                if pdf_path:
+                    st.download_button(
+                        label="📄 Vorschau (PDF) öffnen",
+                        data=deferred_file(pdf_path),
+                        file_name=os.path.basename(pdf_path),
+                        mime="application/pdf",
+                        key=f"preview-download-{idx}-{file_name}",
+                        on_click="ignore"
+                    )
+                else:
+                    st.warning("Vorschau konnte nicht erstellt werden.")
 
         # Card schließen
         st.markdown("</div>", unsafe_allow_html=True)
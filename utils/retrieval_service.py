@@ -0,0 +1,296 @@
+# utils/retrieval_service.py
+import asyncio
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+import numpy as np
+import requests
+from langchain.docstore.document import Document
+from utils.embeddings import EmbeddingProvider
+from utils.metadata_index import Filters
+from utils.metrics import metrics
+from utils.query_cache import QueryCache
+from utils.search import HybridRetriever
+
+
+class ServiceBusyError(RuntimeError):
+    """Warteschlange voll: Anfrage abgelehnt (Back-Pressure)."""
+
+
+# ------------------------------
+# Micro-Batching der Query-Embeddings
+# ------------------------------
+class QueryEncoder:
+    """
+    Sammelt gleichzeitig eintreffende Anfragen (bis `batch_size` oder `max_wait`
+    Sekunden nach der ersten) und kodiert sie in einem einzigen Forward-Pass.
+    Ein einziger Thread ruft das Modell auf, damit sich Sessions die CPU nicht streitig machen;
+    auch übrige Kodierungen (z. B. Wörter fürs Highlighting) laufen über encode_documents()
+    in diesem Thread, nach den Anfragen desselben Durchgangs.
+    """
+
+    def __init__(self, provider: EmbeddingProvider, batch_size: int = 32, max_wait: float = 0.005):
+        self.provider = provider
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.encoded = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="QueryEncoder", daemon=True)
+        self._thread.start()
+
+    def encode(self, text: str) -> np.ndarray:
+        future = Future()
+        self._queue.put((text, future, False))
+        return future.result()
+
+    def encode_documents(self, texts: List[str]) -> np.ndarray:
+        """Kodiert `texts` als ein Auftrag (EmbeddingProvider.encode_documents) im Encoder-Thread."""
+        future = Future()
+        self._queue.put((list(texts), future, True))
+        return future.result()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            queries = [(text, future) for text, future, documents in batch if not documents]
+            if queries:
+                self._encode_queries(queries)
+            for texts, future, documents in batch:
+                if documents:
+                    self._resolve(future, self.provider.encode_documents, texts)
+
+    def _encode_queries(self, queries):
+        try:
+            embeddings = self.provider.encode_queries([text for text, _ in queries])
+        except Exception as e:
+            for _, future in queries:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.encoded += len(queries)
+        for (_, future), embedding in zip(queries, embeddings):
+            future.set_result(embedding)
+
+    @staticmethod
+    def _resolve(future, fn, *args):
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+
+
+# ------------------------------
+# Retrieval-Service
+# ------------------------------
+class RetrievalService:
+    """
+    Gemeinsamer Einstiegspunkt für Suchen aus allen Sessions: begrenzter Worker-Pool,
+    Micro-Batching der Query-Embeddings und Back-Pressure (höchstens `max_pending`
+    angenommene Anfragen; weitere warten bis `wait_timeout` und werden dann mit
+    ServiceBusyError abgelehnt). `search()` hat dieselbe Signatur wie HybridRetriever.search.
+    """
+
+    def __init__(self, retriever: HybridRetriever, max_workers: int = 4, max_pending: int = 64,
+                 batch_size: int = 32, batch_wait: float = 0.005, wait_timeout: float = 5.0):
+        self.retriever = retriever
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.wait_timeout = wait_timeout
+        self.encoder = QueryEncoder(retriever.embedding_model, batch_size, batch_wait)
+        # Query-Embeddings der letzten Suchen (z. B. für das Highlighting derselben Anfrage)
+        self._query_embeddings = QueryCache(maxsize=256, ttl=None)
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retrieval")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._latencies = deque(maxlen=1000)
+
+    @property
+    def embedding_model(self):
+        return self.retriever.embedding_model
+
+    def filter_values(self, field: str) -> dict:
+        return self.retriever.filter_values(field)
+
+    def _encode_query(self, query: str) -> np.ndarray:
+        embedding = self.encoder.encode(query)
+        self._query_embeddings.put(query, embedding)
+        return embedding
+
+    def encode_query(self, query: str) -> np.ndarray:
+        """Query-Embedding; aus einer vorherigen Suche übernommen, sonst über den Encoder-Thread."""
+        embedding = self._query_embeddings.get(query)
+        return embedding if embedding is not None else self._encode_query(query)
+
+    def encode_words(self, words: List[str]) -> np.ndarray:
+        """Kodiert Wörter (z. B. fürs Highlighting) im Encoder-Thread statt im Script-Thread."""
+        return self.encoder.encode_documents(words)
+
+    def submit(self, query: str, k: int = 5, alpha: float = 0.5, fusion: str = None,
+               filters: Filters = None, timings: dict = None) -> Future:
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            with self._lock:
+                self._rejected += 1
+            raise ServiceBusyError("Suche ist ausgelastet. Bitte gleich erneut versuchen.")
+        with self._lock:
+            self._pending += 1
+        future = self._pool.submit(self._run, query, k, alpha, fusion, filters, timings, time.monotonic())
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def _run(self, query, k, alpha, fusion, filters, timings, submitted):
+        with self._lock:
+            self._running += 1
+        if timings is not None:
+            timings["queue"] = time.monotonic() - submitted
+        try:
+            return self.retriever.search(
+                query, k, alpha, fusion, encoder=self._encode_query, timings=timings, filters=filters
+            )
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._latencies.append(time.monotonic() - submitted)
+
+    def search(self, query: str, k: int = 5, alpha: float = 0.5, fusion: str = None,
+               filters: Filters = None, timings: dict = None, timeout: float = 30.0) -> List[Tuple[Document, float]]:
+        """Wie HybridRetriever.search; `timings` erhält zusätzlich die Wartezeit in der Warteschlange ("queue")."""
+        return self.submit(query, k, alpha, fusion, filters, timings).result(timeout)
+
+    async def asearch(self, query: str, k: int = 5, alpha: float = 0.5, fusion: str = None,
+                      filters: Filters = None) -> List[Tuple[Document, float]]:
+        """Asynchrone Variante; blockiert die Event-Loop nicht (auch nicht bei Back-Pressure)."""
+        loop = asyncio.get_running_loop()
+        future = await loop.run_in_executor(None, self.submit, query, k, alpha, fusion, filters)
+        return await asyncio.wrap_future(future)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            return {
+                "queue_depth": self._pending - self._running,
+                "running": self._running,
+                "encoder_queue": self.encoder.queue_depth,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "batches": self.encoder.batches,
+                "mean_batch_size": self.encoder.encoded / self.encoder.batches if self.encoder.batches else 0.0,
+                "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+                "p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+            }
+
+
+# ------------------------------
+# Optionaler HTTP-Endpunkt (mehrere App-Worker, ein Index)
+# ------------------------------
+def _serialize(results):
+    return [{"page_content": doc.page_content, "metadata": doc.metadata, "score": score} for doc, score in results]
+
+
+def serve_http(service: RetrievalService, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """
+    Startet einen HTTP-Server im Hintergrund: POST /search {"query", "k", "alpha", "fusion", "filters"},
+    GET /metrics (Service, JSON) und GET /metrics/stages (utils.metrics, Prometheus-Textformat).
+    Standardmässig nur lokal erreichbar.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, body, headers=(), content_type="application/json; charset=utf-8"):
+            data = body.encode("utf-8") if isinstance(body, str) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                self._reply(200, service.metrics())
+            elif self.path == "/metrics/stages":
+                self._reply(200, metrics.prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/search":
+                self._reply(404, {"error": "not found"})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                results = service.search(
+                    request["query"], int(request.get("k", 5)), float(request.get("alpha", 0.5)), request.get("fusion"),
+                    request.get("filters")
+                )
+            except ServiceBusyError as e:
+                self._reply(503, {"error": str(e)}, [("Retry-After", "1")])
+            except (KeyError, ValueError, TypeError, AttributeError) as e:
+                self._reply(400, {"error": str(e)})
+            else:
+                self._reply(200, _serialize(results))
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="RetrievalHTTP", daemon=True).start()
+    return server
+
+
+class RemoteRetrievalClient:
+    """Sucht über den HTTP-Endpunkt eines anderen Prozesses; gleiche search()-Signatur."""
+
+    def __init__(self, url: str = "http://127.0.0.1:8765", timeout: float = 30.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def search(self, query: str, k: int = 5, alpha: float = 0.5, fusion: str = None,
+               filters: Filters = None) -> List[Tuple[Document, float]]:
+        response = self.session.post(
+            f"{self.url}/search", json={"query": query, "k": k, "alpha": alpha, "fusion": fusion, "filters": filters},
+            timeout=self.timeout
+        )
+        if response.status_code == 503:
+            raise ServiceBusyError(response.json().get("error", "Suche ist ausgelastet."))
+        response.raise_for_status()
+        return [(Document(page_content=r["page_content"], metadata=r["metadata"]), r["score"]) for r in response.json()]
+
+    def metrics(self) -> dict:
+        response = self.session.get(f"{self.url}/metrics", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
@@ -1,12 +1,17 @@
 # utils/search.py
-from typing import List, Tuple
+from contextlib import contextmanager
+from typing import Callable, List, Tuple
 import re
+import threading
+import time
 import numpy as np
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
-from rank_bm25 import BM25Okapi
 from langchain.docstore.document import Document
+from utils.bm25 import IncrementalBM25
+from utils.vector_index import VectorIndex, create_vector_index
+from utils.embeddings import EmbeddingProvider, as_embedding_provider
+from utils.query_cache import QueryCache, normalize_query
+from utils.metrics import metrics
+from utils.metadata_index import MetadataIndex, Filters, filters_key
 
 # ------------------------------
 # Stopwords (deutsch)
@@ -17,85 +22,386 @@ STOPWORDS = {
     "wie","so","wir","sie","er","es","hat","haben","dass"
 }
 
+def tokenize(text: str) -> list[str]:
+    """Tokenisierung für BM25: Kleinschreibung, Wortzeichen, ohne Stopwords."""
+    tokens = re.findall(r'\w+', text.lower())
+    return [t for t in tokens if t not in STOPWORDS]
+
+FUSION_METHODS = ("minmax", "zscore", "rrf", "none")
+RRF_K = 60
+
+# ------------------------------
+# Hilfsfunktionen für Top-k und Score-Fusion
+# ------------------------------
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indizes der k höchsten Scores, absteigend sortiert (argpartition statt vollem Sortieren)."""
+    if k <= 0 or not len(scores):
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(len(scores))
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+def normalize_scores(scores: np.ndarray, method: str) -> np.ndarray:
+    """Bringt Embedding- und BM25-Scores auf eine vergleichbare Skala."""
+    if method == "minmax":
+        lo, hi = scores.min(), scores.max()
+        return (scores - lo) / (hi - lo) if hi > lo else np.zeros_like(scores)
+    if method == "zscore":
+        std = scores.std()
+        return (scores - scores.mean()) / std if std > 0 else np.zeros_like(scores)
+    return scores
+
+def rrf_scores(candidates: np.ndarray, ranked: np.ndarray, k: int = RRF_K) -> np.ndarray:
+    """Reciprocal Rank Fusion: 1 / (k + Rang) für Kandidaten in `ranked`, sonst 0 (candidates sortiert)."""
+    scores = np.zeros(len(candidates))
+    scores[np.searchsorted(candidates, ranked)] = 1.0 / (k + np.arange(1, len(ranked) + 1))
+    return scores
+
 # ------------------------------
 # InMemory VectorStore
 # ------------------------------
 class InMemoryVectorStore:
-    def __init__(self, docs: List[Document], embedding_model):
+    """
+    Vektor-Store über einem EmbeddingProvider. `embedding_model` darf ein Provider,
+    ein SentenceTransformer oder ein LangChain-Embeddings-Objekt sein.
+    """
+
+    def __init__(self, docs: List[Document], embedding_model, embeddings: np.ndarray = None, index="exact", **index_params):
         self.docs = docs
-        self.embedding_model = embedding_model
-        self.embeddings = embedding_model.encode(
-            [doc.page_content for doc in docs], 
-            convert_to_numpy=True
-        )
+        self.embedding_model: EmbeddingProvider = as_embedding_provider(embedding_model)
+        # Vorberechnete Embeddings (z. B. aus dem Index-Cache) werden übernommen
+        if embeddings is None:
+            embeddings = self.embed_documents(docs)
+            index_params.setdefault("normalized", True)
+        # Vektor-Index: "exact" (Brute Force), "ivf" (approximativ) oder eine VectorIndex-Instanz
+        if isinstance(index, VectorIndex):
+            self.index = index
+        else:
+            self.index = create_vector_index(index, embeddings, **index_params)
 
     @classmethod
-    def from_documents(cls, docs: List[Document], embedding_model):
-        return cls(docs, embedding_model)
+    def from_documents(cls, docs: List[Document], embedding_model, embeddings: np.ndarray = None, index="exact", **index_params):
+        return cls(docs, embedding_model, embeddings, index, **index_params)
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self.index.vectors
+
+    @metrics.timed("embed.documents")
+    def embed_documents(self, docs: List[Document]) -> np.ndarray:
+        # Gemessen wird hier (Indexierung), nicht am Provider, den auch das Highlighting nutzt
+        return self.embedding_model.encode_documents([doc.page_content for doc in docs])
+
+    def add_documents(self, docs: List[Document], embeddings: np.ndarray = None):
+        """Hängt Dokumente an; berechnet nur deren Embeddings, falls nicht übergeben."""
+        if not docs:
+            return
+        if embeddings is None:
+            embeddings = self.embed_documents(docs)
+        self.index.add(embeddings)
+        self.docs.extend(docs)
+
+    def remove_indices(self, indices: List[int]):
+        """Entfernt Dokumente anhand ihrer Position."""
+        if not indices:
+            return
+        self.index.remove(indices)
+        for i in sorted(set(indices), reverse=True):
+            del self.docs[i]
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return self.embedding_model.encode_query(query)
+
+    def search(self, query_emb: np.ndarray, k: int, ids: np.ndarray = None):
+        """Positionen und Kosinus-Scores der k ähnlichsten Dokumente (über den Vektor-Index), optional nur unter `ids`."""
+        return self.index.search(query_emb, k, ids)
+
+    def scores_for(self, query_emb: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """Exakte Kosinus-Scores für ausgewählte Positionen."""
+        return self.index.scores_for(query_emb, ids)
 
     def similarity_search_with_score(self, query, k=10):
         if not self.docs:
             return []
-        query_emb = self.embedding_model.encode([query], convert_to_numpy=True)
-        sims = cosine_similarity(query_emb, self.embeddings)[0]
-        results = [(self.docs[i], float(sims[i])) for i in np.argsort(sims)[::-1][:k]]
-        return results
+        ids, sims = self.search(self.embed_query(query), k)
+        return [(self.docs[i], float(s)) for i, s in zip(ids, sims)]
+
+# ------------------------------
+# Reader-Writer-Lock
+# ------------------------------
+class ReadWriteLock:
+    """
+    Beliebig viele Leser gleichzeitig oder ein Schreiber allein. Wartende Schreiber
+    haben Vorrang, damit ständige Suchlast Index-Aktualisierungen nicht aushungert.
+    Nicht reentrant: innerhalb von read() weder read() noch write() erneut aufrufen.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
 
 # ------------------------------
 # HybridRetriever
 # ------------------------------
 
 class HybridRetriever:
-    def __init__(self, vectorstore: InMemoryVectorStore, texts: List[Document], embedding_model, debug: bool=False):
+    def __init__(self, vectorstore: InMemoryVectorStore, texts: List[Document], embedding_model, debug: bool=False, bm25: IncrementalBM25 = None, fusion: str = "minmax", cache: QueryCache = None, reranker=None):
         self.vectorstore = vectorstore
         self.texts = texts
-        self.embedding_model = embedding_model
+        self.embedding_model = as_embedding_provider(embedding_model)
         self.debug = debug
+        self.fusion = fusion
+
+        # Suchen teilen sich den Lesezugriff; Index-Aktualisierungen (z. B. durch den
+        # FolderWatcher) warten, bis keine Suche mehr läuft, und sperren dann exklusiv.
+        # Postings und IVF-Listen werden bei Bedarf von einer Suche gebaut; bauen zwei
+        # gleichzeitig, entsteht dasselbe Ergebnis doppelt, aber nie ein inkonsistentes.
+        self._lock = ReadWriteLock()
+        # Wird bei jeder Änderung des Index erhöht
+        self.version = 0
+        # Optionaler Ergebnis-Cache; Schlüssel enthalten die Index-Version
+        self.cache = cache
+        # Optionale zweite Stufe (z. B. CrossEncoderReranker) für die besten Kandidaten
+        self.reranker = reranker
 
-        # BM25 vorbereiten
+        # BM25 vorbereiten (oder gespeicherte Statistiken übernehmen)
         self.corpus = [doc.page_content for doc in texts]
-        self.tokenized_corpus = [self.preprocess(doc.page_content) for doc in texts]
-        if self.tokenized_corpus:
-            self.bm25 = BM25Okapi(self.tokenized_corpus)
+        if bm25 is not None:
+            self.bm25 = bm25
         else:
-            self.bm25 = None
+            self.bm25 = IncrementalBM25([self.preprocess(doc.page_content) for doc in texts])
+        # Posting-Listen für Metadaten-Filter (Kategorie, Quelldatei)
+        self.metadata = MetadataIndex(texts)
 
     def preprocess(self, text: str) -> list[str]:
-        tokens = re.findall(r'\w+', text.lower())
-        return [t for t in tokens if t not in STOPWORDS]
+        return tokenize(text)
+
+    # ------------------------------
+    # Inkrementelle Aktualisierung
+    # ------------------------------
+    def add_documents(self, docs: List[Document]):
+        self.update_source(None, docs)
+
+    def remove_source(self, path: str) -> int:
+        """Entfernt alle Chunks einer Quelldatei; gibt die Anzahl entfernter Chunks zurück."""
+        with self._lock.write():
+            removed = self._remove_source(path)
+            if removed:
+                self._bump_version()
+            return removed
+
+    def update_source(self, path: str, docs: List[Document]):
+        """
+        Ersetzt die Chunks einer Quelldatei (path=None: nur hinzufügen).
+        Die Embeddings werden ausserhalb des Locks berechnet, laufende Suchen warten also nicht darauf.
+        """
+        embeddings = self.vectorstore.embed_documents(docs) if self.vectorstore and docs else None
+        with self._lock.write():
+            if path is not None:
+                self._remove_source(path)
+            if docs:
+                self._add_documents(docs, embeddings)
+            self._bump_version()
+
+    def _bump_version(self):
+        self.version += 1
+        if self.cache is not None:
+            self.cache.clear()
+
+    def _add_documents(self, docs: List[Document], embeddings: np.ndarray):
+        if self.vectorstore:
+            self.vectorstore.add_documents(docs, embeddings)
+        if not self.vectorstore or self.texts is not self.vectorstore.docs:
+            self.texts.extend(docs)
+        self.corpus.extend(doc.page_content for doc in docs)
+        self.bm25.add_documents(self.preprocess(doc.page_content) for doc in docs)
+        self.metadata.add_documents(docs)
+
+    def _remove_source(self, path: str) -> int:
+        indices = [i for i, doc in enumerate(self.texts) if doc.metadata.get("path") == path]
+        if not indices:
+            return 0
+        if self.vectorstore:
+            self.vectorstore.remove_indices(indices)
+        if not self.vectorstore or self.texts is not self.vectorstore.docs:
+            for i in reversed(indices):
+                del self.texts[i]
+        for i in reversed(indices):
+            del self.corpus[i]
+        self.bm25.remove_indices(indices)
+        self.metadata.remove_indices(indices)
+        return len(indices)
 
-    def search(self, query: str, k: int = 5, alpha: float = 0.5) -> List[Tuple[Document, float]]:
+    def snapshot(self):
+        """
+        Konsistenter Stand (Chunks, Embeddings, BM25, Version) zum Speichern, ohne den
+        Lock während des Schreibens zu halten. Die Embedding-Matrix wird bei Änderungen
+        ersetzt, nie überschrieben, und muss daher nicht kopiert werden.
+        """
+        with self._lock.read():
+            return list(self.texts), self.vectorstore.embeddings, self.bm25.copy(), self.version
+
+    def attach_vectors(self, vectors: np.ndarray, version: int) -> bool:
+        """Ersetzt die Embedding-Matrix durch eine inhaltsgleiche, sofern der Index noch auf `version` steht."""
+        with self._lock.write():
+            if self.version != version:
+                return False
+            self.vectorstore.index.attach_vectors(vectors)
+            return True
+
+    def filter_values(self, field: str) -> dict:
+        """Vorhandene Werte eines Filterfeldes mit Anzahl Chunks (z. B. für Auswahllisten)."""
+        with self._lock.read():
+            return self.metadata.value_counts(field)
+
+    def search(self, query: str, k: int = 5, alpha: float = 0.5, fusion: str = None,
+               encoder: Callable[[str], np.ndarray] = None, timings: dict = None,
+               filters: Filters = None, use_cache: bool = True) -> List[Tuple[Document, float]]:
         """
         Hybrid-Suche: kombiniert Embeddings + BM25.
         alpha = Gewichtung (0 = nur BM25, 1 = nur Embedding)
+        fusion = Normalisierung vor der Gewichtung: "minmax", "zscore", "rrf" oder "none"
+        timings = optionales Dict, in das die Dauer jeder Stufe (Sekunden) geschrieben wird:
+                  "encode", "vector", "bm25", "fusion", "rerank" (Cache-Treffer: nur "cache")
+        filters = nur Chunks mit passenden Metadaten bewerten, z. B. {"category": ["Verträge"]}
+                  (innerhalb eines Feldes ODER, zwischen Feldern UND)
+        use_cache = False umgeht den Ergebnis-Cache (z. B. zum Profilieren)
+        Die Stufen landen zusätzlich als "search.<Stufe>" in utils.metrics, sofern aktiviert.
         """
-        results: List[Tuple[Document, float]] = []
+        fusion = fusion or self.fusion
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"Unbekannte Fusion '{fusion}', erlaubt: {', '.join(FUSION_METHODS)}")
+        if timings is None and metrics.enabled:
+            timings = {}
+
+        start = search_start = time.perf_counter()
+        cache_key = (normalize_query(query), k, alpha, fusion, filters_key(filters), self.version)
+        if self.cache is not None and use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                if timings is not None:
+                    timings["cache"] = time.perf_counter() - start
+                self._observe(timings, search_start)
+                return list(cached)
 
-        # --- Embedding-Suche ---
+        # Query-Embedding ausserhalb des Locks berechnen (`encoder`: z. B. Micro-Batching im RetrievalService)
+        start = time.perf_counter()
         if self.vectorstore:
-            for doc, score in self.vectorstore.similarity_search_with_score(query, k=k*2):
-                results.append((doc, alpha * score))
-
-        # --- BM25-Suche ---
-        if self.bm25 is not None:
-            tokenized_query = self.preprocess(query)
-            scores = self.bm25.get_scores(tokenized_query)
-            for idx in np.argsort(scores)[::-1][:k*2]:
-                doc = self.texts[idx]
-                score = float(scores[idx]) * (1 - alpha)
-
-                # vorhandene Dokumente summieren
-                found = False
-                for i, (d, s) in enumerate(results):
-                    if d == doc:
-                        results[i] = (d, s + score)
-                        found = True
-                        break
-                if not found:
-                    results.append((doc, score))
+            query_emb = encoder(query) if encoder else self.vectorstore.embed_query(query)
+        else:
+            query_emb = None
+        if timings is not None:
+            timings["encode"] = time.perf_counter() - start
+        first_k = max(k, self.reranker.top_n) if self.reranker else k
+        with self._lock.read():
+            results = self._search(query, query_emb, first_k, alpha, fusion, timings, filters)
+
+        # Re-Ranking ausserhalb des Locks; Ergebnisse nach Zeitüberschreitung nicht cachen
+        complete = True
+        if self.reranker:
+            start = time.perf_counter()
+            results, complete = self.reranker.rerank(query, results, k)
+            if timings is not None:
+                timings["rerank"] = time.perf_counter() - start
+
+        # Nur speichern, wenn sich der Index seit dem Erstellen des Schlüssels nicht geändert hat
+        if self.cache is not None and use_cache and complete and cache_key[-1] == self.version:
+            self.cache.put(cache_key, list(results))
+        self._observe(timings, search_start)
+        return results
+
+    @staticmethod
+    def _observe(timings, start):
+        if metrics.enabled and timings is not None:
+            metrics.observe_all("search", timings)
+            metrics.observe("search.total", time.perf_counter() - start)
+
+    def _search(self, query: str, query_emb, k: int, alpha: float, fusion: str,
+                timings: dict = None, filters: Filters = None) -> List[Tuple[Document, float]]:
+        # Metadaten-Filter vorab auflösen: beide Verfahren bewerten nur diese Positionen
+        allowed = self.metadata.select(filters)
+        n = len(self.texts) if allowed is None else len(allowed)
+        if not n or k <= 0:
+            return []
+        n_candidates = min(n, k * 2)
+        # Zeitmessung pro Stufe nur, wenn ein Dict übergeben wurde
+        clock = time.perf_counter if timings is not None else (lambda: 0.0)
+
+        # --- Kandidaten: Top-2k beider Verfahren (Index = Position in self.texts) ---
+        start = clock()
+        if self.vectorstore:
+            dense_top, _ = self.vectorstore.search(query_emb, n_candidates, allowed)
+        else:
+            dense_top = np.zeros(0, dtype=np.int64)
+        vector_time = clock() - start
+        # BM25 bewertet nur Chunks, die einen Suchbegriff enthalten; alle anderen haben Score 0
+        start = clock()
+        sparse_ids, sparse_values = self.bm25.get_sparse_scores(self.preprocess(query), allowed)
+        sparse_top = sparse_ids[top_k_indices(sparse_values, n_candidates)]
+        bm25_time = clock() - start
+        candidates = np.union1d(dense_top, sparse_top).astype(np.int64)
+        if timings is not None:
+            timings.update(vector=vector_time, bm25=bm25_time, fusion=0.0)
+        if not len(candidates):
+            return []
+
+        # --- Scores beider Verfahren für alle Kandidaten ---
+        start = clock()
+        dense = self.vectorstore.scores_for(query_emb, candidates) if self.vectorstore else np.zeros(len(candidates))
+        if timings is not None:
+            timings["vector"] += clock() - start
+        start = clock()
+        sparse = np.zeros(len(candidates))
+        if len(sparse_ids):
+            pos = np.minimum(np.searchsorted(sparse_ids, candidates), len(sparse_ids) - 1)
+            hit = sparse_ids[pos] == candidates
+            sparse[hit] = sparse_values[pos[hit]]
+
+        # --- Fusion (Normalisierung über die Kandidatenmenge) ---
+        if fusion == "rrf":
+            fused = alpha * rrf_scores(candidates, dense_top) + (1 - alpha) * rrf_scores(candidates, sparse_top)
+        else:
+            fused = alpha * normalize_scores(dense, fusion) + (1 - alpha) * normalize_scores(sparse, fusion)
 
         # --- Sortieren und Top-k zurückgeben ---
-        results = sorted(results, key=lambda x: x[1], reverse=True)[:k]
+        results = [(self.texts[candidates[j]], float(fused[j])) for j in top_k_indices(fused, k)]
+        if timings is not None:
+            timings["fusion"] = clock() - start
 
         if self.debug:
             print("Query:", query)
@@ -1,21 +1,135 @@
 # utils/search_llm.py
-from gpt4all import GPT4All
+import queue
+import threading
+import time
+from typing import Callable, Iterator, Optional
 
-# Modell laden (Mini-Version, CPU-tauglich)
-# Streamlit Cloud: Modell wird beim Start geladen
-model_path = "ggml-gpt4all-j-v1.3-groovy.bin"  # Mini/CPU Version
-llm = GPT4All(model_path, verbose=False)
+# Mini/CPU Version; wird erst bei der ersten Anfrage geladen
+MODEL_PATH = "ggml-gpt4all-j-v1.3-groovy.bin"
+# Anzahl Modell-Instanzen = gleichzeitige Generierungen (jede Instanz belegt den vollen Modellspeicher)
+POOL_SIZE = 1
+QUEUE_TIMEOUT = 120.0  # Sekunden, die eine Anfrage auf ein freies Modell wartet
+GENERATION_TIMEOUT = 180.0  # Sekunden pro Antwort
 
-def run_llm_search(query: str) -> str:
+
+class LLMBusyError(RuntimeError):
+    """Kein Modell innerhalb von `queue_timeout` frei geworden."""
+
+
+def load_gpt4all(model_path: str = MODEL_PATH):
+    # Import erst hier: gpt4all und das Modell werden nur bei Bedarf geladen
+    from gpt4all import GPT4All
+    return GPT4All(model_path, verbose=False)
+
+
+# ------------------------------
+# LLM-Service (Modell-Pool mit begrenzter Parallelität)
+# ------------------------------
+class LLMService:
     """
-    LLM-gestützte Suche mit GPT4All Mini
+    Hält bis zu `pool_size` Modell-Instanzen, die beim ersten Bedarf erzeugt und danach
+    von allen Streamlit-Sessions geteilt werden. Eine Instanz bearbeitet immer nur eine
+    Anfrage; weitere Anfragen warten bis zu `queue_timeout` Sekunden auf eine freie.
+
+    `model_factory` liefert ein Objekt mit GPT4All-kompatiblem
+    `generate(prompt, max_tokens=..., temp=..., streaming=True)`; damit lässt sich
+    z. B. ein lokales Stub-Modell einsetzen.
     """
-    prompt = f"""
+
+    def __init__(self, model_factory: Callable[[], object] = None, pool_size: int = POOL_SIZE,
+                 queue_timeout: float = QUEUE_TIMEOUT, generation_timeout: float = GENERATION_TIMEOUT):
+        self.model_factory = model_factory or load_gpt4all
+        self.pool_size = pool_size
+        self.queue_timeout = queue_timeout
+        self.generation_timeout = generation_timeout
+
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.pool_size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self.model_factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            raise LLMBusyError("Das Sprachmodell ist ausgelastet. Bitte später erneut versuchen.") from None
+
+    def _release(self, model):
+        self._idle.put(model)
+
+    def stream(self, prompt: str, max_tokens: int = 400, temp: float = 0.7,
+               timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        Liefert die Antwort Token für Token. Nach `timeout` Sekunden (Standard:
+        generation_timeout) wird abgebrochen und das bis dahin Erzeugte bleibt stehen.
+        """
+        model = self._acquire()
+        deadline = time.monotonic() + (timeout or self.generation_timeout)
+        try:
+            for token in model.generate(prompt, max_tokens=max_tokens, temp=temp, streaming=True):
+                yield token
+                if time.monotonic() > deadline:
+                    break
+        finally:
+            self._release(model)
+
+    def generate(self, prompt: str, **params) -> str:
+        return "".join(self.stream(prompt, **params))
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_llm_service() -> LLMService:
+    """Prozessweit geteilter Service (das Modell selbst wird erst bei der ersten Anfrage geladen)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = LLMService()
+        return _service
+
+
+def set_llm_service(service: LLMService):
+    """Ersetzt den geteilten Service, z. B. durch einen mit Stub-Modell."""
+    global _service
+    with _service_lock:
+        _service = service
+
+
+# ------------------------------
+# LLM-gestützte Suche
+# ------------------------------
+def build_search_prompt(query: str) -> str:
+    return f"""
     Du bist ein juristischer Assistent.
     Beantworte die folgende Frage präzise und sachlich:
 
     Frage: {query}
     """
-    response = llm.generate(prompt)
-    return response
 
+
+def stream_llm_search(query: str) -> Iterator[str]:
+    """Wie run_llm_search(), aber als Token-Strom (z. B. für st.write_stream)."""
+    return get_llm_service().stream(build_search_prompt(query))
+
+
+def run_llm_search(query: str) -> str:
+    """
+    LLM-gestützte Suche mit GPT4All Mini
+    """
+    return get_llm_service().generate(build_search_prompt(query))
@@ -0,0 +1,58 @@
+# utils/startup.py
+import threading
+import time
+import traceback
+from typing import Callable, Optional
+
+
+# ------------------------------
+# Aufwärmen im Hintergrund
+# ------------------------------
+class BackgroundLoader:
+    """
+    Führt `target(loader)` in einem Hintergrund-Thread aus (z. B. Modell laden und Index
+    aufbauen), damit die erste Seite sofort gerendert wird. `target` meldet den Fortschritt
+    über `loader.update()`; die UI liest `status`, `progress` und `ready` bei jedem Rerun.
+    Das Ergebnis liegt danach in `result`, ein Fehler in `error`.
+    """
+
+    def __init__(self, target: Callable[["BackgroundLoader"], object], name: str = "warmup"):
+        self.status = "Wird gestartet …"
+        self.progress: Optional[float] = None
+        self.result = None
+        self.error: Optional[str] = None
+        self.started = time.monotonic()
+        self.elapsed: Optional[float] = None
+
+        self._target = target
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self.result = self._target(self)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+        finally:
+            self.elapsed = time.monotonic() - self.started
+            self._done.set()
+
+    def update(self, status: str, progress: Optional[float] = None):
+        with self._lock:
+            self.status = status
+            self.progress = progress
+
+    def snapshot(self):
+        """(Status, Fortschritt 0..1 oder None) konsistent lesen."""
+        with self._lock:
+            return self.status, self.progress
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
@@ -0,0 +1,260 @@
+# utils/vector_index.py
+from abc import ABC, abstractmethod
+from typing import Tuple
+import numpy as np
+
+# Positionen (IDs) entsprechen immer der Reihenfolge der Dokumente im VectorStore.
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalisiert Zeilen und liefert ein zusammenhängendes float32-Array."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        norm = np.linalg.norm(vectors)
+        return vectors / norm if norm > 0 else vectors
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(ids: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    if k < len(scores):
+        part = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[part], scores[part]
+    order = np.argsort(-scores, kind="stable")
+    return ids[order], scores[order]
+
+
+# ------------------------------
+# Schnittstelle
+# ------------------------------
+class VectorIndex(ABC):
+    """
+    Basisklasse für Vektor-Indizes. Die Embeddings werden beim Aufbau einmal
+    L2-normalisiert und als float32 gehalten; der Kosinus-Score ist damit ein
+    einfaches Skalarprodukt.
+
+    Mit `quantize=True` wird zusätzlich eine int8-Kopie (skalare Quantisierung pro
+    Dimension) angelegt. Gesucht wird dann auf den int8-Werten; nur die besten
+    `rescore_factor × k` Kandidaten werden exakt mit den float32-Vektoren nachbewertet.
+    Diese können ein Memory-Map auf den Index-Cache sein (siehe IndexStore.save_retriever)
+    und belegen dann keinen Arbeitsspeicher des Prozesses.
+    """
+
+    def __init__(self, vectors: np.ndarray = None, normalized: bool = False, quantize: bool = False,
+                 rescore_factor: int = 4, block_size: int = 16384):
+        if vectors is None or not len(vectors):
+            self.vectors = np.zeros((0, 0), dtype=np.float32)
+        elif normalized:
+            # Bereits normalisiert (z. B. aus dem Index-Cache): nicht kopieren, Memory-Map bleibt erhalten
+            self.vectors = vectors
+        else:
+            self.vectors = normalize_rows(vectors)
+        self.quantize = quantize
+        self.rescore_factor = rescore_factor
+        self.block_size = block_size
+
+        self.codes = None
+        self.scale = None
+        if quantize and len(self.vectors):
+            self._fit_quantizer()
+
+    def __len__(self):
+        return len(self.vectors)
+
+    # ------------------------------
+    # int8-Quantisierung
+    # ------------------------------
+    def _fit_quantizer(self):
+        absmax = np.zeros(self.vectors.shape[1], dtype=np.float32)
+        for start in range(0, len(self.vectors), self.block_size):
+            np.maximum(absmax, np.abs(self.vectors[start:start + self.block_size]).max(axis=0), out=absmax)
+        absmax[absmax == 0] = 1.0
+        self.scale = absmax / 127.0
+        self.codes = self._encode(self.vectors)
+
+    def _encode(self, vectors):
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        for start in range(0, len(vectors), self.block_size):
+            block = np.rint(vectors[start:start + self.block_size] / self.scale)
+            codes[start:start + self.block_size] = np.clip(block, -127, 127)
+        return codes
+
+    def _approx_scores(self, query, ids=None):
+        # Skalierung in die Anfrage ziehen: codes @ (scale * q) statt (codes * scale) @ q
+        scaled = self.scale * query
+        codes = self.codes if ids is None else self.codes[ids]
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), self.block_size):
+            out[start:start + self.block_size] = codes[start:start + self.block_size].astype(np.float32) @ scaled
+        return out
+
+    # ------------------------------
+    # Aktualisierung
+    # ------------------------------
+    def add(self, vectors: np.ndarray):
+        vectors = normalize_rows(vectors)
+        self.vectors = np.vstack([self.vectors, vectors]) if len(self.vectors) else vectors
+        if self.quantize:
+            # Liegt ein neuer Wert ausserhalb der bisherigen Skala, würde np.clip ihn kappen:
+            # dann Skala neu bestimmen und alle Vektoren neu kodieren
+            if self.codes is None or (np.abs(vectors) > self.scale * 127).any():
+                self._fit_quantizer()
+            else:
+                self.codes = np.vstack([self.codes, self._encode(vectors)])
+
+    def remove(self, indices):
+        self.vectors = np.delete(self.vectors, indices, axis=0)
+        if self.codes is not None:
+            self.codes = np.delete(self.codes, indices, axis=0)
+
+    def attach_vectors(self, vectors: np.ndarray):
+        """Ersetzt die float32-Matrix durch eine inhaltsgleiche (z. B. Memory-Map nach dem Speichern)."""
+        if vectors.shape != self.vectors.shape:
+            raise ValueError("Embedding-Matrix passt nicht zum Index")
+        self.vectors = vectors
+
+    # ------------------------------
+    # Suche
+    # ------------------------------
+    def scores_for(self, query: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """Exakte Kosinus-Scores für ausgewählte Positionen."""
+        if not len(ids):
+            return np.zeros(0, dtype=np.float32)
+        return self.vectors[ids] @ normalize_rows(query)
+
+    def _rank(self, query, ids, k):
+        """Top-k unter `ids` (None = alle), bei Quantisierung mit exakter Nachbewertung."""
+        if self.codes is None:
+            if ids is None:
+                return _top_k(np.arange(len(self)), self.vectors @ query, k)
+            return _top_k(ids, self.vectors[ids] @ query, k)
+
+        approx = self._approx_scores(query, ids)
+        shortlist, _ = _top_k(np.arange(len(approx)) if ids is None else ids, approx, k * self.rescore_factor)
+        shortlist = np.sort(shortlist)  # sortierte Zugriffe auf die Memory-Map
+        return _top_k(shortlist, self.vectors[shortlist] @ query, k)
+
+    @abstractmethod
+    def search(self, query: np.ndarray, k: int, ids: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (Positionen, Scores); mit `ids` (sortiert) nur unter diesen Positionen (z. B. Metadaten-Filter)."""
+
+
+# ------------------------------
+# Exakte Suche (Brute Force)
+# ------------------------------
+class ExactIndex(VectorIndex):
+    """Vergleicht die Anfrage mit allen Vektoren; Referenz für die Trefferquote."""
+
+    def search(self, query, k, ids=None):
+        if not len(self) or k <= 0 or (ids is not None and not len(ids)):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return self._rank(normalize_rows(query), ids, k)
+
+
+# ------------------------------
+# Approximative Suche (IVF)
+# ------------------------------
+class IVFIndex(VectorIndex):
+    """
+    Inverted-File-Index: die Vektoren werden per sphärischem k-Means in `nlist`
+    Zellen eingeteilt; eine Anfrage durchsucht nur die `nprobe` nächstgelegenen
+    Zellen. Mehr `nprobe` = höhere Trefferquote, aber langsamer.
+
+    Solange weniger als `min_train_size` Vektoren vorhanden sind, wird exakt gesucht.
+    Neue Vektoren werden der nächsten Zelle zugeordnet, ohne neu zu trainieren;
+    `train()` kann nach grösseren Änderungen erneut aufgerufen werden.
+    """
+
+    def __init__(self, vectors=None, nlist=None, nprobe=8, n_iter=20, min_train_size=10000, seed=0, **params):
+        super().__init__(vectors, **params)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.min_train_size = min_train_size
+        self.seed = seed
+
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self._lists = None
+        if len(self) >= self.min_train_size:
+            self.train()
+
+    def _nearest(self, vectors, centroids):
+        # Blockweise, damit keine (N × nlist)-Matrix auf einmal entsteht
+        out = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), self.block_size):
+            out[start:start + self.block_size] = np.argmax(vectors[start:start + self.block_size] @ centroids.T, axis=1)
+        return out
+
+    def train(self):
+        n = len(self)
+        nlist = min(self.nlist or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(self.seed)
+        # ~40 Trainingspunkte pro Zelle genügen für stabile Zentren
+        sample = np.asarray(self.vectors[np.sort(rng.choice(n, size=min(n, 40 * nlist), replace=False))])
+
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(self.n_iter):
+            labels = self._nearest(sample, centroids)
+            order = np.argsort(labels, kind="stable")
+            cells, starts = np.unique(labels[order], return_index=True)
+            sums = np.add.reduceat(sample[order], starts, axis=0)
+            lengths = np.linalg.norm(sums, axis=1)
+            filled = lengths > 0
+            centroids[cells[filled]] = sums[filled] / lengths[filled, None]
+
+        self.centroids = centroids
+        self.assignments = self._nearest(self.vectors, self.centroids)
+        self._lists = None
+
+    def _inverted_lists(self):
+        if self._lists is None:
+            order = np.argsort(self.assignments, kind="stable")
+            ptr = np.zeros(len(self.centroids) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.assignments, minlength=len(self.centroids)), out=ptr[1:])
+            self._lists = (ptr, order)
+        return self._lists
+
+    def add(self, vectors):
+        n_before = len(self)
+        super().add(vectors)
+        if self.centroids is not None:
+            new_assignments = self._nearest(self.vectors[n_before:], self.centroids)
+            self.assignments = np.concatenate([self.assignments, new_assignments])
+            self._lists = None
+        elif len(self) >= self.min_train_size:
+            self.train()
+
+    def remove(self, indices):
+        super().remove(indices)
+        if self.centroids is not None:
+            self.assignments = np.delete(self.assignments, indices)
+            self._lists = None
+
+    def search(self, query, k, ids=None):
+        if not len(self) or k <= 0 or (ids is not None and not len(ids)):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = normalize_rows(query)
+
+        if self.centroids is None:
+            return self._rank(query, ids, k)
+        ptr, order = self._inverted_lists()
+        cells = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        probed = np.sort(np.concatenate([order[ptr[c]:ptr[c + 1]] for c in cells]))
+        if ids is not None:
+            # Gefiltert: nur passende Positionen der besuchten Zellen; liegen dort zu wenige,
+            # ist die Teilmenge klein genug, um sie vollständig zu durchsuchen
+            probed = np.intersect1d(probed, ids, assume_unique=True)
+            if len(probed) < k:
+                probed = ids
+        return self._rank(query, probed, k)
+
+
+VECTOR_INDEXES = {"exact": ExactIndex, "ivf": IVFIndex}
+
+
+def create_vector_index(kind: str = "exact", vectors: np.ndarray = None, **params) -> VectorIndex:
+    if kind not in VECTOR_INDEXES:
+        raise ValueError(f"Unbekannter Vektor-Index '{kind}', erlaubt: {', '.join(VECTOR_INDEXES)}")
+    return VECTOR_INDEXES[kind](vectors, **params)